@@ -1,51 +1,498 @@
-import json
-from services.dynamodb import DynamoDBService
+from concurrent.futures import ThreadPoolExecutor
+from services.idempotency import (
+    SAVED, DUPLICATE, FAILED, create_idempotency_store)
 from services.sqs import SQSService
-from utils.logging import log_message
+from utils.config import Config
+from utils.convert import decode_json
+from utils.deadline import Deadline
+from utils.logging import begin_summary, end_summary, log_message
 from utils.metrics import put_metric
+from utils.timing import timed
 
-dynamodb_service = DynamoDBService()
+UNSTARTED = "unstarted"
+HELD = "held"
+
+QUARANTINE_ERROR_MAX_LENGTH = 1024
+
+idempotency_store = create_idempotency_store(Config.IDEMPOTENCY_STORE)
 sqs_service = SQSService()
+_executor = None
+
+
+def reject_record(record, reason, error, failures, quarantined):
+    if quarantined is None:
+        failures.add(record["messageId"])
+    else:
+        quarantined.append((record, reason, error))
+
 
+def decode_records(records, failures, quarantined=None):
+    """Decode record bodies into ``(record, data)`` pairs.
 
-def message_handler(event):
-    for record in event.get("Records", []):
-        message_id = record["messageId"]
-        receipt_handle = record["receiptHandle"]
+    Undecodable records are added to ``failures``, or to ``quarantined``
+    as ``(record, reason, error)`` when a quarantine queue is in use;
+    records received more than ``QUARANTINE_MAX_RECEIVE_COUNT`` times go
+    there without being decoded.
+    """
+    decoded = []
+    for record in records:
+        record_id = record["messageId"]
         message_body = record["body"]
-        queue_name = record["eventSourceARN"].split(":")[-1]
 
         log_message(
-            message_id, "message_received", "info", {
-                "queue_name": queue_name})
+            record_id, "message_received", "info", {
+                "queue_name": record["eventSourceARN"].split(":")[-1]})
+
+        receive_count = int(record.get("attributes", {}).get(
+            "ApproximateReceiveCount") or 0)
+        if (quarantined is not None and
+                0 < Config.QUARANTINE_MAX_RECEIVE_COUNT < receive_count):
+            quarantined.append((
+                record, "max_receive_count",
+                f"received {receive_count} times"))
+            continue
 
         try:
-            data = json.loads(message_body)
-            message_id = data.get("message_id")
-        except Exception:
+            with timed("decode_json"):
+                data = decode_json(message_body)
+            if not isinstance(data, dict):
+                raise ValueError("body is not a JSON object")
+        except Exception as e:
             log_message(
-                message_id, "message_parse", "error", {
+                record_id, "message_parse", "error", {
                     "body": message_body})
             put_metric("InvalidMessages", 1)
+            reject_record(
+                record, "parse_error", str(e), failures, quarantined)
             continue
+        decoded.append((record, data))
+    return decoded
+
+
+def validate_messages(decoded, failures, quarantined=None):
+    """Turn decoded ``(record, data)`` pairs into message dicts.
+
+    Records without a ``message_id`` are rejected like undecodable ones.
+    """
+    messages = []
+    for record, data in decoded:
+        message_id = data.get("message_id")
+        if not isinstance(message_id, str) or not message_id:
+            log_message(
+                record["messageId"], "message_validate", "error", {
+                    "error": "missing message_id"})
+            put_metric("InvalidMessages", 1)
+            reject_record(
+                record, "schema_error", "missing message_id", failures,
+                quarantined)
+            continue
+
+        messages.append({
+            "message_id": message_id,
+            "record_id": record["messageId"],
+            "receipt_handle": record["receiptHandle"],
+            "queue_name": record["eventSourceARN"].split(":")[-1],
+            "group_id": record.get("attributes", {}).get("MessageGroupId"),
+            "data": data,
+        })
+    return messages
+
+
+def quarantine_records(quarantined, failures):
+    """Move poison records to ``QUARANTINE_QUEUE_URL`` with the error.
+
+    Records sent to the quarantine queue stay out of ``failures``, so the
+    source queue deletes them instead of redelivering them (and blocking
+    their FIFO group) until ``maxReceiveCount``. Records that could not be
+    sent are reported as failed.
+    """
+    queue_url = Config.QUARANTINE_QUEUE_URL
+    entries = []
+    for record, reason, error in quarantined:
+        attributes = record.get("attributes", {})
+        entry = {
+            "MessageBody": record["body"],
+            "MessageAttributes": {
+                name: {"DataType": "String", "StringValue": value}
+                for name, value in (
+                    ("quarantine_reason", reason),
+                    ("quarantine_error",
+                     error[:QUARANTINE_ERROR_MAX_LENGTH] or reason),
+                    ("source_arn", record["eventSourceARN"]),
+                    ("source_message_id", record["messageId"]),
+                    ("receive_count",
+                     attributes.get("ApproximateReceiveCount", "")),
+                ) if value
+            },
+        }
+        if queue_url.endswith(".fifo"):
+            entry["MessageGroupId"] = \
+                attributes.get("MessageGroupId") or "quarantine"
+            entry["MessageDeduplicationId"] = record["messageId"]
+        entries.append((entry, record["messageId"]))
 
-        is_exists, err = dynamodb_service.exists_message(message_id)
-        if err:
+    not_sent = sqs_service.send_messages(queue_url, entries)
+    for record, reason, error in quarantined:
+        record_id = record["messageId"]
+        if record_id in not_sent:
+            failures.add(record_id)
+        else:
+            log_message(record_id, "message_quarantined", "quarantined", {
+                "reason": reason, "error": error})
+    if len(quarantined) > len(not_sent):
+        put_metric("QuarantinedMessages", len(quarantined) - len(not_sent))
+
+
+def filter_new_messages(messages, write_first, failures, seen=None):
+    """Drop messages already stored or already ``seen`` in this event."""
+    if seen is None:
+        seen = set()
+    if write_first:
+        existing, failed = set(), set()
+    else:
+        existing, failed = idempotency_store.exists_messages(
+            [message["message_id"] for message in messages])
+
+    new_messages = []
+    for message in messages:
+        message_id = message["message_id"]
+
+        if message_id in failed:
             log_message(message_id, "message_check_failed", "error", {
-                "error": err})
+                "error": "Idempotency store error"})
+            failures.add(message["record_id"])
             continue
-        if is_exists:
+        if message_id in existing or message_id in seen:
             log_message(message_id, "message_skipped", "duplicate")
             put_metric("DuplicateMessages", 1)
             continue
+        seen.add(message_id)
+        new_messages.append(message)
+    return new_messages
 
-        _, err = dynamodb_service.save_message(message_id, data)
-        if err:
-            log_message(message_id, "message_save_failed", "error", {
-                "error": err})
+
+def defer_messages(messages, failures, reason="deadline"):
+    """Report messages left unstarted (by the deadline) as failed."""
+    for message in messages:
+        log_message(message["message_id"], "message_deferred", "info", {
+            "reason": reason})
+        failures.add(message["record_id"])
+    if messages and reason == "deadline":
+        put_metric("DeadlineDeferredMessages", len(messages))
+
+
+def hold_failed_groups(records, messages, failures, failed_groups):
+    """Defer messages that follow a failed record of their FIFO group.
+
+    ``failed_groups`` holds the groups that failed in earlier slices of
+    the event; failures in ``records`` only hold the records after them.
+    Returns the messages that may still be processed.
+    """
+    by_record = {message["record_id"]: message for message in messages}
+    blocked = set(failed_groups)
+    kept, held = [], []
+    for record in records:
+        record_id = record["messageId"]
+        message = by_record.get(record_id)
+        group_id = record.get("attributes", {}).get("MessageGroupId")
+        if group_id is not None and group_id in blocked:
+            if message is not None:
+                held.append(message)
+        elif record_id in failures:
+            if group_id is not None:
+                blocked.add(group_id)
+        elif message is not None:
+            kept.append(message)
+    defer_messages(held, failures, "message_group_failed")
+    return kept
+
+
+def save_one(message, write_first, deadline=None):
+    if deadline is not None and deadline.expired():
+        return UNSTARTED
+    message_id = message["message_id"]
+    if write_first:
+        status, _ = idempotency_store.claim_message(
+            message_id, message["data"], converted=True)
+    else:
+        saved, _ = idempotency_store.save_message(
+            message_id, message["data"], converted=True)
+        status = SAVED if saved else FAILED
+    return status
+
+
+def save_group(group, write_first, deadline=None):
+    """Save messages in order; a failure holds the rest of its group."""
+    outcomes = {}
+    failed_groups = set()
+    for message in group:
+        group_id = message["group_id"]
+        if group_id is not None and group_id in failed_groups:
+            outcomes[message["message_id"]] = HELD
             continue
+        status = save_one(message, write_first, deadline)
+        outcomes[message["message_id"]] = status
+        if status == FAILED and group_id is not None:
+            failed_groups.add(group_id)
+    return outcomes
+
+
+def save_concurrently(messages, write_first, deadline=None):
+    """Save messages on a bounded thread pool shared across invocations.
+
+    Records are partitioned by FIFO ``MessageGroupId``; each group is
+    saved in order on one worker while different groups run in parallel.
+    Records without a group (standard queues) are independent.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=Config.MAX_WORKERS,
+            thread_name_prefix="message-worker")
+
+    groups = {}
+    for message in messages:
+        key = message["group_id"]
+        if key is None:
+            key = ("record", message["record_id"])
+        groups.setdefault(key, []).append(message)
 
-        if not sqs_service.queue_url:
-            sqs_service.queue_url = sqs_service.get_queue_url(
-                queue_name, message_id)
-        sqs_service.delete_message(receipt_handle, message_id)
+    outcomes = {}
+    for group_outcomes in _executor.map(
+            save_group, groups.values(), [write_first] * len(groups),
+            [deadline] * len(groups)):
+        outcomes.update(group_outcomes)
+    return outcomes
+
+
+def save_in_waves(messages, write_first, deadline=None):
+    """Bulk-save messages, at most one per FIFO group in each call.
+
+    Each wave takes the next pending message of every group, so later
+    members are only written once the earlier ones are saved; a failure
+    holds the rest of its group.
+    """
+    outcomes = {}
+    pending = list(messages)
+    while pending:
+        if deadline is not None and deadline.expired():
+            outcomes.update(dict.fromkeys(
+                (message["message_id"] for message in pending), UNSTARTED))
+            break
+        wave = []
+        waiting = []
+        groups = set()
+        for message in pending:
+            group_id = message["group_id"]
+            if group_id is None or group_id not in groups:
+                wave.append(message)
+                groups.add(group_id)
+            else:
+                waiting.append(message)
+        outcomes.update(idempotency_store.save_messages(
+            [(message["message_id"], message["data"]) for message in wave],
+            transactional=write_first,
+            converted=True))
+        failed_groups = {
+            message["group_id"] for message in wave
+            if message["group_id"] is not None
+            and outcomes.get(message["message_id"], FAILED) == FAILED
+        }
+        pending = []
+        for message in waiting:
+            if message["group_id"] in failed_groups:
+                outcomes[message["message_id"]] = HELD
+            else:
+                pending.append(message)
+    return outcomes
+
+
+def persist_messages(messages, write_first, failures, deadline=None):
+    if deadline is not None and deadline.expired():
+        outcomes = dict.fromkeys(
+            (message["message_id"] for message in messages), UNSTARTED)
+    elif Config.BULK_SAVE:
+        outcomes = save_in_waves(messages, write_first, deadline)
+    elif Config.MAX_WORKERS > 1 and len(messages) > 1:
+        outcomes = save_concurrently(messages, write_first, deadline)
+    else:
+        outcomes = save_group(messages, write_first, deadline)
+
+    unstarted = []
+    held = []
+    for message in messages:
+        message_id = message["message_id"]
+        status = outcomes.get(message_id, FAILED)
+        if status == UNSTARTED:
+            unstarted.append(message)
+        elif status == HELD:
+            held.append(message)
+        elif status == DUPLICATE:
+            log_message(message_id, "message_skipped", "duplicate")
+            put_metric("DuplicateMessages", 1)
+        elif status == FAILED:
+            log_message(message_id, "message_save_failed", "error", {
+                "error": "Idempotency store error"})
+            failures.add(message["record_id"])
+    defer_messages(unstarted, failures)
+    defer_messages(held, failures, "message_group_failed")
+
+
+def batch_item_failures(records, failures, failed_groups=None):
+    """Build the ReportBatchItemFailures items for ``records``.
+
+    In a FIFO queue every record that follows a failed one in the same
+    message group is reported as failed too, so the group is redelivered
+    in order. Pass the same ``failed_groups`` for consecutive slices of
+    one event.
+    """
+    if failed_groups is None:
+        failed_groups = set()
+    items = []
+    for record in records:
+        record_id = record["messageId"]
+        group_id = record.get("attributes", {}).get("MessageGroupId")
+        if record_id in failures or (
+                group_id is not None and group_id in failed_groups):
+            items.append({"itemIdentifier": record_id})
+            if group_id is not None:
+                failed_groups.add(group_id)
+    return items
+
+
+def micro_batches(records, size):
+    """Split the event into consecutive micro-batches of ``size`` records.
+
+    Each micro-batch is a dict that the stages below fill in and empty
+    as it flows through, so only one micro-batch of decoded messages is
+    alive at a time. ``size`` of 0 or less keeps the event whole.
+    """
+    if size <= 0:
+        size = max(len(records), 1)
+    for start in range(0, len(records), size):
+        yield {"records": records[start:start + size]}
+
+
+def decode_stage(batches, failures):
+    for batch in batches:
+        with timed("decode"):
+            quarantined = [] if Config.QUARANTINE_QUEUE_URL else None
+            batch["quarantined"] = quarantined
+            batch["decoded"] = decode_records(
+                batch["records"], failures, quarantined)
+        yield batch
+
+
+def validate_stage(batches, failures):
+    for batch in batches:
+        with timed("validate"):
+            quarantined = batch.pop("quarantined")
+            batch["messages"] = validate_messages(
+                batch.pop("decoded"), failures, quarantined)
+            if quarantined:
+                quarantine_records(quarantined, failures)
+        yield batch
+
+
+def dedup_stage(batches, write_first, failures, deadline, failed_groups):
+    seen = set()
+    for batch in batches:
+        messages = hold_failed_groups(
+            batch["records"], batch.pop("messages"), failures,
+            failed_groups)
+        if messages and deadline.expired():
+            defer_messages(messages, failures)
+            messages = []
+        elif messages:
+            with timed("dedup"):
+                messages = filter_new_messages(
+                    messages, write_first, failures, seen)
+        batch["new_messages"] = messages
+        yield batch
+
+
+def persist_stage(batches, write_first, failures, deadline, failed_groups):
+    for batch in batches:
+        messages = hold_failed_groups(
+            batch["records"], batch.pop("new_messages"), failures,
+            failed_groups)
+        if messages:
+            with timed("persist"):
+                persist_messages(
+                    messages, write_first, failures, deadline)
+        yield batch
+
+
+def acknowledge_stage(batches, failures, failed_groups):
+    """Yield the ReportBatchItemFailures items of each micro-batch."""
+    for batch in batches:
+        yield batch_item_failures(batch["records"], failures, failed_groups)
+
+
+def message_handler(event, context=None):
+    """Process an SQS event and return its ReportBatchItemFailures response.
+
+    Records stream through decode, validate, dedup, persist and
+    acknowledge in micro-batches of ``MICRO_BATCH_SIZE``; each stage
+    batches its I/O per micro-batch. With a Lambda ``context``, records
+    not yet started when the remaining time drops below
+    ``DEADLINE_SAFETY_MARGIN_MS`` are reported as failed instead of
+    risking a timeout that would redeliver the whole batch.
+    """
+    records = event.get("Records", [])
+    failures = set()
+    begin_summary()
+    deadline = Deadline.from_context(
+        context, Config.DEADLINE_SAFETY_MARGIN_MS)
+    idempotency_store.deadline = deadline
+    write_first = Config.DEDUP_MODE == "write_first"
+    failed_groups = set()
+    items = []
+    try:
+        batches = micro_batches(records, Config.MICRO_BATCH_SIZE)
+        batches = decode_stage(batches, failures)
+        batches = validate_stage(batches, failures)
+        batches = dedup_stage(
+            batches, write_first, failures, deadline, failed_groups)
+        batches = persist_stage(
+            batches, write_first, failures, deadline, failed_groups)
+        for batch_items in acknowledge_stage(
+                batches, failures, failed_groups):
+            items.extend(batch_items)
+
+        if items:
+            put_metric("BatchItemFailures", len(items))
+        idempotency_store.publish_cache_metrics()
+        return {"batchItemFailures": items}
+    finally:
+        end_summary(details={
+            "records": len(records),
+            "batch_item_failures": [
+                item["itemIdentifier"] for item in items],
+        })
+
+
+def acknowledge_records(records, response, sqs_service):
+    """Explicitly delete every record not reported in ``response``.
+
+    Only needed outside the Lambda event source mapping (e.g. the local
+    runner), which otherwise deletes successful records itself.
+    """
+    failed = {
+        item["itemIdentifier"] for item in response["batchItemFailures"]
+    }
+    not_deleted = set()
+    for record in records:
+        record_id = record["messageId"]
+        if record_id in failed:
+            continue
+        event_source_arn = record["eventSourceARN"]
+        queue_url = sqs_service.resolve_queue_url(
+            event_source_arn.split(":")[-1], record_id, event_source_arn)
+        if not queue_url:
+            not_deleted.add(record_id)
+            continue
+        not_deleted.update(sqs_service.delete_messages(
+            [(record["receiptHandle"], record_id)], queue_url))
+    not_deleted.update(sqs_service.flush_deletes())
+    return not_deleted
@@ -0,0 +1,211 @@
+"""Long-running SQS consumer for ECS/EC2 deployments.
+
+Polls the queue directly instead of being invoked by Lambda::
+
+    python -m daemon --queue-url https://sqs.us-east-1.amazonaws.com/...
+
+A receiver thread long-polls SQS (10 messages, 20s wait) into a bounded
+prefetch buffer, so the next receive overlaps with processing of the
+current batch. Every batch goes through ``message_handler``; successful
+records are deleted with DeleteMessageBatch. Messages still buffered or
+in processing get their visibility timeout extended, and SIGTERM/SIGINT
+stop polling and drain what was already received before exiting.
+"""
+import argparse
+import queue
+import signal
+import threading
+import time
+from controllers.messages import acknowledge_records, message_handler
+from services.sqs import SQSService, arn_from_queue_url
+from utils.config import Config
+from utils.logging import log_message
+from utils.metrics import flush_metrics, put_metric
+
+MAX_MESSAGES = 10
+WAIT_TIME_SECONDS = 20
+RECEIVE_ERROR_BACKOFF = 1
+
+
+def to_record(message: dict, event_source_arn: str) -> dict:
+    return {
+        "messageId": message["MessageId"],
+        "receiptHandle": message["ReceiptHandle"],
+        "body": message["Body"],
+        "attributes": message.get("Attributes", {}),
+        "messageAttributes": message.get("MessageAttributes", {}),
+        "eventSourceARN": event_source_arn,
+    }
+
+
+class VisibilityKeeper:
+    """Extends the visibility timeout of messages still in flight.
+
+    Any tracked message whose timeout expires within half of
+    ``visibility_timeout`` is pushed back by a full ``visibility_timeout``
+    with ChangeMessageVisibilityBatch.
+    """
+
+    def __init__(self, sqs_service, queue_url, visibility_timeout):
+        self.sqs_service = sqs_service
+        self.queue_url = queue_url
+        self.visibility_timeout = visibility_timeout
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def track(self, records):
+        deadline = time.monotonic() + self.visibility_timeout
+        with self._lock:
+            for record in records:
+                self._inflight[record["receiptHandle"]] = (
+                    record["messageId"], deadline)
+
+    def release(self, records):
+        with self._lock:
+            for record in records:
+                self._inflight.pop(record["receiptHandle"], None)
+
+    def extend_due(self):
+        now = time.monotonic()
+        with self._lock:
+            due = [
+                (receipt_handle, trace_id)
+                for receipt_handle, (trace_id, deadline)
+                in self._inflight.items()
+                if deadline - now <= self.visibility_timeout / 2
+            ]
+        if not due:
+            return
+        failed = self.sqs_service.change_visibility(
+            self.queue_url, due, self.visibility_timeout)
+        deadline = time.monotonic() + self.visibility_timeout
+        with self._lock:
+            for receipt_handle, trace_id in due:
+                if trace_id not in failed and \
+                        receipt_handle in self._inflight:
+                    self._inflight[receipt_handle] = (trace_id, deadline)
+        put_metric("VisibilityExtended", len(due) - len(failed))
+
+    def start(self):
+        interval = max(self.visibility_timeout / 4, 0.01)
+
+        def run():
+            while not self._stopped.wait(interval):
+                self.extend_due()
+
+        self._thread = threading.Thread(
+            target=run, name="visibility-keeper", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class Consumer:
+    def __init__(
+            self, queue_url,
+            sqs_service=None,
+            handler=message_handler,
+            prefetch=Config.DAEMON_PREFETCH,
+            visibility_timeout=Config.DAEMON_VISIBILITY_TIMEOUT,
+            wait_time=WAIT_TIME_SECONDS
+    ):
+        self.queue_url = queue_url
+        self.sqs_service = sqs_service or SQSService(queue_url=queue_url)
+        self.handler = handler
+        self.wait_time = wait_time
+        self.visibility_timeout = visibility_timeout
+        self.event_source_arn = arn_from_queue_url(queue_url, Config.REGION)
+        self.sqs_service.queue_urls[
+            self.event_source_arn.split(":")[-1]] = queue_url
+        self.buffer = queue.Queue(maxsize=max(prefetch, 1))
+        self.keeper = VisibilityKeeper(
+            self.sqs_service, queue_url, visibility_timeout)
+        self.stopping = threading.Event()
+        self.processed = 0
+
+    def stop(self, *_):
+        if not self.stopping.is_set():
+            log_message("consumer", "consumer_stop", "info", {
+                "queue_url": self.queue_url})
+        self.stopping.set()
+
+    def run(self):
+        """Consume until :meth:`stop` is called, then drain and return."""
+        receiver = threading.Thread(
+            target=self._receive_loop, name="sqs-receiver", daemon=True)
+        receiver.start()
+        self.keeper.start()
+        try:
+            while receiver.is_alive() or not self.buffer.empty():
+                try:
+                    records = self.buffer.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                self._process(records)
+        finally:
+            self.keeper.stop()
+            self.sqs_service.flush_deletes()
+            flush_metrics()
+        return self.processed
+
+    def _receive_loop(self):
+        backoff = RECEIVE_ERROR_BACKOFF if self.wait_time else 0.01
+        while not self.stopping.is_set():
+            started = time.monotonic()
+            messages = self.sqs_service.receive_messages(
+                self.queue_url, MAX_MESSAGES, self.wait_time,
+                self.visibility_timeout)
+            if not messages:
+                self.stopping.wait(
+                    max(backoff - (time.monotonic() - started), 0))
+                continue
+            records = [
+                to_record(message, self.event_source_arn)
+                for message in messages
+            ]
+            self.keeper.track(records)
+            self.buffer.put(records)
+
+    def _process(self, records):
+        try:
+            response = self.handler({"Records": records})
+            acknowledge_records(records, response, self.sqs_service)
+            self.processed += len(records)
+            put_metric("MessagesProcessed", len(records))
+        except Exception as e:
+            log_message("consumer", "consumer_batch", "error", {
+                "error": str(e), "records": len(records)})
+            put_metric("ConsumerBatchError", 1)
+        finally:
+            self.keeper.release(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Long-polling SQS consumer daemon")
+    parser.add_argument("--queue-url", default=Config.QUEUE_URL)
+    parser.add_argument(
+        "--prefetch", type=int, default=Config.DAEMON_PREFETCH)
+    parser.add_argument(
+        "--visibility-timeout", type=int,
+        default=Config.DAEMON_VISIBILITY_TIMEOUT)
+    args = parser.parse_args(argv)
+    if not args.queue_url:
+        parser.error("--queue-url or QUEUE_URL is required")
+
+    consumer = Consumer(
+        args.queue_url,
+        prefetch=args.prefetch,
+        visibility_timeout=args.visibility_timeout)
+    signal.signal(signal.SIGTERM, consumer.stop)
+    signal.signal(signal.SIGINT, consumer.stop)
+    consumer.run()
+
+
+if __name__ == "__main__":
+    main()
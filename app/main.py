@@ -1,9 +1,15 @@
 import json
-from controllers.messages import message_handler
+from controllers.messages import acknowledge_records, message_handler
+from utils.metrics import flush_metrics
+from utils.profiling import profile_invocation
 
 
 def handler(event, context):
-    return message_handler(event)
+    try:
+        with profile_invocation():
+            return message_handler(event, context)
+    finally:
+        flush_metrics()
 
 
 if __name__ == "__main__":
@@ -26,4 +32,7 @@ if __name__ == "__main__":
             }
         ]
     }
-    handler(event, None)
+    from services.sqs import SQSService
+
+    response = handler(event, None)
+    acknowledge_records(event["Records"], response, SQSService())
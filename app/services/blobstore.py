@@ -0,0 +1,65 @@
+import os
+from urllib.parse import urlparse
+from utils.aws import get_client
+
+
+class FileBlobStore:
+    """Blob store on the local filesystem, a stand-in for S3 in local runs."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def put(self, key: str, data: bytes) -> str:
+        root = os.path.abspath(self.root)
+        path = os.path.abspath(os.path.join(root, key))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"Blob key outside the store: {key}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as blob:
+            blob.write(data)
+        os.replace(temp_path, path)
+        return f"file://{path}"
+
+    def get(self, url: str) -> bytes:
+        with open(urlparse(url).path, "rb") as blob:
+            return blob.read()
+
+
+class S3BlobStore:
+    def __init__(self, bucket: str, prefix: str = ""):
+        self.bucket = bucket
+        self.prefix = prefix
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client("s3")
+        return self._client
+
+    def put(self, key: str, data: bytes) -> str:
+        key = f"{self.prefix}{key}"
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data)
+        return f"s3://{self.bucket}/{key}"
+
+    def get(self, url: str) -> bytes:
+        location = urlparse(url)
+        response = self.client.get_object(
+            Bucket=location.netloc, Key=location.path.lstrip("/"))
+        return response["Body"].read()
+
+
+def create_blob_store(url: str | None):
+    """Build the blob store for ``s3://bucket/prefix`` or a local path."""
+    if not url:
+        return None
+    location = urlparse(url)
+    if location.scheme == "s3":
+        prefix = location.path.lstrip("/")
+        if prefix and not prefix.endswith("/"):
+            prefix += "/"
+        return S3BlobStore(location.netloc, prefix)
+    if location.scheme in ("", "file"):
+        return FileBlobStore(location.path)
+    raise ValueError(f"Unsupported blob store: {url}")
@@ -1,20 +1,194 @@
-import boto3
-from utils.convert import convert_floats_to_decimal
+import time
+from services.blobstore import create_blob_store
+from services.idempotency import (
+    DUPLICATE, FAILED, SAVED, IdempotencyStore)
+from services.payload import PayloadCodec, attribute_size
+from utils.aws import get_client
 from utils.config import Config
 from utils.logging import log_message
 from utils.metrics import put_metric
+from utils.ratelimit import TokenBucket, backoff_delay
+from utils.timing import timed
 
+BATCH_GET_LIMIT = 100
+BATCH_WRITE_LIMIT = 25
+TRANSACT_WRITE_LIMIT = 100
+TRANSACT_WRITE_MAX_BYTES = 4 * 1024 * 1024
+BATCH_MAX_RETRIES = 3
+BATCH_RETRY_BASE_DELAY = 0.05
+BACKOFF_MAX_DELAY = 1.0
+THROTTLING_ERRORS = {
+    "ProvisionedThroughputExceededException",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+}
+THROTTLING_REASONS = {"ProvisionedThroughputExceeded", "ThrottlingError"}
+RETRYABLE_REASONS = {None, "None", "TransactionConflict"} | THROTTLING_REASONS
+TRANSIENT_ERRORS = {
+    "InternalServerError",
+    "InternalFailure",
+    "ServiceUnavailable",
+    "RequestTimeout",
+    "RequestTimeoutException",
+}
+
+
+def error_code(error: Exception) -> str | None:
+    response = getattr(error, "response", None) or {}
+    return response.get("Error", {}).get("Code")
+
+
+def is_conditional_check_failure(error: Exception) -> bool:
+    return error_code(error) == "ConditionalCheckFailedException"
+
+
+def is_throttling_error(error: Exception) -> bool:
+    return error_code(error) in THROTTLING_ERRORS
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Server-side failures and connection errors worth another attempt."""
+    from botocore.exceptions import ConnectionError, HTTPClientError
+
+    response = getattr(error, "response", None) or {}
+    status = response.get("ResponseMetadata", {}).get("HTTPStatusCode", 0)
+    return error_code(error) in TRANSIENT_ERRORS or status >= 500 or \
+        isinstance(error, (ConnectionError, HTTPClientError))
+
+
+class DynamoDBService(IdempotencyStore):
+    """Idempotent message storage on a DynamoDB table.
+
+    Calls are rate limited and retried within the invocation deadline.
+    """
 
-class DynamoDBService:
     def __init__(self):
+        super().__init__()
         self.table_name = Config.DYNAMO_TABLE
-        self.dynamodb = boto3.resource("dynamodb", region_name=Config.REGION)
-        self.table = self.dynamodb.Table(self.table_name)
+        self.marker_table = Config.IDEMPOTENCY_TABLE
+        if Config.IDEMPOTENCY_TTL > 0 and not self.marker_table:
+            log_message("config", "idempotency_ttl_ignored", "warning", {
+                "reason": "IDEMPOTENCY_TTL needs IDEMPOTENCY_TABLE; TTL on "
+                          "message items would delete stored payloads"})
+        self._client = None
+        self._serializer = None
+        self.read_limiter = TokenBucket(Config.DYNAMO_READ_RATE)
+        self.write_limiter = TokenBucket(Config.DYNAMO_WRITE_RATE)
+        self.codec = PayloadCodec(
+            Config.PAYLOAD_COMPRESS_THRESHOLD,
+            Config.PAYLOAD_OFFLOAD_THRESHOLD,
+            create_blob_store(Config.PAYLOAD_BLOB_STORE)
+        )
+
+    @property
+    def dedup_table(self) -> str:
+        return self.marker_table or self.table_name
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client("dynamodb", max_attempts=1)
+        return self._client
+
+    def serialize(self, item: dict) -> dict:
+        if self._serializer is None:
+            from boto3.dynamodb.types import TypeSerializer
+
+            self._serializer = TypeSerializer()
+        typed = {
+            key: self._serializer.serialize(value)
+            for key, value in item.items()
+        }
+        if "payload" in typed:
+            typed.update(self.codec.encode(typed.pop("payload")))
+        return typed
+
+    def deserialize(self, typed: dict) -> dict:
+        from boto3.dynamodb.types import TypeDeserializer
+
+        deserializer = TypeDeserializer()
+        return {
+            key: deserializer.deserialize(value)
+            for key, value in self.codec.decode(typed).items()
+        }
+
+    def get_message(self, message_id: str) -> tuple[dict | None, str | None]:
+        """Read a stored message, decoding compressed/offloaded payloads."""
+        try:
+            response = self._call(
+                self.read_limiter, 1, "get_item",
+                TableName=self.table_name,
+                Key={"message_id": {"S": message_id}}
+            )
+            item = response.get("Item")
+            return (self.deserialize(item) if item else None), None
+        except Exception as e:
+            log_message(message_id, "dynamodb_get", "error", {
+                "error": str(e)})
+            put_metric("DynamoDBGetError", 1)
+            return None, "DynamoDB error"
+
+    def _call(self, limiter: TokenBucket, units: int, operation: str,
+              **params) -> dict:
+        """Run a client operation under ``limiter``, retrying throttles.
+
+        The client makes a single attempt, so this loop owns every retry:
+        throttling errors slow the limiter down and, like transient
+        errors, are retried up to ``DYNAMO_THROTTLE_RETRIES`` times; any
+        other error is raised.
+        """
+        for attempt in range(Config.DYNAMO_THROTTLE_RETRIES + 1):
+            waited = limiter.acquire(units)
+            if waited:
+                put_metric(
+                    "DynamoDBRateLimitWait", waited * 1000,
+                    unit="Milliseconds")
+            try:
+                with timed(f"dynamodb.{operation}"):
+                    response = getattr(self.client, operation)(**params)
+            except Exception as e:
+                throttled = is_throttling_error(e)
+                if (not (throttled or is_transient_error(e)) or
+                        attempt == Config.DYNAMO_THROTTLE_RETRIES):
+                    raise
+                if throttled:
+                    limiter.on_throttle()
+                    put_metric("DynamoDBThrottles", 1)
+                if not self._backoff(attempt):
+                    raise
+                continue
+            limiter.on_success()
+            return response
+
+    def _backoff(self, attempt: int) -> bool:
+        """Sleep before a retry; False when it would overrun the deadline."""
+        delay = backoff_delay(
+            attempt, BATCH_RETRY_BASE_DELAY, BACKOFF_MAX_DELAY)
+        if self.deadline is not None and delay >= self.deadline.remaining():
+            return False
+        time.sleep(delay)
+        put_metric("DynamoDBBackoffWait", delay * 1000, unit="Milliseconds")
+        return True
 
     def exists_message(self, message_id: str) -> tuple[bool, str | None]:
+        if self.cache.contains(message_id):
+            log_message(
+                message_id,
+                "dynamodb_check",
+                "success",
+                {"exists": True, "cached": True}
+            )
+            return True, None
         try:
-            response = self.table.get_item(Key={"message_id": message_id})
+            response = self._call(
+                self.read_limiter, 1, "get_item",
+                TableName=self.dedup_table,
+                Key={"message_id": {"S": message_id}},
+                ProjectionExpression="message_id"
+            )
             exists = "Item" in response
+            if exists:
+                self.cache.add(message_id)
             log_message(
                 message_id,
                 "dynamodb_check",
@@ -32,22 +206,151 @@ class DynamoDBService:
             put_metric("DynamoDBCheckError", 1)
             return False, "DynamoDB error"
 
+    def exists_messages(
+            self, message_ids: list[str]
+    ) -> tuple[set[str], set[str]]:
+        """Resolve which message_ids are already stored.
+
+        Duplicated ids are collapsed in memory, ids found in the warm
+        container cache are answered locally and the remaining keys are
+        looked up with chunked BatchGetItem calls. Returns the set of ids
+        already stored and the set of ids that could not be checked.
+        """
+        unique_ids = list(dict.fromkeys(message_ids))
+        keys = [mid for mid in unique_ids if isinstance(mid, str) and mid]
+        failed = set(unique_ids) - set(keys)
+        existing = self.cache.get_many(keys)
+        for message_id in existing:
+            log_message(
+                message_id,
+                "dynamodb_check",
+                "success",
+                {"exists": True, "cached": True}
+            )
+        keys = [mid for mid in keys if mid not in existing]
+
+        for start in range(0, len(keys), BATCH_GET_LIMIT):
+            chunk = keys[start:start + BATCH_GET_LIMIT]
+            found, unresolved, err = self._batch_get_keys(chunk)
+            existing.update(found)
+            self.cache.add_many(found)
+            failed.update(unresolved)
+            for message_id in chunk:
+                if message_id in unresolved:
+                    log_message(
+                        message_id,
+                        "dynamodb_check",
+                        "error",
+                        {"error": err}
+                    )
+                    put_metric("DynamoDBCheckError", 1)
+                else:
+                    log_message(
+                        message_id,
+                        "dynamodb_check",
+                        "success",
+                        {"exists": message_id in found}
+                    )
+        return existing, failed
+
+    def _batch_get_keys(
+            self, message_ids: list[str]
+    ) -> tuple[set[str], set[str], str | None]:
+        table_name = self.dedup_table
+        request = {
+            table_name: {
+                "Keys": [{"message_id": {"S": mid}} for mid in message_ids],
+                "ProjectionExpression": "message_id",
+            }
+        }
+        found = set()
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            try:
+                response = self._call(
+                    self.read_limiter,
+                    len(request[table_name]["Keys"]),
+                    "batch_get_item",
+                    RequestItems=request)
+            except Exception as e:
+                pending = {
+                    key["message_id"]["S"]
+                    for key in request[table_name]["Keys"]
+                }
+                return found, pending, str(e)
+
+            for item in response.get("Responses", {}).get(
+                    table_name, []):
+                found.add(item["message_id"]["S"])
+
+            request = response.get("UnprocessedKeys") or {}
+            if not request.get(table_name, {}).get("Keys"):
+                return found, set(), None
+            self.read_limiter.on_throttle()
+            if attempt == BATCH_MAX_RETRIES or not self._backoff(attempt):
+                break
+
+        pending = {
+            key["message_id"]["S"]
+            for key in request[table_name]["Keys"]
+        }
+        return found, pending, "UnprocessedKeys retries exhausted"
+
+    def expire(self) -> int:
+        """Nothing to do: DynamoDB deletes items past their TTL itself."""
+        return 0
+
+    def _ttl_fields(self) -> dict:
+        if Config.IDEMPOTENCY_TTL <= 0:
+            return {}
+        return {
+            Config.IDEMPOTENCY_TTL_ATTRIBUTE:
+                int(time.time()) + Config.IDEMPOTENCY_TTL
+        }
+
+    def _dedup_item(self, message_id: str, item: dict) -> dict:
+        """Item recording ``message_id`` as processed in ``dedup_table``.
+
+        With a marker table this is only the key (plus TTL); otherwise it
+        is the full message item, which never gets a TTL.
+        """
+        if self.marker_table:
+            return {"message_id": message_id, **self._ttl_fields()}
+        return item
+
+    def _put_message(
+            self, message_id: str,
+            message: dict,
+            converted: bool
+    ):
+        """Store one message under the ``attribute_not_exists`` condition.
+
+        With a marker table the payload item is written first, without a
+        condition, so a marker never exists for a message whose payload
+        was lost; a redelivery after a failed marker write just rewrites
+        the same payload.
+        """
+        item = self._build_item(message_id, message, converted)
+        if self.marker_table and Config.STORE_PAYLOADS:
+            self._call(
+                self.write_limiter, 1, "put_item",
+                TableName=self.table_name,
+                Item=self.serialize(item)
+            )
+        self._call(
+            self.write_limiter, 1, "put_item",
+            TableName=self.dedup_table,
+            Item=self.serialize(self._dedup_item(message_id, item)),
+            ConditionExpression="attribute_not_exists(message_id)"
+        )
+
     def save_message(
             self, message_id: str,
-            message: dict
+            message: dict,
+            converted: bool = False
     ) -> tuple[bool, str | None]:
         try:
-            payload = convert_floats_to_decimal(message.get("payload", {}))
-            self.table.put_item(
-                Item={
-                    "message_id": message_id,
-                    "timestamp": message.get("timestamp"),
-                    "source": message.get("source"),
-                    "type": message.get("type"),
-                    "payload": payload,
-                },
-                ConditionExpression="attribute_not_exists(message_id)"
-            )
+            self._put_message(message_id, message, converted)
+            self.cache.add(message_id)
             log_message(message_id, "dynamodb_save", "success")
             put_metric("MessagesSaved", 1)
             return True, None
@@ -56,3 +359,281 @@ class DynamoDBService:
                 "error": str(e)})
             put_metric("DynamoDBSaveError", 1)
             return False, "DynamoDB error"
+
+    def claim_message(
+            self, message_id: str,
+            message: dict,
+            converted: bool = False
+    ) -> tuple[str, str | None]:
+        """Write-first dedup: a single conditional put decides the outcome.
+
+        A failed ``attribute_not_exists`` condition means another delivery
+        already stored the message, so it is reported as ``DUPLICATE``
+        instead of a save error.
+        """
+        if self.cache.contains(message_id):
+            log_message(message_id, "dynamodb_save", "duplicate", {
+                "cached": True})
+            return DUPLICATE, None
+        try:
+            self._put_message(message_id, message, converted)
+            self.cache.add(message_id)
+            log_message(message_id, "dynamodb_save", "success")
+            put_metric("MessagesSaved", 1)
+            return SAVED, None
+        except Exception as e:
+            if is_conditional_check_failure(e):
+                self.cache.add(message_id)
+                log_message(message_id, "dynamodb_save", "duplicate")
+                return DUPLICATE, None
+            log_message(message_id, "dynamodb_save", "error", {
+                "error": str(e)})
+            put_metric("DynamoDBSaveError", 1)
+            return FAILED, "DynamoDB error"
+
+    def save_messages(
+            self, messages: list[tuple[str, dict]],
+            transactional: bool = True,
+            converted: bool = False
+    ) -> dict[str, str]:
+        """Persist many messages in chunks and report each outcome.
+
+        ``transactional`` uses TransactWriteItems with the
+        ``attribute_not_exists`` condition on every put, so duplicates are
+        detected by DynamoDB. Otherwise BatchWriteItem is used, which is
+        only safe once the dedup check has already been done. Returns a
+        mapping of message_id to ``SAVED``, ``DUPLICATE`` or ``FAILED``.
+        """
+        items = {}
+        outcomes = {}
+        cached = self.cache.get_many([mid for mid, _ in messages])
+        for message_id, message in messages:
+            if message_id in cached:
+                outcomes[message_id] = DUPLICATE
+            elif message_id not in items:
+                items[message_id] = self._build_item(
+                    message_id, message, converted)
+
+        if transactional:
+            limit, write_chunk = TRANSACT_WRITE_LIMIT, self._transact_put
+        else:
+            limit, write_chunk = BATCH_WRITE_LIMIT, self._batch_put
+
+        message_ids = list(items)
+        for start in range(0, len(message_ids), limit):
+            chunk = {
+                message_id: items[message_id]
+                for message_id in message_ids[start:start + limit]
+            }
+            chunk_outcomes, err = self._write_chunk(chunk, write_chunk)
+            outcomes.update(chunk_outcomes)
+            self.cache.add_many(
+                message_id for message_id, status in chunk_outcomes.items()
+                if status != FAILED)
+            for message_id in chunk:
+                status = chunk_outcomes[message_id]
+                if status == SAVED:
+                    log_message(message_id, "dynamodb_save", "success")
+                elif status == DUPLICATE:
+                    log_message(message_id, "dynamodb_save", "duplicate")
+                else:
+                    log_message(message_id, "dynamodb_save", "error", {
+                        "error": err})
+
+        saved = sum(1 for status in outcomes.values() if status == SAVED)
+        failed = sum(1 for status in outcomes.values() if status == FAILED)
+        if saved:
+            put_metric("MessagesSaved", saved)
+        if failed:
+            put_metric("DynamoDBSaveError", failed)
+        return outcomes
+
+    def _write_chunk(self, items: dict[str, dict], write_chunk):
+        if not self.marker_table:
+            return write_chunk({
+                message_id: self._dedup_item(message_id, item)
+                for message_id, item in items.items()
+            }, self.table_name)
+
+        outcomes = {}
+        err = None
+        if Config.STORE_PAYLOADS:
+            message_ids = list(items)
+            for start in range(0, len(message_ids), BATCH_WRITE_LIMIT):
+                payload_outcomes, payload_err = self._batch_put({
+                    message_id: items[message_id]
+                    for message_id in message_ids[
+                        start:start + BATCH_WRITE_LIMIT]
+                }, self.table_name)
+                for message_id, status in payload_outcomes.items():
+                    if status == FAILED:
+                        outcomes[message_id] = FAILED
+                        err = payload_err
+        markers = {
+            message_id: self._dedup_item(message_id, item)
+            for message_id, item in items.items()
+            if message_id not in outcomes
+        }
+        if markers:
+            marker_outcomes, marker_err = write_chunk(
+                markers, self.marker_table)
+            outcomes.update(marker_outcomes)
+            err = marker_err or err
+        return outcomes, err
+
+    def _transact_put(
+            self, items: dict[str, dict],
+            table_name: str
+    ) -> tuple[dict[str, str], str | None]:
+        """Write ``items`` in transactions of at most 4 MB of items."""
+        typed, outcomes, err = self._serialize_items(items)
+        for chunk in _size_chunks(typed, TRANSACT_WRITE_MAX_BYTES):
+            chunk_outcomes, chunk_err = self._transact_chunk(
+                chunk, table_name)
+            outcomes.update(chunk_outcomes)
+            err = chunk_err or err
+        return outcomes, err
+
+    def _serialize_items(
+            self, items: dict[str, dict]
+    ) -> tuple[dict[str, dict], dict[str, str], str | None]:
+        """Serialize each item, failing only the ones that cannot be."""
+        typed = {}
+        outcomes = {}
+        err = None
+        for message_id, item in items.items():
+            try:
+                typed[message_id] = self.serialize(item)
+            except Exception as e:
+                outcomes[message_id] = FAILED
+                err = str(e)
+        return typed, outcomes, err
+
+    def _transact_chunk(
+            self, typed: dict[str, dict],
+            table_name: str
+    ) -> tuple[dict[str, str], str | None]:
+        outcomes = {}
+        pending = list(typed)
+        err = None
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            try:
+                self._call(self.write_limiter, 2 * len(pending),
+                           "transact_write_items", TransactItems=[
+                    {
+                        "Put": {
+                            "TableName": table_name,
+                            "Item": typed[message_id],
+                            "ConditionExpression":
+                                "attribute_not_exists(message_id)",
+                        }
+                    }
+                    for message_id in pending
+                ])
+                outcomes.update(dict.fromkeys(pending, SAVED))
+                return outcomes, err if FAILED in outcomes.values() else None
+            except Exception as e:
+                err = str(e)
+                response = getattr(e, "response", None) or {}
+                reasons = response.get("CancellationReasons") or []
+                if len(reasons) != len(pending):
+                    break
+                retry = []
+                codes = set()
+                for message_id, reason in zip(pending, reasons):
+                    code = reason.get("Code")
+                    if code == "ConditionalCheckFailed":
+                        outcomes[message_id] = DUPLICATE
+                    elif code in RETRYABLE_REASONS:
+                        retry.append(message_id)
+                        codes.add(code)
+                    else:
+                        outcomes[message_id] = FAILED
+                pending = retry
+                if not pending:
+                    failed = FAILED in outcomes.values()
+                    return outcomes, err if failed else None
+                codes -= {None, "None"}
+                if not codes:
+                    continue
+                if codes & THROTTLING_REASONS:
+                    self.write_limiter.on_throttle()
+            if attempt == BATCH_MAX_RETRIES or not self._backoff(attempt):
+                break
+
+        outcomes.update(dict.fromkeys(pending, FAILED))
+        return outcomes, err
+
+    def _batch_put(
+            self, items: dict[str, dict],
+            table_name: str
+    ) -> tuple[dict[str, str], str | None]:
+        typed, outcomes, err = self._serialize_items(items)
+        if not typed:
+            return outcomes, err
+        request = {
+            table_name: [
+                {"PutRequest": {"Item": item}} for item in typed.values()
+            ]
+        }
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            try:
+                response = self._call(
+                    self.write_limiter,
+                    len(request[table_name]),
+                    "batch_write_item",
+                    RequestItems=request)
+            except Exception as e:
+                pending = _pending_put_ids(request, table_name)
+                outcomes.update(_outcomes(typed, pending))
+                return outcomes, str(e)
+
+            request = response.get("UnprocessedItems") or {}
+            if not request.get(table_name):
+                outcomes.update(dict.fromkeys(typed, SAVED))
+                return outcomes, err
+            self.write_limiter.on_throttle()
+            if attempt == BATCH_MAX_RETRIES or not self._backoff(attempt):
+                break
+
+        pending = _pending_put_ids(request, table_name)
+        outcomes.update(_outcomes(typed, pending))
+        return outcomes, "UnprocessedItems retries exhausted"
+
+
+def item_size(typed: dict) -> int:
+    return sum(
+        len(name.encode("utf-8")) + attribute_size(value)
+        for name, value in typed.items())
+
+
+def _size_chunks(typed: dict[str, dict], max_bytes: int):
+    """Split typed items into dicts whose total size stays in ``max_bytes``.
+
+    An item larger than ``max_bytes`` on its own still gets its own chunk
+    so DynamoDB reports the error for that item only.
+    """
+    chunk, size = {}, 0
+    for message_id, item in typed.items():
+        item_bytes = item_size(item)
+        if chunk and size + item_bytes > max_bytes:
+            yield chunk
+            chunk, size = {}, 0
+        chunk[message_id] = item
+        size += item_bytes
+    if chunk:
+        yield chunk
+
+
+def _pending_put_ids(request: dict, table_name: str) -> set[str]:
+    return {
+        entry["PutRequest"]["Item"]["message_id"]["S"]
+        for entry in request.get(table_name, [])
+    }
+
+
+def _outcomes(items: dict[str, dict], failed: set[str]) -> dict[str, str]:
+    return {
+        message_id: FAILED if message_id in failed else SAVED
+        for message_id in items
+    }
@@ -0,0 +1,415 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from utils.cache import LRUCache
+from utils.config import Config
+from utils.convert import convert_floats_to_decimal
+from utils.logging import log_message
+from utils.metrics import put_metric
+
+SAVED = "saved"
+DUPLICATE = "duplicate"
+FAILED = "failed"
+
+EXPIRE_INTERVAL = 60
+SQLITE_MAX_VARIABLES = 500
+
+
+class IdempotencyStore(ABC):
+    """Records which message_ids were already processed.
+
+    Ids in the warm container ``cache`` count as ``DUPLICATE`` without
+    touching the backing store.
+    """
+
+    def __init__(self):
+        self.cache = LRUCache(
+            Config.IDEMPOTENCY_CACHE_SIZE,
+            Config.IDEMPOTENCY_CACHE_TTL,
+            Config.IDEMPOTENCY_CACHE_MAX_BYTES
+        )
+        self.deadline = None
+
+    @abstractmethod
+    def exists_message(self, message_id: str) -> tuple[bool, str | None]:
+        """Check one id; returns ``(exists, error)``."""
+
+    @abstractmethod
+    def exists_messages(
+            self, message_ids: list[str]
+    ) -> tuple[set[str], set[str]]:
+        """Bulk check; returns the existing ids and the ids that failed."""
+
+    @abstractmethod
+    def save_message(
+            self, message_id: str,
+            message: dict,
+            converted: bool = False
+    ) -> tuple[bool, str | None]:
+        """Save a message already checked; returns ``(saved, error)``."""
+
+    @abstractmethod
+    def claim_message(
+            self, message_id: str,
+            message: dict,
+            converted: bool = False
+    ) -> tuple[str, str | None]:
+        """Save only if absent; returns ``(SAVED|DUPLICATE|FAILED, error)``."""
+
+    @abstractmethod
+    def save_messages(
+            self, messages: list[tuple[str, dict]],
+            transactional: bool = True,
+            converted: bool = False
+    ) -> dict[str, str]:
+        """Bulk claim (``transactional``) or bulk save; outcome per id."""
+
+    @abstractmethod
+    def get_message(self, message_id: str) -> tuple[dict | None, str | None]:
+        """Read a stored item; returns ``(item or None, error)``."""
+
+    @abstractmethod
+    def expire(self) -> int:
+        """Delete records past ``IDEMPOTENCY_TTL``; returns how many."""
+
+    def publish_cache_metrics(self):
+        stats = self.cache.pop_stats()
+        for name, key in (
+                ("IdempotencyCacheHits", "hits"),
+                ("IdempotencyCacheMisses", "misses"),
+                ("IdempotencyCacheEvictions", "evictions")):
+            if stats[key]:
+                put_metric(name, stats[key])
+
+    def _build_item(
+            self, message_id: str,
+            message: dict,
+            converted: bool = False
+    ) -> dict:
+        payload = message.get("payload", {})
+        if not converted:
+            payload = convert_floats_to_decimal(payload)
+        return {
+            "message_id": message_id,
+            "timestamp": message.get("timestamp"),
+            "source": message.get("source"),
+            "type": message.get("type"),
+            "payload": payload,
+        }
+
+
+class LocalIdempotencyStore(IdempotencyStore):
+    """Check and claim logic shared by the stores without network calls.
+
+    Subclasses implement ``_lookup`` (which ids are recorded and not
+    expired), ``_insert`` (record items in one batch, returning the ids
+    that were already recorded when ``conditional``), ``_get`` and
+    ``_expire``. Items are kept only with ``STORE_PAYLOADS``; expired
+    records count as absent and are purged at most every
+    ``EXPIRE_INTERVAL`` seconds.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._expired_at = time.monotonic()
+
+    def _expires_at(self) -> float | None:
+        if Config.IDEMPOTENCY_TTL <= 0:
+            return None
+        return time.time() + Config.IDEMPOTENCY_TTL
+
+    def expire(self) -> int:
+        self._expired_at = time.monotonic()
+        return self._expire(time.time())
+
+    def _maybe_expire(self):
+        if Config.IDEMPOTENCY_TTL > 0 and \
+                time.monotonic() - self._expired_at >= EXPIRE_INTERVAL:
+            self.expire()
+
+    def get_message(self, message_id: str) -> tuple[dict | None, str | None]:
+        try:
+            return self._get(message_id), None
+        except Exception as e:
+            log_message(message_id, "idempotency_get", "error", {
+                "error": str(e)})
+            put_metric("IdempotencyStoreError", 1)
+            return None, "Idempotency store error"
+
+    def exists_message(self, message_id: str) -> tuple[bool, str | None]:
+        existing, failed = self.exists_messages([message_id])
+        if failed:
+            return False, "Idempotency store error"
+        return message_id in existing, None
+
+    def exists_messages(
+            self, message_ids: list[str]
+    ) -> tuple[set[str], set[str]]:
+        unique_ids = list(dict.fromkeys(message_ids))
+        keys = [mid for mid in unique_ids if isinstance(mid, str) and mid]
+        failed = set(unique_ids) - set(keys)
+        existing = self.cache.get_many(keys)
+        for message_id in existing:
+            log_message(message_id, "idempotency_check", "success", {
+                "exists": True, "cached": True})
+        keys = [mid for mid in keys if mid not in existing]
+        try:
+            found = self._lookup(keys) if keys else set()
+        except Exception as e:
+            for message_id in keys:
+                log_message(message_id, "idempotency_check", "error", {
+                    "error": str(e)})
+            put_metric("IdempotencyStoreError", len(keys))
+            return existing, failed | set(keys)
+        self.cache.add_many(found)
+        existing.update(found)
+        for message_id in keys:
+            log_message(message_id, "idempotency_check", "success", {
+                "exists": message_id in found})
+        return existing, failed
+
+    def save_message(
+            self, message_id: str,
+            message: dict,
+            converted: bool = False
+    ) -> tuple[bool, str | None]:
+        status = self.save_messages(
+            [(message_id, message)], transactional=True,
+            converted=converted)[message_id]
+        if status == SAVED:
+            return True, None
+        return False, "Idempotency store error"
+
+    def claim_message(
+            self, message_id: str,
+            message: dict,
+            converted: bool = False
+    ) -> tuple[str, str | None]:
+        status = self.save_messages(
+            [(message_id, message)], transactional=True,
+            converted=converted)[message_id]
+        if status == FAILED:
+            return status, "Idempotency store error"
+        return status, None
+
+    def save_messages(
+            self, messages: list[tuple[str, dict]],
+            transactional: bool = True,
+            converted: bool = False
+    ) -> dict[str, str]:
+        """Record many messages in one batch and report each outcome.
+
+        ``transactional`` only records ids not already present and
+        reports the others as ``DUPLICATE``; otherwise every item is
+        written as is.
+        """
+        self._maybe_expire()
+        outcomes = {}
+        items = {}
+        cached = self.cache.get_many([mid for mid, _ in messages])
+        for message_id, message in messages:
+            if message_id in cached:
+                outcomes[message_id] = DUPLICATE
+            elif message_id not in items:
+                items[message_id] = self._build_item(
+                    message_id, message, converted)
+        if not items:
+            return outcomes
+
+        try:
+            existing = self._insert(items, transactional)
+        except Exception as e:
+            for message_id in items:
+                outcomes[message_id] = FAILED
+                log_message(message_id, "idempotency_save", "error", {
+                    "error": str(e)})
+            put_metric("IdempotencyStoreError", len(items))
+            return outcomes
+
+        self.cache.add_many(items)
+        for message_id in items:
+            if message_id in existing:
+                outcomes[message_id] = DUPLICATE
+                log_message(message_id, "idempotency_save", "duplicate")
+            else:
+                outcomes[message_id] = SAVED
+                log_message(message_id, "idempotency_save", "success")
+        saved = len(items) - len(existing)
+        if saved:
+            put_metric("MessagesSaved", saved)
+        return outcomes
+
+
+class MemoryIdempotencyStore(LocalIdempotencyStore):
+    """Process-local store for tests, benchmarks and local pipelines.
+
+    Nothing is shared between processes or survives a restart.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.records = {}
+        self._lock = threading.Lock()
+
+    def _live(self, message_id: str, now: float) -> bool:
+        record = self.records.get(message_id)
+        return record is not None and (
+            record[0] is None or record[0] > now)
+
+    def _lookup(self, message_ids: list[str]) -> set[str]:
+        now = time.time()
+        with self._lock:
+            return {mid for mid in message_ids if self._live(mid, now)}
+
+    def _insert(self, items: dict[str, dict], conditional: bool) -> set[str]:
+        now = time.time()
+        expires_at = self._expires_at()
+        existing = set()
+        with self._lock:
+            for message_id, item in items.items():
+                if conditional and self._live(message_id, now):
+                    existing.add(message_id)
+                    continue
+                self.records[message_id] = (
+                    expires_at, item if Config.STORE_PAYLOADS else None)
+        return existing
+
+    def _get(self, message_id: str) -> dict | None:
+        with self._lock:
+            if not self._live(message_id, time.time()):
+                return None
+            return self.records[message_id][1]
+
+    def _expire(self, now: float) -> int:
+        with self._lock:
+            expired = [
+                message_id for message_id, (expires_at, _)
+                in self.records.items()
+                if expires_at is not None and expires_at <= now
+            ]
+            for message_id in expired:
+                del self.records[message_id]
+        return len(expired)
+
+
+class SQLiteIdempotencyStore(LocalIdempotencyStore):
+    """Store on a SQLite database file, shareable between local processes.
+
+    The database runs in WAL mode, so readers never block the writer,
+    with ``synchronous=NORMAL``: a power loss may drop the last commits
+    but never corrupts the file. Each ``save_messages`` call is a single
+    ``BEGIN IMMEDIATE`` transaction; items are stored as JSON of their
+    DynamoDB typed form, so numbers come back as the same Decimals.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        self._connection = None
+        self._lock = threading.Lock()
+        self._serializer = None
+        self._deserializer = None
+
+    def _dumps(self, item: dict) -> str:
+        if self._serializer is None:
+            from boto3.dynamodb.types import TypeSerializer
+
+            self._serializer = TypeSerializer()
+        return json.dumps(
+            self._serializer.serialize(item)["M"], separators=(",", ":"))
+
+    def _loads(self, text: str) -> dict:
+        if self._deserializer is None:
+            from boto3.dynamodb.types import TypeDeserializer
+
+            self._deserializer = TypeDeserializer()
+        return self._deserializer.deserialize({"M": json.loads(text)})
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            import sqlite3
+
+            connection = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None,
+                check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS messages ("
+                "message_id TEXT PRIMARY KEY, expires_at REAL, item TEXT)")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS messages_expires_at "
+                "ON messages (expires_at)")
+            self._connection = connection
+        return self._connection
+
+    def _select_live(self, message_ids: list[str], now: float) -> set[str]:
+        found = set()
+        for start in range(0, len(message_ids), SQLITE_MAX_VARIABLES):
+            chunk = message_ids[start:start + SQLITE_MAX_VARIABLES]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.connection.execute(
+                f"SELECT message_id FROM messages "
+                f"WHERE message_id IN ({placeholders}) "
+                f"AND (expires_at IS NULL OR expires_at > ?)",
+                [*chunk, now])
+            found.update(row[0] for row in rows)
+        return found
+
+    def _lookup(self, message_ids: list[str]) -> set[str]:
+        with self._lock:
+            return self._select_live(message_ids, time.time())
+
+    def _insert(self, items: dict[str, dict], conditional: bool) -> set[str]:
+        expires_at = self._expires_at()
+        rows = [
+            (message_id, expires_at,
+             self._dumps(item) if Config.STORE_PAYLOADS else None)
+            for message_id, item in items.items()
+        ]
+        with self._lock:
+            connection = self.connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                existing = self._select_live(
+                    list(items), time.time()) if conditional else set()
+                connection.executemany(
+                    "INSERT OR REPLACE INTO messages "
+                    "(message_id, expires_at, item) VALUES (?, ?, ?)",
+                    [row for row in rows if row[0] not in existing])
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+        return existing
+
+    def _get(self, message_id: str) -> dict | None:
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT item FROM messages WHERE message_id = ? "
+                "AND (expires_at IS NULL OR expires_at > ?)",
+                (message_id, time.time())).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return self._loads(row[0])
+
+    def _expire(self, now: float) -> int:
+        with self._lock:
+            return self.connection.execute(
+                "DELETE FROM messages WHERE expires_at <= ?",
+                (now,)).rowcount
+
+
+def create_idempotency_store(url: str | None):
+    """Build the store for ``dynamodb``, ``memory`` or ``sqlite://<path>``."""
+    if not url or url == "dynamodb":
+        from services.dynamodb import DynamoDBService
+
+        return DynamoDBService()
+    if url == "memory":
+        return MemoryIdempotencyStore()
+    if url.startswith("sqlite://"):
+        return SQLiteIdempotencyStore(url[len("sqlite://"):])
+    raise ValueError(f"Unsupported idempotency store: {url}")
@@ -0,0 +1,106 @@
+import hashlib
+import json
+import zlib
+from services.blobstore import create_blob_store
+from utils.metrics import put_metric
+
+ZLIB = "zlib"
+BLOB_ZLIB = "blob+zlib"
+
+
+def attribute_size(value: dict) -> int:
+    """Approximate billed size of a typed DynamoDB attribute value."""
+    (kind, data), = value.items()
+    if kind == "S":
+        return len(data.encode("utf-8"))
+    if kind == "N":
+        digits = data.lstrip("-").replace(".", "").strip("0")
+        return (len(digits) + 1) // 2 + 1
+    if kind == "B":
+        return len(data)
+    if kind == "M":
+        return 3 + sum(
+            len(key.encode("utf-8")) + attribute_size(item) + 1
+            for key, item in data.items())
+    if kind == "L":
+        return 3 + sum(attribute_size(item) + 1 for item in data)
+    if kind in ("SS", "NS", "BS"):
+        return sum(attribute_size({kind[0]: item}) for item in data)
+    return 1
+
+
+class PayloadCodec:
+    """Storage codec for the typed ``payload`` attribute.
+
+    Payloads up to ``compress_threshold`` bytes stay native maps. Larger
+    ones are stored as zlib-compressed JSON of their typed form in a
+    binary attribute, unless that is not smaller, and compressed
+    payloads still above ``offload_threshold`` go to ``blob_store`` with
+    only the pointer kept on the item. ``payload_encoding`` records which
+    form was used.
+
+    Blobs are named after the SHA-256 of their content, never after the
+    untrusted ``message_id``. A duplicate delivery therefore cannot
+    overwrite the blob of an item already stored: it writes either the
+    same bytes or a blob of its own.
+    """
+
+    def __init__(self, compress_threshold: int, offload_threshold: int,
+                 blob_store=None):
+        self.compress_threshold = compress_threshold
+        self.offload_threshold = offload_threshold
+        self.blob_store = blob_store
+
+    @property
+    def enabled(self) -> bool:
+        return self.compress_threshold > 0
+
+    def encode(self, payload: dict) -> dict:
+        """Return the typed item fields that store ``payload``."""
+        if not self.enabled:
+            return {"payload": payload}
+        size = attribute_size(payload)
+        if size <= self.compress_threshold:
+            return {"payload": payload}
+
+        data = zlib.compress(
+            json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        if self.blob_store is not None and \
+                len(data) > self.offload_threshold:
+            digest = hashlib.sha256(data).hexdigest()
+            url = self.blob_store.put(f"payloads/{digest}.json.zz", data)
+            fields = {
+                "payload": {"S": url},
+                "payload_encoding": {"S": BLOB_ZLIB},
+            }
+            metric = "PayloadsOffloaded"
+        else:
+            fields = {
+                "payload": {"B": data},
+                "payload_encoding": {"S": ZLIB},
+            }
+            metric = "PayloadsCompressed"
+        stored = sum(
+            len(name) + attribute_size(value)
+            for name, value in fields.items())
+        if stored >= size:
+            return {"payload": payload}
+        put_metric(metric, 1)
+        put_metric("PayloadBytesSaved", size - stored, unit="Bytes")
+        return fields
+
+    def decode(self, item: dict) -> dict:
+        """Return ``item`` with its typed ``payload`` map restored."""
+        encoding = item.get("payload_encoding", {}).get("S")
+        if encoding is None:
+            return item
+        item = dict(item)
+        del item["payload_encoding"]
+        if encoding == BLOB_ZLIB:
+            url = item["payload"]["S"]
+            blob_store = self.blob_store or create_blob_store(url)
+            data = blob_store.get(url)
+        else:
+            data = item["payload"]["B"]
+        item["payload"] = json.loads(zlib.decompress(data))
+        return item
@@ -1,14 +1,55 @@
-import boto3
-from utils.config import Config
+import time
+from utils.aws import get_client
 from utils.logging import log_message
 from utils.metrics import put_metric
+from utils.timing import timed
+
+DELETE_BATCH_LIMIT = 10
+VISIBILITY_BATCH_LIMIT = 10
+SEND_BATCH_LIMIT = 10
+SEND_BATCH_MAX_BYTES = 256 * 1024
+DELETE_MAX_RETRIES = 3
+DELETE_RETRY_BASE_DELAY = 0.05
+
+
+def queue_url_from_arn(event_source_arn: str | None) -> str | None:
+    parts = (event_source_arn or "").split(":")
+    if len(parts) != 6 or parts[2] != "sqs" or not all(parts[3:]):
+        return None
+    _, _, _, region, account_id, queue_name = parts
+    domain = "amazonaws.com.cn" if region.startswith("cn-") \
+        else "amazonaws.com"
+    return f"https://sqs.{region}.{domain}/{account_id}/{queue_name}"
+
+
+def arn_from_queue_url(queue_url: str, region: str) -> str:
+    """Build the queue ARN from ``https://<host>/<account_id>/<name>``.
+
+    The region is taken from ``sqs.<region>.amazonaws.com`` hosts and
+    falls back to ``region`` for local stand-ins.
+    """
+    host, _, path = queue_url.split("://", 1)[-1].partition("/")
+    account_id, _, queue_name = path.partition("/")
+    host_parts = host.split(".")
+    if len(host_parts) > 2 and host_parts[0] == "sqs":
+        region = host_parts[1]
+    return f"arn:aws:sqs:{region}:{account_id}:{queue_name}"
 
 
 class SQSService:
     def __init__(self, queue_url=None):
         self.queue_url = queue_url
-        self.sqs = boto3.client("sqs", region_name=Config.REGION)
+        self._sqs = None
+        self.queue_urls = {}
+        self.pending_deletes = {}
+
+    @property
+    def sqs(self):
+        if self._sqs is None:
+            self._sqs = get_client("sqs")
+        return self._sqs
 
+    @timed("sqs.get_queue_url")
     def get_queue_url(self, queue_name: str, trace_id: str) -> str | None:
         try:
             response = self.sqs.get_queue_url(QueueName=queue_name)
@@ -23,6 +64,163 @@ class SQSService:
             put_metric("SQSGetURLError", 1)
             return None
 
+    def resolve_queue_url(
+            self, queue_name: str,
+            trace_id: str,
+            event_source_arn: str | None = None
+    ) -> str | None:
+        """Return the URL of ``queue_name``, cached per queue.
+
+        The URL is built from the record's ``eventSourceARN`` when
+        possible and only falls back to ``GetQueueUrl`` otherwise.
+        """
+        queue_url = self.queue_urls.get(queue_name)
+        if queue_url:
+            return queue_url
+        queue_url = queue_url_from_arn(event_source_arn) or \
+            self.get_queue_url(queue_name, trace_id)
+        if queue_url:
+            self.queue_urls[queue_name] = queue_url
+        return queue_url
+
+    @timed("sqs.receive_message")
+    def receive_messages(
+            self, queue_url: str,
+            max_messages: int = 10,
+            wait_time: int = 20,
+            visibility_timeout: int | None = None
+    ) -> list[dict]:
+        params = {
+            "QueueUrl": queue_url,
+            "MaxNumberOfMessages": max_messages,
+            "WaitTimeSeconds": wait_time,
+            "AttributeNames": ["All"],
+            "MessageAttributeNames": ["All"],
+        }
+        if visibility_timeout is not None:
+            params["VisibilityTimeout"] = visibility_timeout
+        try:
+            return self.sqs.receive_message(**params).get("Messages", [])
+        except Exception as e:
+            log_message("receiver", "sqs_receive_message", "error", {
+                "error": str(e), "queue_url": queue_url})
+            put_metric("SQSReceiveError", 1)
+            return []
+
+    @timed("sqs.change_message_visibility_batch")
+    def change_visibility(
+            self, queue_url: str,
+            entries: list[tuple[str, str]],
+            visibility_timeout: int
+    ) -> set[str]:
+        """Set the visibility timeout of ``(receipt_handle, trace_id)``
+        pairs with ChangeMessageVisibilityBatch. Returns the trace_ids
+        that could not be changed.
+        """
+        failed = set()
+        for start in range(0, len(entries), VISIBILITY_BATCH_LIMIT):
+            batch = entries[start:start + VISIBILITY_BATCH_LIMIT]
+            try:
+                response = self.sqs.change_message_visibility_batch(
+                    QueueUrl=queue_url,
+                    Entries=[
+                        {
+                            "Id": str(index),
+                            "ReceiptHandle": receipt_handle,
+                            "VisibilityTimeout": visibility_timeout,
+                        }
+                        for index, (receipt_handle, _) in enumerate(batch)
+                    ]
+                )
+                errors = {
+                    int(failure["Id"]): failure.get("Code", "")
+                    for failure in response.get("Failed", [])
+                }
+            except Exception as e:
+                errors = dict.fromkeys(range(len(batch)), str(e))
+            for index, error in errors.items():
+                _, trace_id = batch[index]
+                failed.add(trace_id)
+                log_message(trace_id, "sqs_change_visibility", "error", {
+                    "error": error})
+        if failed:
+            put_metric("SQSVisibilityError", len(failed))
+        return failed
+
+    def send_messages(
+            self, queue_url: str,
+            entries: list[tuple[dict, str]]
+    ) -> set[str]:
+        """Send ``(entry, trace_id)`` pairs with SendMessageBatch.
+
+        ``entry`` holds the SendMessageBatch fields except ``Id``.
+        Batches are limited to 10 entries and 256 KiB of bodies; failed
+        entries that are not the sender's fault are retried. Returns the
+        trace_ids that could not be sent.
+        """
+        failed = set()
+        batch, batch_bytes = [], 0
+        for entry, trace_id in entries:
+            size = len(entry["MessageBody"].encode("utf-8"))
+            if batch and (len(batch) == SEND_BATCH_LIMIT or
+                          batch_bytes + size > SEND_BATCH_MAX_BYTES):
+                failed.update(self._send_batch(queue_url, batch))
+                batch, batch_bytes = [], 0
+            batch.append((entry, trace_id))
+            batch_bytes += size
+        if batch:
+            failed.update(self._send_batch(queue_url, batch))
+        return failed
+
+    @timed("sqs.send_message_batch")
+    def _send_batch(
+            self, queue_url: str,
+            entries: list[tuple[dict, str]]
+    ) -> set[str]:
+        pending = {
+            str(index): entry for index, entry in enumerate(entries)
+        }
+        errors = {}
+        for attempt in range(DELETE_MAX_RETRIES + 1):
+            try:
+                response = self.sqs.send_message_batch(
+                    QueueUrl=queue_url,
+                    Entries=[
+                        {"Id": entry_id, **entry}
+                        for entry_id, (entry, _) in pending.items()
+                    ]
+                )
+            except Exception as e:
+                errors.update(dict.fromkeys(pending, str(e)))
+                break
+
+            retry = {}
+            for failure in response.get("Failed", []):
+                entry_id = failure["Id"]
+                errors[entry_id] = failure.get("Code") or \
+                    failure.get("Message", "")
+                if not failure.get("SenderFault"):
+                    retry[entry_id] = pending[entry_id]
+            for success in response.get("Successful", []):
+                errors.pop(success["Id"], None)
+
+            pending = retry
+            if not pending:
+                break
+            if attempt < DELETE_MAX_RETRIES:
+                time.sleep(DELETE_RETRY_BASE_DELAY * (2 ** attempt))
+
+        failed = set()
+        for entry_id, error in errors.items():
+            _, trace_id = entries[int(entry_id)]
+            failed.add(trace_id)
+            log_message(trace_id, "sqs_send_message", "error", {
+                "error": error, "queue_url": queue_url})
+        if failed:
+            put_metric("SQSSendError", len(failed))
+        return failed
+
+    @timed("sqs.delete_message")
     def delete_message(self, receipt_handle: str, trace_id: str):
         try:
             self.sqs.delete_message(
@@ -36,3 +234,89 @@ class SQSService:
                 trace_id, "sqs_delete_message", "error", {
                     "error": str(e)})
             put_metric("SQSDeleteError", 1)
+
+    def delete_messages(
+            self, entries: list[tuple[str, str]],
+            queue_url: str | None = None
+    ) -> set[str]:
+        """Buffer ``(receipt_handle, trace_id)`` pairs for deletion.
+
+        Every full group of 10 is sent right away with DeleteMessageBatch,
+        the remainder waits for :meth:`flush_deletes`. Returns the
+        trace_ids that could not be deleted.
+        """
+        queue_url = queue_url or self.queue_url
+        pending = self.pending_deletes.setdefault(queue_url, [])
+        pending.extend(entries)
+
+        failed = set()
+        while len(pending) >= DELETE_BATCH_LIMIT:
+            batch = pending[:DELETE_BATCH_LIMIT]
+            del pending[:DELETE_BATCH_LIMIT]
+            failed.update(self._delete_batch(queue_url, batch))
+        return failed
+
+    def flush_deletes(self) -> set[str]:
+        failed = set()
+        pending_deletes, self.pending_deletes = self.pending_deletes, {}
+        for queue_url, pending in pending_deletes.items():
+            for start in range(0, len(pending), DELETE_BATCH_LIMIT):
+                failed.update(self._delete_batch(
+                    queue_url, pending[start:start + DELETE_BATCH_LIMIT]))
+        return failed
+
+    @timed("sqs.delete_message_batch")
+    def _delete_batch(
+            self, queue_url: str,
+            entries: list[tuple[str, str]]
+    ) -> set[str]:
+        pending = {
+            str(index): entry for index, entry in enumerate(entries)
+        }
+        errors = {}
+        deleted = 0
+        for attempt in range(DELETE_MAX_RETRIES + 1):
+            try:
+                response = self.sqs.delete_message_batch(
+                    QueueUrl=queue_url,
+                    Entries=[
+                        {"Id": entry_id, "ReceiptHandle": receipt_handle}
+                        for entry_id, (receipt_handle, _) in pending.items()
+                    ]
+                )
+            except Exception as e:
+                errors.update(dict.fromkeys(pending, str(e)))
+                break
+
+            retry = {}
+            failed_ids = set()
+            for failure in response.get("Failed", []):
+                entry_id = failure["Id"]
+                failed_ids.add(entry_id)
+                errors[entry_id] = failure.get("Code") or \
+                    failure.get("Message", "")
+                if not failure.get("SenderFault"):
+                    retry[entry_id] = pending[entry_id]
+            for entry_id, (_, trace_id) in pending.items():
+                if entry_id not in failed_ids:
+                    errors.pop(entry_id, None)
+                    deleted += 1
+                    log_message(trace_id, "sqs_delete_message", "success")
+
+            pending = retry
+            if not pending:
+                break
+            if attempt < DELETE_MAX_RETRIES:
+                time.sleep(DELETE_RETRY_BASE_DELAY * (2 ** attempt))
+
+        failed = set()
+        for entry_id, error in errors.items():
+            _, trace_id = entries[int(entry_id)]
+            failed.add(trace_id)
+            log_message(trace_id, "sqs_delete_message", "error", {
+                "error": error})
+        if deleted:
+            put_metric("MessagesDeleted", deleted)
+        if failed:
+            put_metric("SQSDeleteError", len(failed))
+        return failed
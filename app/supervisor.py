@@ -0,0 +1,158 @@
+"""Multi-process supervisor that scales the consumer daemon across cores.
+
+JSON decoding, Decimal conversion and log serialization are CPU-bound,
+so a single process is limited by the GIL. The supervisor starts one
+worker process per polling slot::
+
+    python -m supervisor --workers 4 --queue-url URL [--queue-url URL ...]
+
+Slots are assigned to queues round-robin. Workers are started with the
+``spawn`` method, so each one imports the controller and builds its own
+boto3 clients. Crashed workers are restarted, and the metrics of every
+worker are shipped to the supervisor, which merges them into a single
+flush.
+"""
+import argparse
+import multiprocessing
+import queue
+import signal
+import time
+from utils.config import Config
+from utils.logging import log_message
+from utils.metrics import put_metric, registry
+
+RESTART_DELAY = 1
+STOP_TIMEOUT = 30
+
+
+def run_worker(worker_id, queue_url, metrics_queue, options):
+    """Entry point of a worker process: one consumer daemon."""
+    from daemon import Consumer
+
+    registry.publisher = lambda series: metrics_queue.put((worker_id, series))
+    registry.flush_interval = options.get(
+        "flush_interval", registry.flush_interval)
+    consumer = Consumer(
+        queue_url,
+        prefetch=options.get("prefetch", Config.DAEMON_PREFETCH),
+        visibility_timeout=options.get(
+            "visibility_timeout", Config.DAEMON_VISIBILITY_TIMEOUT))
+    signal.signal(signal.SIGTERM, consumer.stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    consumer.run()
+
+
+class Supervisor:
+    def __init__(
+            self, queue_urls,
+            workers=Config.SUPERVISOR_WORKERS,
+            target=run_worker,
+            options=None,
+            start_method="spawn",
+            flush_interval=Config.METRICS_FLUSH_INTERVAL,
+            restart_delay=RESTART_DELAY
+    ):
+        self.queue_urls = list(queue_urls)
+        self.workers = workers
+        self.target = target
+        self.options = options or {}
+        self.context = multiprocessing.get_context(start_method)
+        self.metrics_queue = self.context.Queue()
+        self.flush_interval = flush_interval
+        self.restart_delay = restart_delay
+        self.processes = {}
+        self.restarts = 0
+        self.counters = {}
+        self.stopping = False
+
+    def slot_queue_url(self, worker_id):
+        return self.queue_urls[worker_id % len(self.queue_urls)]
+
+    def start_worker(self, worker_id):
+        process = self.context.Process(
+            target=self.target,
+            args=(
+                worker_id, self.slot_queue_url(worker_id),
+                self.metrics_queue, self.options),
+            name=f"consumer-worker-{worker_id}",
+            daemon=True)
+        process.start()
+        self.processes[worker_id] = process
+        log_message(f"worker-{worker_id}", "worker_start", "info", {
+            "pid": process.pid, "queue_url": self.slot_queue_url(worker_id)})
+
+    def stop(self, *_):
+        self.stopping = True
+
+    def collect_metrics(self, timeout=0.5):
+        """Merge every metrics batch sent by workers into the registry."""
+        try:
+            while True:
+                worker_id, series = self.metrics_queue.get(timeout=timeout)
+                timeout = 0
+                registry.merge(series)
+                counters = self.counters.setdefault(worker_id, {})
+                for (_, name, unit, _), stats in series.items():
+                    if unit == "Count":
+                        counters[name] = counters.get(name, 0) + stats[1]
+        except queue.Empty:
+            pass
+
+    def check_workers(self):
+        for worker_id, process in list(self.processes.items()):
+            if process.is_alive() or self.stopping:
+                continue
+            log_message(f"worker-{worker_id}", "worker_exit", "error", {
+                "pid": process.pid, "exitcode": process.exitcode})
+            put_metric("WorkerRestarts", 1)
+            self.restarts += 1
+            time.sleep(self.restart_delay)
+            self.start_worker(worker_id)
+
+    def flush(self):
+        log_message("supervisor", "supervisor_stats", "info", {
+            "workers": self.counters, "restarts": self.restarts})
+        registry.flush()
+
+    def run(self):
+        for worker_id in range(self.workers):
+            self.start_worker(worker_id)
+        last_flush = time.monotonic()
+        try:
+            while not self.stopping:
+                self.collect_metrics()
+                self.check_workers()
+                if time.monotonic() - last_flush >= self.flush_interval:
+                    self.flush()
+                    last_flush = time.monotonic()
+        finally:
+            for process in self.processes.values():
+                if process.is_alive():
+                    process.terminate()
+            deadline = time.monotonic() + STOP_TIMEOUT
+            for process in self.processes.values():
+                process.join(max(deadline - time.monotonic(), 0))
+            self.collect_metrics(timeout=0.1)
+            self.flush()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run the consumer daemon on several processes")
+    parser.add_argument("--queue-url", action="append")
+    parser.add_argument(
+        "--workers", type=int, default=Config.SUPERVISOR_WORKERS)
+    args = parser.parse_args(argv)
+    queue_urls = args.queue_url or (
+        [Config.QUEUE_URL] if Config.QUEUE_URL else [])
+    if not queue_urls:
+        parser.error("--queue-url or QUEUE_URL is required")
+
+    supervisor = Supervisor(queue_urls, workers=args.workers)
+    signal.signal(signal.SIGTERM, supervisor.stop)
+    signal.signal(signal.SIGINT, supervisor.stop)
+    supervisor.run()
+
+
+if __name__ == "__main__":
+    main()
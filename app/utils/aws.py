@@ -0,0 +1,75 @@
+import threading
+from utils.config import Config
+
+_session = None
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_session():
+    """Return the process-wide boto3 session, created on first use.
+
+    boto3 itself is only imported here, so importing the handler does not
+    pay for it until an AWS call is actually needed.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                import boto3
+                _session = boto3.session.Session(region_name=Config.REGION)
+    return _session
+
+
+def client_config(max_attempts: int | None = None):
+    """Build the botocore settings shared by every client.
+
+    ``max_attempts`` overrides ``AWS_MAX_ATTEMPTS`` for callers that run
+    their own retry loop (``1`` turns botocore's retries off).
+    """
+    from botocore.config import Config as BotocoreConfig
+
+    return BotocoreConfig(
+        max_pool_connections=Config.AWS_MAX_POOL_CONNECTIONS,
+        connect_timeout=Config.AWS_CONNECT_TIMEOUT,
+        read_timeout=Config.AWS_READ_TIMEOUT,
+        tcp_keepalive=Config.AWS_TCP_KEEPALIVE,
+        retries={
+            "mode": Config.AWS_RETRY_MODE,
+            "total_max_attempts": max_attempts or Config.AWS_MAX_ATTEMPTS,
+        },
+    )
+
+
+def endpoint_url(service_name: str) -> str | None:
+    return Config.AWS_ENDPOINT_URLS.get(
+        service_name, Config.AWS_ENDPOINT_URL)
+
+
+def get_client(service_name: str, max_attempts: int | None = None):
+    """Return a low-level client shared by every caller of the process.
+
+    Clients are thread-safe and keep their connection pool, so reusing
+    them across threads and warm invocations avoids new TLS handshakes.
+    The client is cached per service, so every caller of one service must
+    pass the same ``max_attempts``.
+    """
+    client = _clients.get(service_name)
+    if client is None:
+        session = get_session()
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                client = session.client(
+                    service_name,
+                    config=client_config(max_attempts),
+                    endpoint_url=endpoint_url(service_name))
+                _clients[service_name] = client
+    return client
+
+
+def reset_clients():
+    global _session
+    with _lock:
+        _clients.clear()
+        _session = None
@@ -0,0 +1,94 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+ENTRY_OVERHEAD_BYTES = 100
+
+
+class LRUCache:
+    """Bounded LRU set of keys with a time-to-live.
+
+    The cache is capped both by number of entries and by an approximate
+    memory budget (key size plus a fixed per-entry overhead); the least
+    recently used keys are evicted first. Hit, miss and eviction counters
+    accumulate until :meth:`pop_stats` is called.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, max_bytes: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries = OrderedDict()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0 and self.max_bytes > 0
+
+    def contains(self, key) -> bool:
+        return key in self.get_many([key])
+
+    def get_many(self, keys) -> set:
+        if not self.enabled:
+            return set()
+        now = time.monotonic()
+        found = set()
+        with self._lock:
+            for key in keys:
+                expires_at = self._entries.get(key)
+                if expires_at is None:
+                    self._stats["misses"] += 1
+                elif expires_at <= now:
+                    self._remove(key)
+                    self._stats["misses"] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    found.add(key)
+        return found
+
+    def add(self, key):
+        self.add_many([key])
+
+    def add_many(self, keys):
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                else:
+                    self.size_bytes += _entry_size(key)
+                self._entries[key] = expires_at
+            while self._entries and (
+                    len(self._entries) > self.max_entries or
+                    self.size_bytes > self.max_bytes):
+                key, _ = self._entries.popitem(last=False)
+                self.size_bytes -= _entry_size(key)
+                self._stats["evictions"] += 1
+
+    def pop_stats(self) -> dict:
+        with self._lock:
+            stats = self._stats
+            self._stats = dict.fromkeys(stats, 0)
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def _remove(self, key):
+        del self._entries[key]
+        self.size_bytes -= _entry_size(key)
+
+
+def _entry_size(key) -> int:
+    return sys.getsizeof(key) + ENTRY_OVERHEAD_BYTES
@@ -1,9 +1,86 @@
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
+
+def is_local_run() -> bool:
+    return not (
+        os.environ.get("AWS_LAMBDA_FUNCTION_NAME") or
+        os.environ.get("AWS_EXECUTION_ENV")
+    )
+
+
+def parse_endpoint_urls(value: str) -> dict:
+    endpoints = {}
+    for entry in value.split(","):
+        service_name, _, url = entry.partition("=")
+        if service_name.strip() and url.strip():
+            endpoints[service_name.strip().lower()] = url.strip()
+    return endpoints
+
+
+if is_local_run():
+    from dotenv import load_dotenv
+
+    load_dotenv()
 
 
 class Config:
     DYNAMO_TABLE = os.environ.get("DYNAMO_TABLE", "messages_table")
     REGION = os.environ.get("REGION", "us-east-1")
+    DEDUP_MODE = os.environ.get("DEDUP_MODE", "read_first")
+    BULK_SAVE = os.environ.get("BULK_SAVE", "false").lower() == "true"
+    METRICS_FLUSH_INTERVAL = float(
+        os.environ.get("METRICS_FLUSH_INTERVAL", "60"))
+    METRICS_BACKEND = os.environ.get("METRICS_BACKEND", "cloudwatch")
+    LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+    LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "1"))
+    LOG_JSON = os.environ.get("LOG_JSON", "json")
+    IDEMPOTENCY_CACHE_SIZE = int(
+        os.environ.get("IDEMPOTENCY_CACHE_SIZE", "10000"))
+    IDEMPOTENCY_CACHE_TTL = float(
+        os.environ.get("IDEMPOTENCY_CACHE_TTL", "300"))
+    IDEMPOTENCY_CACHE_MAX_BYTES = int(
+        os.environ.get("IDEMPOTENCY_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+    MAX_WORKERS = int(os.environ.get("MAX_WORKERS", "1"))
+    MICRO_BATCH_SIZE = int(os.environ.get("MICRO_BATCH_SIZE", "100"))
+    QUEUE_URL = os.environ.get("QUEUE_URL")
+    DAEMON_PREFETCH = int(os.environ.get("DAEMON_PREFETCH", "1"))
+    DAEMON_VISIBILITY_TIMEOUT = int(
+        os.environ.get("DAEMON_VISIBILITY_TIMEOUT", "30"))
+    SUPERVISOR_WORKERS = int(
+        os.environ.get("SUPERVISOR_WORKERS", str(os.cpu_count() or 1)))
+    AWS_MAX_POOL_CONNECTIONS = int(
+        os.environ.get("AWS_MAX_POOL_CONNECTIONS", "50"))
+    AWS_CONNECT_TIMEOUT = float(os.environ.get("AWS_CONNECT_TIMEOUT", "2"))
+    AWS_READ_TIMEOUT = float(os.environ.get("AWS_READ_TIMEOUT", "30"))
+    AWS_TCP_KEEPALIVE = os.environ.get(
+        "AWS_TCP_KEEPALIVE", "true").lower() == "true"
+    AWS_RETRY_MODE = os.environ.get("AWS_RETRY_MODE", "standard")
+    AWS_MAX_ATTEMPTS = int(os.environ.get("AWS_MAX_ATTEMPTS", "3"))
+    AWS_ENDPOINT_URL = os.environ.get("AWS_ENDPOINT_URL") or None
+    AWS_ENDPOINT_URLS = parse_endpoint_urls(
+        os.environ.get("AWS_ENDPOINT_URLS", ""))
+    DYNAMO_READ_RATE = float(os.environ.get("DYNAMO_READ_RATE", "0"))
+    DYNAMO_WRITE_RATE = float(os.environ.get("DYNAMO_WRITE_RATE", "0"))
+    DYNAMO_THROTTLE_RETRIES = int(
+        os.environ.get("DYNAMO_THROTTLE_RETRIES", "3"))
+    DEADLINE_SAFETY_MARGIN_MS = int(
+        os.environ.get("DEADLINE_SAFETY_MARGIN_MS", "2000"))
+    QUARANTINE_QUEUE_URL = os.environ.get("QUARANTINE_QUEUE_URL") or None
+    QUARANTINE_MAX_RECEIVE_COUNT = int(
+        os.environ.get("QUARANTINE_MAX_RECEIVE_COUNT", "0"))
+    PAYLOAD_COMPRESS_THRESHOLD = int(
+        os.environ.get("PAYLOAD_COMPRESS_THRESHOLD", "0"))
+    PAYLOAD_OFFLOAD_THRESHOLD = int(
+        os.environ.get("PAYLOAD_OFFLOAD_THRESHOLD", str(350 * 1024)))
+    PAYLOAD_BLOB_STORE = os.environ.get("PAYLOAD_BLOB_STORE") or None
+    IDEMPOTENCY_STORE = os.environ.get("IDEMPOTENCY_STORE", "dynamodb")
+    IDEMPOTENCY_TABLE = os.environ.get("IDEMPOTENCY_TABLE") or None
+    IDEMPOTENCY_TTL = int(os.environ.get("IDEMPOTENCY_TTL", "0"))
+    IDEMPOTENCY_TTL_ATTRIBUTE = os.environ.get(
+        "IDEMPOTENCY_TTL_ATTRIBUTE", "expires_at")
+    STORE_PAYLOADS = os.environ.get(
+        "STORE_PAYLOADS", "true").lower() == "true"
+    LATENCY_METRICS = os.environ.get(
+        "LATENCY_METRICS", "false").lower() == "true"
+    PROFILE = os.environ.get("PROFILE", "")
+    PROFILE_TOP = int(os.environ.get("PROFILE_TOP", "25"))
@@ -1,12 +1,82 @@
-from decimal import Decimal
+import json
+import re
+from decimal import Context, Decimal, InvalidOperation, Overflow, Subnormal
+
+DYNAMODB_PRECISION = 38
+
+# DynamoDB numbers: 38 significant digits, magnitude 1E-130 to 1E+126.
+# Extra digits are rounded instead of failing serialization later.
+DECIMAL_CONTEXT = Context(
+    prec=DYNAMODB_PRECISION, Emax=125, Emin=-130,
+    traps=[InvalidOperation, Overflow, Subnormal])
 
 
 def convert_floats_to_decimal(obj):
-    if isinstance(obj, dict):
-        return {k: convert_floats_to_decimal(v) for k, v in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_floats_to_decimal(v) for v in obj]
-    elif isinstance(obj, float):
+    """Return a copy of ``obj`` with every float replaced by a Decimal.
+
+    The structure is walked with an explicit stack, so deeply nested
+    payloads cannot hit the interpreter recursion limit.
+    """
+    if isinstance(obj, float):
         return Decimal(str(obj))
-    else:
+    if not isinstance(obj, (dict, list)):
         return obj
+
+    root = {} if isinstance(obj, dict) else []
+    stack = [(obj, root)]
+    while stack:
+        source, target = stack.pop()
+        is_dict = isinstance(source, dict)
+        for key, value in source.items() if is_dict else enumerate(source):
+            if isinstance(value, float):
+                value = Decimal(str(value))
+            elif isinstance(value, dict):
+                child = {}
+                stack.append((value, child))
+                value = child
+            elif isinstance(value, list):
+                child = []
+                stack.append((value, child))
+                value = child
+            if is_dict:
+                target[key] = value
+            else:
+                target.append(value)
+    return root
+
+
+# Integers only go through Python when the body has a digit run long
+# enough to need rounding.
+LONG_DIGIT_RUN = re.compile(r"[0-9]{%d}" % (DYNAMODB_PRECISION + 1))
+
+
+def parse_int(text):
+    if len(text.lstrip("-")) <= DYNAMODB_PRECISION:
+        return int(text)
+    return DECIMAL_CONTEXT.create_decimal(text)
+
+
+def parse_constant(name):
+    raise ValueError(f"{name} is not a valid number")
+
+
+_decoder = json.JSONDecoder(
+    parse_float=DECIMAL_CONTEXT.create_decimal,
+    parse_constant=parse_constant)
+_long_number_decoder = json.JSONDecoder(
+    parse_float=DECIMAL_CONTEXT.create_decimal,
+    parse_int=parse_int,
+    parse_constant=parse_constant)
+
+
+def decode_json(body):
+    """Decode a message body straight into DynamoDB-ready values.
+
+    Floats are parsed as Decimal while decoding, so the payload never has
+    to be walked and rebuilt by :func:`convert_floats_to_decimal`.
+    Numbers with more than 38 significant digits are rounded to what
+    DynamoDB can store; ``NaN`` and ``Infinity`` are rejected.
+    """
+    if LONG_DIGIT_RUN.search(body):
+        return _long_number_decoder.decode(body)
+    return _decoder.decode(body)
@@ -0,0 +1,30 @@
+import math
+import time
+
+
+class Deadline:
+    """Time budget of an invocation, minus a safety margin.
+
+    Built from the Lambda context's ``get_remaining_time_in_millis``;
+    without a usable context (local runs, the daemon) it never expires.
+    """
+
+    def __init__(self, seconds: float | None = None):
+        self.expires_at = (
+            None if seconds is None else time.monotonic() + seconds)
+
+    @classmethod
+    def from_context(cls, context, margin_ms: float) -> "Deadline":
+        get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+        remaining = get_remaining() if callable(get_remaining) else None
+        if not isinstance(remaining, (int, float)):
+            return cls()
+        return cls((remaining - margin_ms) / 1000)
+
+    def remaining(self) -> float:
+        if self.expires_at is None:
+            return math.inf
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
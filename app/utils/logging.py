@@ -1,12 +1,55 @@
 import logging
 import json
+import math
+import threading
+import time
+import zlib
 from datetime import datetime, timezone
+from utils.config import Config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 logger = logging.getLogger("worker-consumer-sqs")
-logger.setLevel(logging.INFO)
+logger.setLevel(getattr(logging, Config.LOG_LEVEL.upper(), logging.INFO))
+# EMF records are metrics, not log events: LOG_LEVEL must not drop them.
+metrics_logger = logging.getLogger("worker-consumer-sqs.metrics")
+metrics_logger.setLevel(logging.INFO)
+
+SAMPLED_STATUSES = {"info", "success", "duplicate"}
+
+_summary = None
+
+
+def dumps(obj) -> str:
+    if orjson is not None and Config.LOG_JSON == "orjson":
+        return orjson.dumps(obj, default=str).decode()
+    return json.dumps(obj, default=str)
+
+
+def is_sampled(trace_id, status) -> bool:
+    """Success-path events are kept for a stable fraction of trace_ids.
+
+    The decision is derived from the trace_id so every event of a sampled
+    message is kept together; errors are never dropped.
+    """
+    rate = Config.LOG_SAMPLE_RATE
+    if rate >= 1 or status not in SAMPLED_STATUSES:
+        return True
+    return zlib.crc32(str(trace_id).encode()) % 10000 < rate * 10000
 
 
 def log_message(trace_id, action, status, details=None):
+    summary = _summary
+    if summary is not None:
+        summary.record(trace_id, action, status)
+
+    level = logging.ERROR if status == "error" else logging.INFO
+    if not logger.isEnabledFor(level) or not is_sampled(trace_id, status):
+        return
+
     log_entry = {
         "trace_id": str(trace_id),
         "timestamp": datetime.now(timezone.utc).isoformat(),
@@ -15,4 +58,103 @@ def log_message(trace_id, action, status, details=None):
     }
     if details is not None:
         log_entry["details"] = details
-    logger.info(json.dumps(log_entry))
+    if level == logging.ERROR:
+        logger.error(dumps(log_entry))
+    else:
+        logger.info(dumps(log_entry))
+
+
+class InvocationSummary:
+    """Counts every logged event of one invocation, sampled or not.
+
+    :meth:`emit` writes a single ``invocation_summary`` record with the
+    counts per ``action:status``, the stage durations, p50/p95/p99
+    latencies of every timed operation and the trace_ids that logged an
+    error.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.counts = {}
+        self.durations = {}
+        self.timings = {}
+        self.failed_ids = []
+        self._lock = threading.Lock()
+
+    def record(self, trace_id, action, status):
+        key = f"{action}:{status}"
+        with self._lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+            if status == "error":
+                self.failed_ids.append(str(trace_id))
+
+    def add_duration(self, stage, seconds):
+        with self._lock:
+            self.durations[stage] = round(
+                self.durations.get(stage, 0) + seconds * 1000, 3)
+
+    def add_timing(self, operation, seconds):
+        with self._lock:
+            self.timings.setdefault(operation, []).append(seconds * 1000)
+        self.add_duration(operation, seconds)
+
+    def latencies(self):
+        with self._lock:
+            timings = {
+                operation: sorted(values)
+                for operation, values in self.timings.items()
+            }
+        return {
+            operation: {
+                "count": len(values),
+                "p50": round(percentile(values, 50), 3),
+                "p95": round(percentile(values, 95), 3),
+                "p99": round(percentile(values, 99), 3),
+                "max": round(values[-1], 3),
+            }
+            for operation, values in timings.items()
+        }
+
+    def emit(self, trace_id="invocation", details=None):
+        summary = {
+            "duration_ms": round(
+                (time.monotonic() - self.started) * 1000, 3),
+            "counts": self.counts,
+            "stages_ms": self.durations,
+            "failed_ids": self.failed_ids,
+        }
+        if self.timings:
+            summary["latency_ms"] = self.latencies()
+        if details:
+            summary.update(details)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(dumps({
+                "trace_id": str(trace_id),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "action": "invocation_summary",
+                "status": "summary",
+                "details": summary,
+            }))
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an ascending, non-empty list."""
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def current_summary() -> InvocationSummary | None:
+    return _summary
+
+
+def begin_summary() -> InvocationSummary:
+    global _summary
+    _summary = InvocationSummary()
+    return _summary
+
+
+def end_summary(trace_id="invocation", details=None):
+    global _summary
+    summary, _summary = _summary, None
+    if summary is not None:
+        summary.emit(trace_id, details)
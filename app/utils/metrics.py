@@ -1,15 +1,234 @@
-import boto3
+import json
+import threading
+import time
+from utils.aws import get_client
 from utils.config import Config
+from utils.logging import log_message, metrics_logger
 
-cloudwatch = boto3.client("cloudwatch", region_name=Config.REGION)
+DEFAULT_NAMESPACE = "Worker-consumer-SQS/Messages"
+MAX_DATUMS_PER_CALL = 1000
+MAX_EMF_METRICS = 100
+MAX_EMF_VALUES = 100
 
+cloudwatch = None
 
-def put_metric(name, value, namespace="Worker-consumer-SQS/Messages"):
-    cloudwatch.put_metric_data(
-        Namespace=namespace,
-        MetricData=[{
-            "MetricName": name,
-            "Value": value,
-            "Unit": "Count"
-        }]
-    )
+
+class MetricsRegistry:
+    """Aggregates metrics in memory and publishes them in bulk.
+
+    Values of the same series (namespace, name, unit and dimensions) are
+    merged, so a whole invocation usually costs a single PutMetricData
+    call (``cloudwatch`` backend) or a few log lines in CloudWatch
+    Embedded Metric Format (``emf`` backend, no API call at all). The
+    buffer is flushed when it holds ``max_datums`` series, when its oldest
+    value is older than ``flush_interval`` seconds, or explicitly.
+    """
+
+    def __init__(
+            self,
+            max_datums=MAX_DATUMS_PER_CALL,
+            flush_interval=Config.METRICS_FLUSH_INTERVAL,
+            backend=Config.METRICS_BACKEND
+    ):
+        self.max_datums = max_datums
+        self.flush_interval = flush_interval
+        self.backend = backend
+        self.publisher = None
+        self._series = {}
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    def add(
+            self, name, value,
+            namespace=DEFAULT_NAMESPACE,
+            unit="Count",
+            dimensions=None
+    ):
+        key = (
+            namespace, name, unit,
+            tuple(sorted((dimensions or {}).items()))
+        )
+        now = time.monotonic()
+        with self._lock:
+            stats = self._series.get(key)
+            if stats is None:
+                self._series[key] = [
+                    1, value, value, value,
+                    [] if unit == "Count" else [value]
+                ]
+            else:
+                stats[0] += 1
+                stats[1] += value
+                stats[2] = min(stats[2], value)
+                stats[3] = max(stats[3], value)
+                if unit != "Count":
+                    stats[4].append(value)
+            if self._oldest is None:
+                self._oldest = now
+            should_flush = len(self._series) >= self.max_datums or \
+                now - self._oldest >= self.flush_interval
+        if should_flush:
+            self.flush()
+
+    def merge(self, series: dict):
+        """Fold series drained from another registry into this one."""
+        now = time.monotonic()
+        with self._lock:
+            for key, (count, total, minimum, maximum, values) in \
+                    series.items():
+                stats = self._series.get(key)
+                if stats is None:
+                    self._series[key] = [
+                        count, total, minimum, maximum, list(values)]
+                    continue
+                stats[0] += count
+                stats[1] += total
+                stats[2] = min(stats[2], minimum)
+                stats[3] = max(stats[3], maximum)
+                stats[4].extend(values)
+            if self._series and self._oldest is None:
+                self._oldest = now
+
+    def drain(self) -> dict:
+        with self._lock:
+            series, self._series = self._series, {}
+            self._oldest = None
+        return series
+
+    def flush(self):
+        series = self.drain()
+        if not series:
+            return
+        try:
+            if self.publisher is not None:
+                self.publisher(series)
+            elif self.backend == "emf":
+                _publish_emf(series)
+            else:
+                _publish_cloudwatch(series)
+        except Exception as e:
+            log_message("metrics", "metrics_flush", "error", {
+                "error": str(e)})
+
+
+def _publish_cloudwatch(series):
+    global cloudwatch
+    if cloudwatch is None:
+        cloudwatch = get_client("cloudwatch")
+
+    metric_data = {}
+    for (namespace, name, unit, dimensions), stats in series.items():
+        metric_data.setdefault(namespace, []).append(
+            _datum(name, unit, dimensions, stats))
+
+    for namespace, datums in metric_data.items():
+        for start in range(0, len(datums), MAX_DATUMS_PER_CALL):
+            chunk = datums[start:start + MAX_DATUMS_PER_CALL]
+            try:
+                cloudwatch.put_metric_data(
+                    Namespace=namespace,
+                    MetricData=chunk
+                )
+            except Exception as e:
+                log_message(
+                    "metrics", "metrics_flush", "error", {
+                        "error": str(e), "namespace": namespace,
+                        "datums": len(chunk)})
+
+
+def _publish_emf(series):
+    """Write one EMF record per namespace and dimension set.
+
+    CloudWatch extracts the metrics from the log line asynchronously, so
+    counters and latency values of the invocation share a single record.
+    """
+    records = {}
+    for (namespace, name, unit, dimensions), stats in series.items():
+        records.setdefault((namespace, dimensions), []).append(
+            (name, unit, stats))
+
+    timestamp = int(time.time() * 1000)
+    for (namespace, dimensions), metrics in records.items():
+        for start in range(0, len(metrics), MAX_EMF_METRICS):
+            chunk = metrics[start:start + MAX_EMF_METRICS]
+            for values in _emf_values(chunk):
+                record = {
+                    "_aws": {
+                        "Timestamp": timestamp,
+                        "CloudWatchMetrics": [{
+                            "Namespace": namespace,
+                            "Dimensions": [[key for key, _ in dimensions]],
+                            "Metrics": [
+                                {"Name": name, "Unit": unit}
+                                for name, unit in values
+                            ],
+                        }],
+                    },
+                }
+                for key, value in dimensions:
+                    record[key] = str(value)
+                for (name, _), value in values.items():
+                    record[name] = value
+                try:
+                    metrics_logger.info(json.dumps(record, default=str))
+                except Exception as e:
+                    log_message("metrics", "metrics_flush", "error", {
+                        "error": str(e), "namespace": namespace})
+
+
+def _emf_values(chunk):
+    """Yield the metric values of each EMF record for ``chunk``.
+
+    EMF accepts at most ``MAX_EMF_VALUES`` values per metric, so longer
+    series are spread over several records; counters go in the first.
+    """
+    offset = 0
+    while True:
+        values = {}
+        for name, unit, stats in chunk:
+            if unit == "Count":
+                if offset == 0:
+                    values[(name, unit)] = stats[1]
+            elif offset < len(stats[4]):
+                values[(name, unit)] = \
+                    stats[4][offset:offset + MAX_EMF_VALUES]
+        if not values:
+            return
+        yield values
+        offset += MAX_EMF_VALUES
+
+
+def _datum(name, unit, dimensions, stats):
+    count, total, minimum, maximum, _ = stats
+    datum = {"MetricName": name}
+    if dimensions:
+        datum["Dimensions"] = [
+            {"Name": key, "Value": str(value)} for key, value in dimensions
+        ]
+    if count == 1 or unit == "Count":
+        datum["Value"] = total
+    else:
+        datum["StatisticValues"] = {
+            "SampleCount": count,
+            "Sum": total,
+            "Minimum": minimum,
+            "Maximum": maximum,
+        }
+    datum["Unit"] = unit
+    return datum
+
+
+registry = MetricsRegistry()
+
+
+def put_metric(
+        name, value,
+        namespace=DEFAULT_NAMESPACE,
+        unit="Count",
+        dimensions=None
+):
+    registry.add(name, value, namespace, unit, dimensions)
+
+
+def flush_metrics():
+    registry.flush()
@@ -0,0 +1,80 @@
+import contextlib
+import io
+from utils.config import Config
+from utils.logging import log_message
+
+_profiled = False
+
+
+def profile_modes(value: str) -> set[str]:
+    return {
+        mode.strip().lower() for mode in value.split(",") if mode.strip()
+    }
+
+
+@contextlib.contextmanager
+def profile_invocation(trace_id="invocation"):
+    """Profile the first invocation of the process when ``PROFILE`` is set.
+
+    ``PROFILE`` takes ``cprofile`` and/or ``tracemalloc``
+    (comma-separated). The block is profiled once per container and a
+    ``profile_summary`` record is logged with the ``PROFILE_TOP`` most
+    expensive functions (cumulative time) and allocation sites.
+    """
+    global _profiled
+    modes = profile_modes(Config.PROFILE)
+    if _profiled or not modes:
+        yield
+        return
+    _profiled = True
+
+    profiler = None
+    if "cprofile" in modes:
+        import cProfile
+
+        profiler = cProfile.Profile()
+    tracing = False
+    if "tracemalloc" in modes:
+        import tracemalloc
+
+        tracing = not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        details = {}
+        if profiler is not None:
+            profiler.disable()
+            details["cprofile"] = _cprofile_summary(profiler)
+        if tracing:
+            details["tracemalloc"] = _tracemalloc_summary()
+            tracemalloc.stop()
+        log_message(trace_id, "profile_summary", "profile", details)
+
+
+def _cprofile_summary(profiler) -> str:
+    import pstats
+
+    output = io.StringIO()
+    stats = pstats.Stats(profiler, stream=output)
+    stats.sort_stats("cumulative").print_stats(Config.PROFILE_TOP)
+    return output.getvalue()
+
+
+def _tracemalloc_summary() -> dict:
+    import tracemalloc
+
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    return {
+        "current_bytes": current,
+        "peak_bytes": peak,
+        "top": [
+            str(stat)
+            for stat in snapshot.statistics("lineno")[:Config.PROFILE_TOP]
+        ],
+    }
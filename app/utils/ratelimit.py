@@ -0,0 +1,72 @@
+import random
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket whose rate adapts to throttling (AIMD).
+
+    ``acquire`` reserves tokens immediately and sleeps off any debt, so
+    concurrent callers are served in order and large requests are not
+    starved. Each throttle multiplies the rate by ``decrease`` (down to
+    ``min_rate``); each success adds ``increase`` back, up to the
+    configured rate. A rate of 0 disables the bucket.
+    """
+
+    def __init__(
+            self, rate: float,
+            burst: float | None = None,
+            min_rate: float = 1.0,
+            increase: float = 1.0,
+            decrease: float = 0.5
+    ):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst or rate
+        self.min_rate = min(min_rate, rate) if rate > 0 else 0
+        self.increase = increase
+        self.decrease = decrease
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_rate > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Take ``tokens`` and return the seconds spent waiting for them."""
+        if not self.enabled:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self.tokens -= tokens
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if delay:
+            time.sleep(delay)
+        return delay
+
+    def on_throttle(self):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+
+    def on_success(self):
+        if not self.enabled or self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self._refill()
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
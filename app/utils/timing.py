@@ -0,0 +1,46 @@
+import functools
+import time
+from utils.config import Config
+from utils.logging import current_summary
+from utils.metrics import put_metric
+
+
+class timed:
+    """Time a block or a function on the monotonic clock.
+
+    Usable as ``with timed("parse"):`` or as ``@timed("sqs.receive")``.
+    Each duration is added to the active invocation summary (totals and
+    p50/p95/p99) and, with ``LATENCY_METRICS``, to the
+    ``OperationLatency`` metric with an ``Operation`` dimension.
+    """
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_timing(self.operation, time.monotonic() - self.started)
+        return False
+
+    def __call__(self, func):
+        operation = self.operation
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(operation):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+def record_timing(operation: str, seconds: float):
+    summary = current_summary()
+    if summary is not None:
+        summary.add_timing(operation, seconds)
+    if Config.LATENCY_METRICS:
+        put_metric(
+            "OperationLatency", seconds * 1000, unit="Milliseconds",
+            dimensions={"Operation": operation})
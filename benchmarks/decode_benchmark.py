@@ -0,0 +1,74 @@
+"""Micro-benchmark: message body decoding into DynamoDB-ready values.
+
+Compares the original two-pass path (``json.loads`` followed by the
+original recursive ``convert_floats_to_decimal``, reproduced below as
+:func:`original_convert`) with the single-pass ``decode_json`` decoder,
+for payloads of increasing size.
+
+Run from the repository root::
+
+    PYTHONPATH=app python benchmarks/decode_benchmark.py
+"""
+import argparse
+import json
+import timeit
+from decimal import Decimal
+from utils.convert import decode_json
+
+
+def make_body(items: int, depth: int = 3) -> str:
+    def node(level):
+        value = {"amount": level * 1.25, "label": "x" * 16, "count": level}
+        if level < depth:
+            value["children"] = [node(level + 1), node(level + 1)]
+        return value
+
+    return json.dumps({
+        "message_id": "benchmark",
+        "payload": {"items": [node(0) for _ in range(items)]},
+    })
+
+
+def original_convert(obj):
+    if isinstance(obj, dict):
+        return {k: original_convert(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [original_convert(v) for v in obj]
+    elif isinstance(obj, float):
+        return Decimal(str(obj))
+    else:
+        return obj
+
+
+def two_pass(body):
+    data = json.loads(body)
+    return original_convert(data.get("payload", {}))
+
+
+def single_pass(body):
+    return decode_json(body).get("payload", {})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[1, 10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'items':>8} {'bytes':>10} {'two-pass ms':>12} "
+          f"{'single ms':>10} {'speedup':>8}")
+    for size in args.sizes:
+        body = make_body(size)
+        assert two_pass(body) == single_pass(body)
+        number = max(1, 2000 // size)
+        old = min(timeit.repeat(lambda: two_pass(body),
+                                number=number, repeat=args.repeat)) / number
+        new = min(timeit.repeat(lambda: single_pass(body),
+                                number=number, repeat=args.repeat)) / number
+        print(f"{size:>8} {len(body):>10} {old * 1000:>12.3f} "
+              f"{new * 1000:>10.3f} {old / new:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
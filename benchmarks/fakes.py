@@ -0,0 +1,476 @@
+"""In-process fakes of the DynamoDB, SQS and CloudWatch clients.
+
+Each fake counts its API calls per operation, can sleep a fixed latency
+per call and can inject failures from a :class:`Faults` plan.
+:func:`install` puts them in the client cache of ``utils.aws`` so every
+service of the app uses them unchanged. The SQS fake is a real queue
+with visibility timeouts and receive counts, so the load simulator can
+observe redeliveries.
+"""
+import contextlib
+import itertools
+import random
+import threading
+import time
+from collections import Counter, deque
+
+DYNAMODB_THROTTLE = "ProvisionedThroughputExceededException"
+THROTTLE = "ThrottlingException"
+
+
+class FakeClientError(Exception):
+    """Mimics botocore's ClientError: the code lives in ``response``."""
+
+    def __init__(self, code, message="", **response):
+        super().__init__(f"{code}: {message}")
+        self.response = {"Error": {"Code": code, "Message": message},
+                         **response}
+
+    def __reduce__(self):
+        extra = {k: v for k, v in self.response.items() if k != "Error"}
+        error = self.response["Error"]
+        return _client_error, (error["Code"], error["Message"], extra)
+
+
+def _client_error(code, message, extra):
+    return FakeClientError(code, message, **extra)
+
+
+class FakeTimeout(Exception):
+    """Mimics a botocore read timeout."""
+
+
+class Faults:
+    """Failure plan shared by the calls of one fake client.
+
+    Every call may get an extra ``spike_latency`` sleep, a throttling
+    error or a timeout, each with its own probability. Half of the
+    timeouts lose the request and half lose the response after the
+    operation was applied. Batch operations may also fail part of their
+    entries with ``partial_rate``.
+    """
+
+    def __init__(self, throttle_rate=0.0, timeout_rate=0.0,
+                 partial_rate=0.0, spike_rate=0.0, spike_latency=0.0,
+                 seed=None):
+        self.throttle_rate = throttle_rate
+        self.timeout_rate = timeout_rate
+        self.partial_rate = partial_rate
+        self.spike_rate = spike_rate
+        self.spike_latency = spike_latency
+        self.random = random.Random(seed)
+        self.injected = Counter()
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def roll(self, rate, fault):
+        if rate <= 0:
+            return False
+        with self.lock:
+            hit = self.random.random() < rate
+            if hit:
+                self.injected[fault] += 1
+        return hit
+
+    def before(self, operation, throttle_code):
+        if self.roll(self.spike_rate, "latency_spike"):
+            time.sleep(self.spike_latency)
+        if self.roll(self.throttle_rate, "throttle"):
+            raise FakeClientError(throttle_code, "Rate exceeded")
+        if self.roll(self.timeout_rate / 2, "request_timeout"):
+            raise FakeTimeout(f"Read timeout on {operation}")
+
+    def after(self, operation):
+        if self.roll(self.timeout_rate / 2, "response_timeout"):
+            raise FakeTimeout(f"Read timeout on {operation}")
+
+    def partial(self, entries):
+        """Return the entries of a batch call to fail, possibly none."""
+        if len(entries) < 2 or not self.roll(self.partial_rate, "partial"):
+            return []
+        with self.lock:
+            return self.random.sample(entries, len(entries) // 2)
+
+
+class FakeClient:
+    throttle_code = THROTTLE
+
+    def __init__(self, latency=0.0, faults=None):
+        self.latency = latency
+        self.faults = faults
+        self.calls = Counter()
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _call(self, operation):
+        with self.lock:
+            self.calls[operation] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if self.faults is not None:
+            self.faults.before(operation, self.throttle_code)
+        yield
+        if self.faults is not None:
+            self.faults.after(operation)
+
+    def _partial(self, entries):
+        if self.faults is None:
+            return []
+        return self.faults.partial(entries)
+
+    @property
+    def total_calls(self):
+        return sum(self.calls.values())
+
+    def stats(self):
+        return {
+            "calls": dict(self.calls),
+            "faults": dict(self.faults.injected) if self.faults else {},
+        }
+
+
+class FakeDynamoDB(FakeClient):
+    """Keeps only the keys of written items, like a remote table would.
+
+    ``rewrites`` counts, per table, the writes to a key that was already
+    stored, i.e. messages stored more than once.
+    """
+
+    throttle_code = DYNAMODB_THROTTLE
+
+    def __init__(self, latency=0.0, faults=None):
+        super().__init__(latency, faults)
+        self.tables = {}
+        self.rewrites = Counter()
+
+    def _table(self, name):
+        return self.tables.setdefault(name, {})
+
+    def seed(self, table_name, message_ids):
+        table = self._table(table_name)
+        for message_id in message_ids:
+            table[message_id] = {"message_id": {"S": message_id}}
+
+    def _put(self, table_name, item, condition=None):
+        table = self._table(table_name)
+        key = item["message_id"]["S"]
+        with self.lock:
+            if key in table:
+                if condition:
+                    return False
+                self.rewrites[table_name] += 1
+            table[key] = {"message_id": item["message_id"]}
+        return True
+
+    def item_count(self, table_name):
+        return len(self._table(table_name))
+
+    def duplicate_writes(self):
+        return {name: self.rewrites[name] for name in self.tables}
+
+    def get_item(self, TableName, Key, ProjectionExpression=None):
+        with self._call("GetItem"):
+            item = self._table(TableName).get(Key["message_id"]["S"])
+            if item is None:
+                return {}
+            return {"Item": item}
+
+    def batch_get_item(self, RequestItems):
+        with self._call("BatchGetItem"):
+            responses, unprocessed = {}, {}
+            for table_name, request in RequestItems.items():
+                table = self._table(table_name)
+                failed = self._partial(request["Keys"])
+                if failed:
+                    unprocessed[table_name] = {**request, "Keys": failed}
+                responses[table_name] = [
+                    {"message_id": key["message_id"]}
+                    for key in request["Keys"]
+                    if key not in failed and key["message_id"]["S"] in table
+                ]
+            return {"Responses": responses, "UnprocessedKeys": unprocessed}
+
+    def put_item(self, TableName, Item, ConditionExpression=None):
+        with self._call("PutItem"):
+            if not self._put(TableName, Item, ConditionExpression):
+                raise FakeClientError(
+                    "ConditionalCheckFailedException", "item exists")
+            return {}
+
+    def batch_write_item(self, RequestItems):
+        with self._call("BatchWriteItem"):
+            unprocessed = {}
+            for table_name, requests in RequestItems.items():
+                failed = self._partial(requests)
+                if failed:
+                    unprocessed[table_name] = failed
+                for request in requests:
+                    if request not in failed:
+                        self._put(table_name, request["PutRequest"]["Item"])
+            return {"UnprocessedItems": unprocessed}
+
+    def transact_write_items(self, TransactItems):
+        with self._call("TransactWriteItems"):
+            reasons = []
+            with self.lock:
+                for action in TransactItems:
+                    put = action["Put"]
+                    exists = put["Item"]["message_id"]["S"] in \
+                        self._table(put["TableName"])
+                    reasons.append({
+                        "Code": "ConditionalCheckFailed" if exists and
+                        put.get("ConditionExpression") else "None"})
+            if any(reason["Code"] != "None" for reason in reasons):
+                raise FakeClientError(
+                    "TransactionCanceledException", "cancelled",
+                    CancellationReasons=reasons)
+            for action in TransactItems:
+                self._put(action["Put"]["TableName"], action["Put"]["Item"])
+            return {}
+
+
+class FakeQueue:
+    """Messages of one queue with SQS visibility and receive semantics."""
+
+    def __init__(self):
+        self.messages = {}
+        self.visible = deque()
+        self.invisible = {}
+        self.receives = Counter()
+        self.lags = []
+        self.stale_deletes = 0
+        self.sequence = itertools.count(1)
+
+    def send(self, body, attributes=None):
+        message_id = f"sim-{next(self.sequence)}"
+        self.messages[message_id] = {
+            "body": body,
+            "sent_at": time.monotonic(),
+            "attributes": attributes or {},
+            "receipt": None,
+        }
+        self.visible.append(message_id)
+        return message_id
+
+    def _expire(self, now):
+        expired = [
+            message_id for message_id, until in self.invisible.items()
+            if until <= now
+        ]
+        for message_id in expired:
+            del self.invisible[message_id]
+            self.visible.append(message_id)
+
+    def receive(self, max_messages, visibility_timeout):
+        now = time.monotonic()
+        self._expire(now)
+        received = []
+        while self.visible and len(received) < max_messages:
+            message_id = self.visible.popleft()
+            message = self.messages.get(message_id)
+            if message is None:
+                continue
+            self.receives[message_id] += 1
+            message["receipt"] = f"{message_id}:{self.receives[message_id]}"
+            self.invisible[message_id] = now + visibility_timeout
+            received.append({
+                "MessageId": message_id,
+                "ReceiptHandle": message["receipt"],
+                "Body": message["body"],
+                "Attributes": {
+                    "ApproximateReceiveCount": str(self.receives[message_id]),
+                },
+                "MessageAttributes": message["attributes"],
+            })
+        return received
+
+    def delete(self, receipt_handle):
+        message_id = receipt_handle.split(":")[0]
+        message = self.messages.get(message_id)
+        if message is None or message["receipt"] != receipt_handle:
+            self.stale_deletes += 1
+            return False
+        del self.messages[message_id]
+        self.invisible.pop(message_id, None)
+        self.lags.append(time.monotonic() - message["sent_at"])
+        return True
+
+    def change_visibility(self, receipt_handle, timeout):
+        message_id = receipt_handle.split(":")[0]
+        message = self.messages.get(message_id)
+        if message is None or message["receipt"] != receipt_handle:
+            return False
+        self.invisible[message_id] = time.monotonic() + timeout
+        return True
+
+    def stats(self):
+        return {
+            "pending": len(self.messages),
+            "deleted": len(self.lags),
+            "received": sum(self.receives.values()),
+            "redeliveries": sum(
+                count - 1 for count in self.receives.values()),
+            "receive_counts": dict(Counter(self.receives.values())),
+            "stale_deletes": self.stale_deletes,
+            "lags": list(self.lags),
+        }
+
+
+class FakeSQS(FakeClient):
+    def __init__(self, latency=0.0, faults=None, visibility_timeout=30):
+        super().__init__(latency, faults)
+        self.visibility_timeout = visibility_timeout
+        self.queues = {}
+
+    def _queue(self, queue_url):
+        return self.queues.setdefault(queue_url, FakeQueue())
+
+    @staticmethod
+    def _failure(entry, code):
+        return {"Id": entry["Id"], "SenderFault": False, "Code": code,
+                "Message": code}
+
+    def get_queue_url(self, QueueName):
+        with self._call("GetQueueUrl"):
+            return {"QueueUrl": f"http://localhost/000000000000/{QueueName}"}
+
+    def enqueue(self, queue_url, bodies):
+        """Producer side: add ``bodies`` without counting an API call."""
+        with self.lock:
+            queue = self._queue(queue_url)
+            return [queue.send(body) for body in bodies]
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1,
+                        WaitTimeSeconds=0, VisibilityTimeout=None,
+                        AttributeNames=None, MessageAttributeNames=None):
+        with self._call("ReceiveMessage"):
+            if VisibilityTimeout is None:
+                VisibilityTimeout = self.visibility_timeout
+            with self.lock:
+                messages = self._queue(QueueUrl).receive(
+                    MaxNumberOfMessages, VisibilityTimeout)
+            return {"Messages": messages} if messages else {}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        with self._call("SendMessageBatch"):
+            failed = self._partial(Entries)
+            with self.lock:
+                queue = self._queue(QueueUrl)
+                for entry in Entries:
+                    if entry not in failed:
+                        queue.send(entry["MessageBody"],
+                                   entry.get("MessageAttributes"))
+            return {
+                "Successful": [
+                    {"Id": e["Id"]} for e in Entries if e not in failed],
+                "Failed": [
+                    self._failure(e, "InternalError") for e in failed],
+            }
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        with self._call("DeleteMessageBatch"):
+            failed = self._partial(Entries)
+            with self.lock:
+                queue = self._queue(QueueUrl)
+                for entry in Entries:
+                    if entry not in failed and \
+                            not queue.delete(entry["ReceiptHandle"]):
+                        failed.append(entry)
+            return {
+                "Successful": [
+                    {"Id": e["Id"]} for e in Entries if e not in failed],
+                "Failed": [
+                    self._failure(e, "ReceiptHandleIsInvalid")
+                    for e in failed],
+            }
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        with self._call("DeleteMessage"):
+            with self.lock:
+                if not self._queue(QueueUrl).delete(ReceiptHandle):
+                    raise FakeClientError(
+                        "ReceiptHandleIsInvalid", ReceiptHandle)
+            return {}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        with self._call("ChangeMessageVisibilityBatch"):
+            failed = self._partial(Entries)
+            with self.lock:
+                queue = self._queue(QueueUrl)
+                for entry in Entries:
+                    if entry not in failed and not queue.change_visibility(
+                            entry["ReceiptHandle"],
+                            entry["VisibilityTimeout"]):
+                        failed.append(entry)
+            return {
+                "Successful": [
+                    {"Id": e["Id"]} for e in Entries if e not in failed],
+                "Failed": [
+                    self._failure(e, "ReceiptHandleIsInvalid")
+                    for e in failed],
+            }
+
+    def queue_stats(self, queue_url):
+        with self.lock:
+            return self._queue(queue_url).stats()
+
+
+class FakeCloudWatch(FakeClient):
+    def __init__(self, latency=0.0, faults=None):
+        super().__init__(latency, faults)
+        self.datums = 0
+
+    def put_metric_data(self, Namespace, MetricData):
+        with self._call("PutMetricData"):
+            self.datums += len(MetricData)
+            return {}
+
+
+class Fakes:
+    def __init__(self, latency=0.0):
+        self.dynamodb = FakeDynamoDB(latency)
+        self.sqs = FakeSQS(latency)
+        self.cloudwatch = FakeCloudWatch(latency)
+
+    @property
+    def clients(self):
+        return {
+            "dynamodb": self.dynamodb,
+            "sqs": self.sqs,
+            "cloudwatch": self.cloudwatch,
+        }
+
+    def calls(self):
+        calls = Counter()
+        for client in self.clients.values():
+            calls.update(client.calls)
+        return calls
+
+
+def install(fakes):
+    """Route every ``get_client`` call and cached client to ``fakes``.
+
+    ``fakes`` is a :class:`Fakes` or a mapping of service name to client,
+    e.g. manager proxies shared between processes.
+    """
+    from controllers import messages
+    from services.dynamodb import DynamoDBService
+    from utils import aws, metrics
+
+    clients = fakes if isinstance(fakes, dict) else fakes.clients
+    aws.reset_clients()
+    aws._clients.update(clients)
+    store = messages.idempotency_store
+    if isinstance(store, DynamoDBService):
+        store._client = None
+    store.cache.clear()
+    messages.sqs_service._sqs = None
+    metrics.cloudwatch = None
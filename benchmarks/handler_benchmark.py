@@ -0,0 +1,278 @@
+"""Hot-path benchmark: ``handler`` driven by synthetic SQS events.
+
+Runs each scenario (batch size up to the 10,000 records of a batching
+window, payload size/nesting, duplicate and invalid ratios) against the
+in-process fakes of ``fakes.py``, with an optional per-call latency, and
+reports messages/sec, per-record latency percentiles, API calls per
+message and the peak traced memory of one invocation. Results can be
+saved as a baseline and later runs compared against it; the comparison
+exits non-zero on a regression.
+
+Run from the repository root::
+
+    PYTHONPATH=app python benchmarks/handler_benchmark.py
+    PYTHONPATH=app python benchmarks/handler_benchmark.py --save-baseline
+    PYTHONPATH=app python benchmarks/handler_benchmark.py --compare
+
+Throughput depends on the machine and its load, so the comparison uses
+``relative_throughput``: messages/sec divided by the speed of a fixed
+JSON workload timed next to each run. Record the baseline on the kind of
+machine that runs the comparison and widen ``--tolerance`` on noisy
+runners. API calls per message are deterministic for a given seed and
+are compared exactly.
+"""
+import argparse
+import atexit
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import fakes
+from controllers import messages
+from main import handler
+from services.idempotency import create_idempotency_store
+from utils.config import Config
+from utils.logging import percentile
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "baselines", "handler.json")
+QUEUE_ARN = "arn:aws:sqs:us-east-1:000000000000:benchmark_queue"
+
+SCENARIOS = {
+    "small": {"batch_size": 10, "items": 1, "depth": 0},
+    "large_batch": {"batch_size": 100, "items": 1, "depth": 0},
+    "nested_payload": {"batch_size": 10, "items": 20, "depth": 3},
+    "duplicates": {"batch_size": 10, "items": 1, "depth": 0,
+                   "duplicate_ratio": 0.5},
+    "invalid": {"batch_size": 10, "items": 1, "depth": 0,
+                "invalid_ratio": 0.2},
+    "batching_window": {"batch_size": 10000, "items": 5, "depth": 1,
+                        "duplicate_ratio": 0.1, "max_batches": 2},
+}
+
+
+def make_payload(items, depth):
+    def node(level):
+        value = {"amount": round(level * 1.25 + 0.01, 2), "label": "x" * 16}
+        if level < depth:
+            value["children"] = [node(level + 1), node(level + 1)]
+        return value
+
+    return {"items": [node(0) for _ in range(items)], "currency": "BRL"}
+
+
+def make_events(scenario, batches, rng):
+    """Build ``batches`` events and the ids that must already be stored."""
+    payload = make_payload(scenario["items"], scenario["depth"])
+    events, seeded = [], []
+    counter = 0
+    for _ in range(min(batches, scenario.get("max_batches", batches))):
+        records = []
+        for _ in range(scenario["batch_size"]):
+            counter += 1
+            message_id = f"msg-{counter}"
+            if rng.random() < scenario.get("invalid_ratio", 0):
+                body = "{invalid_json"
+            else:
+                if rng.random() < scenario.get("duplicate_ratio", 0):
+                    seeded.append(message_id)
+                body = json.dumps({
+                    "message_id": message_id,
+                    "timestamp": "2025-10-04T12:00:00Z",
+                    "source": "benchmark",
+                    "type": "transaction_created",
+                    "payload": payload,
+                })
+            records.append({
+                "messageId": f"record-{counter}",
+                "receiptHandle": f"handle-{counter}",
+                "body": body,
+                "attributes": {"ApproximateReceiveCount": "1"},
+                "eventSourceARN": QUEUE_ARN,
+            })
+        events.append({"Records": records})
+    return events, seeded
+
+
+def calibrate(rounds=2000):
+    """Rounds/sec of a fixed JSON workload, to normalise throughput."""
+    body = json.dumps(make_payload(1, 2))
+    started = time.perf_counter()
+    for _ in range(rounds):
+        json.dumps(json.loads(body))
+    return rounds / (time.perf_counter() - started)
+
+
+def prepare(seeded, latency, store):
+    """Fresh fakes and idempotency store holding only ``seeded``."""
+    fake = fakes.Fakes(latency)
+    if store == "dynamodb":
+        messages.idempotency_store = create_idempotency_store(store)
+        fakes.install(fake)
+        fake.dynamodb.seed(Config.DYNAMO_TABLE, seeded)
+        return fake
+    url = "memory"
+    if store == "sqlite":
+        directory = tempfile.mkdtemp()
+        atexit.register(shutil.rmtree, directory, True)
+        url = f"sqlite://{os.path.join(directory, 'idempotency.db')}"
+    messages.idempotency_store = create_idempotency_store(url)
+    fakes.install(fake)
+    messages.idempotency_store.save_messages(
+        [(message_id, {}) for message_id in seeded], converted=True)
+    messages.idempotency_store.cache.clear()
+    return fake
+
+
+def timed_pass(events, seeded, latency, store):
+    """Run ``events`` once; return (seconds, per-record ms, API calls)."""
+    fake = prepare(seeded, latency, store)
+    per_record_ms = []
+    started = time.perf_counter()
+    for event in events:
+        batch_started = time.perf_counter()
+        handler(event, None)
+        per_record_ms.append(
+            (time.perf_counter() - batch_started) * 1000 /
+            len(event["Records"]))
+    return time.perf_counter() - started, per_record_ms, fake.calls()
+
+
+def memory_pass(events, seeded, store):
+    """Largest traced allocation peak, in KiB, of a single invocation."""
+    prepare(seeded, 0.0, store)
+    peak = 0
+    tracemalloc.start()
+    for event in events:
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        handler(event, None)
+        peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def run_scenario(scenario, batches, latency, seed, repeat, store):
+    """Keep the fastest of ``repeat`` timed passes, then trace memory.
+
+    The fastest calibration of the runs normalises the fastest pass, so
+    both sides of ``relative_throughput`` are best cases.
+    """
+    events, seeded = make_events(scenario, batches, random.Random(seed))
+    records = sum(len(event["Records"]) for event in events)
+    timed_pass(events[:10], seeded, 0.0, store)
+    runs = []
+    speed = 0.0
+    for _ in range(repeat):
+        speed = max(speed, calibrate())
+        runs.append(timed_pass(events, seeded, latency, store))
+    elapsed, per_record_ms, calls = min(runs, key=lambda run: run[0])
+    per_record_ms.sort()
+    return {
+        "messages_per_sec": round(records / elapsed, 1),
+        "relative_throughput": round(records / elapsed / speed, 4),
+        "record_ms_p50": round(percentile(per_record_ms, 50), 4),
+        "record_ms_p95": round(percentile(per_record_ms, 95), 4),
+        "record_ms_p99": round(percentile(per_record_ms, 99), 4),
+        "api_calls_per_message": round(sum(calls.values()) / records, 4),
+        "api_calls": dict(sorted(calls.items())),
+        "peak_memory_kib": round(memory_pass(events, seeded, store), 1),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return one line per regression against ``baseline``."""
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result["relative_throughput"] < \
+                expected["relative_throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: relative throughput "
+                f"{result['relative_throughput']} < baseline "
+                f"{expected['relative_throughput']}")
+        if result["api_calls_per_message"] > \
+                expected["api_calls_per_message"]:
+            regressions.append(
+                f"{name}: API calls/message "
+                f"{result['api_calls_per_message']} > baseline "
+                f"{expected['api_calls_per_message']}")
+        if result["peak_memory_kib"] > \
+                expected["peak_memory_kib"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: peak memory {result['peak_memory_kib']} KiB > "
+                f"baseline {expected['peak_memory_kib']} KiB")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", action="append",
+                        choices=sorted(SCENARIOS),
+                        help="run only these scenarios (repeatable)")
+    parser.add_argument("--batches", type=int, default=100)
+    parser.add_argument("--latency-ms", type=float, default=0.0,
+                        help="latency injected per fake API call")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="timed runs per scenario; the fastest is kept")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--store", choices=("dynamodb", "memory", "sqlite"),
+                        default="dynamodb",
+                        help="idempotency store; compare against a "
+                             "baseline saved with the same one")
+    parser.add_argument("--micro-batch-size", type=int,
+                        default=Config.MICRO_BATCH_SIZE,
+                        help="records per pipeline micro-batch")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed throughput/memory regression")
+    args = parser.parse_args(argv)
+
+    logging.getLogger("worker-consumer-sqs").setLevel(logging.CRITICAL)
+    Config.MICRO_BATCH_SIZE = args.micro_batch_size
+    results = {}
+    print(f"{'scenario':<16} {'msg/s':>10} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'calls/msg':>10} {'peak KiB':>10}")
+    for name in args.scenario or SCENARIOS:
+        result = run_scenario(SCENARIOS[name], args.batches,
+                              args.latency_ms / 1000, args.seed, args.repeat,
+                              args.store)
+        results[name] = result
+        print(f"{name:<16} {result['messages_per_sec']:>10.1f} "
+              f"{result['record_ms_p50']:>8.4f} "
+              f"{result['record_ms_p95']:>8.4f} "
+              f"{result['record_ms_p99']:>8.4f} "
+              f"{result['api_calls_per_message']:>10.4f} "
+              f"{result['peak_memory_kib']:>10.1f}")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write("\n")
+        print(f"\nbaseline saved to {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(
+                results, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("\nregressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nno regression against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
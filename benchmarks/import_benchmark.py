@@ -0,0 +1,65 @@
+"""Cold-start benchmark: time to import the Lambda handler module.
+
+Each sample runs a fresh interpreter, so nothing is cached between runs.
+Reports the median time of ``import main``, of the first AWS client
+created afterwards (the cost deferred out of the import) and, from
+``-X importtime``, the slowest modules by cumulative time.
+
+Run from the repository root::
+
+    PYTHONPATH=app python benchmarks/import_benchmark.py
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "app")
+STATEMENT = (
+    "import time\n"
+    "started = time.perf_counter()\n"
+    "import main\n"
+    "imported = time.perf_counter()\n"
+    "from utils.aws import get_client\n"
+    "get_client('dynamodb')\n"
+    "print(imported - started, time.perf_counter() - imported)\n"
+)
+
+
+def sample():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STATEMENT],
+        cwd=APP_DIR, capture_output=True, text=True, check=True,
+        env=dict(os.environ, PYTHONPATH=APP_DIR))
+    import_time, client_time = map(float, result.stdout.split())
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((int(cumulative) / 1000, name.rstrip()))
+    return import_time, client_time, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    samples = [sample() for _ in range(args.repeat)]
+    import_ms = statistics.median(s[0] for s in samples) * 1000
+    client_ms = statistics.median(s[1] for s in samples) * 1000
+    print(f"import main         {import_ms:>8.1f} ms")
+    print(f"first AWS client    {client_ms:>8.1f} ms")
+
+    print(f"\n{'cumulative ms':>13}  module")
+    for cumulative, name in sorted(samples[-1][2], reverse=True)[:args.top]:
+        print(f"{cumulative:>13.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
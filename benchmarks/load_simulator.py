@@ -0,0 +1,318 @@
+"""End-to-end load and fault-injection simulator.
+
+A producer feeds a backlog of messages into a simulated SQS queue while
+several consumer processes drain it, each one standing in for a
+concurrent Lambda instance (``--mode lambda``: receive a batch, call
+``main.handler`` with a deadline-aware context, delete what succeeded)
+or a ``daemon.Consumer`` (``--mode daemon``). DynamoDB, SQS and
+CloudWatch are the fakes of ``fakes.py``, served from one manager
+process so every consumer shares the same tables and queue, with
+optional latency, latency spikes, throttling, timeouts and partial batch
+failures.
+
+The report shows sustained throughput, redeliveries, duplicate writes
+per table, end-to-end lag (send to delete) and the injected faults.
+
+Run from the repository root::
+
+    PYTHONPATH=app python benchmarks/load_simulator.py --instances 4
+    PYTHONPATH=app python benchmarks/load_simulator.py \\
+        --throttle-rate 0.05 --timeout-rate 0.01 --partial-rate 0.1 \\
+        --env BULK_SAVE=true
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from multiprocessing.managers import BaseManager
+import fakes
+
+QUEUE_URL = "https://sqs.us-east-1.amazonaws.com/000000000000/load_simulator"
+POLL_INTERVAL = 0.01
+
+
+class SimulatorManager(BaseManager):
+    pass
+
+
+SimulatorManager.register("FakeDynamoDB", fakes.FakeDynamoDB)
+SimulatorManager.register("FakeSQS", fakes.FakeSQS)
+SimulatorManager.register("FakeCloudWatch", fakes.FakeCloudWatch)
+
+
+class SimulatedContext:
+    """The part of the Lambda context the handler reads."""
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+
+    def get_remaining_time_in_millis(self):
+        return max(int((self.deadline - time.monotonic()) * 1000), 0)
+
+
+def drained(clients, producing):
+    return not producing.is_set() and \
+        clients["sqs"].queue_stats(QUEUE_URL)["pending"] == 0
+
+
+def lambda_instance(clients, options, producing, stop, results):
+    """Poll like an event source mapping and invoke ``handler``."""
+    from controllers.messages import acknowledge_records, sqs_service
+    from daemon import to_record
+    from main import handler
+    from services.sqs import arn_from_queue_url
+
+    fakes.install(clients)
+    event_source_arn = arn_from_queue_url(QUEUE_URL, "us-east-1")
+    counters = Counter()
+    while not stop.is_set() and not drained(clients, producing):
+        try:
+            messages = clients["sqs"].receive_message(
+                QueueUrl=QUEUE_URL,
+                MaxNumberOfMessages=options.batch_size,
+                VisibilityTimeout=options.visibility_timeout,
+                AttributeNames=["All"]).get("Messages", [])
+        except Exception:
+            counters["receive_errors"] += 1
+            messages = []
+        if not messages:
+            time.sleep(POLL_INTERVAL)
+            continue
+        records = [to_record(m, event_source_arn) for m in messages]
+        started = time.monotonic()
+        context = SimulatedContext(started + options.lambda_timeout)
+        counters["invocations"] += 1
+        counters["records"] += len(records)
+        try:
+            result = handler({"Records": records}, context)
+        except Exception:
+            counters["handler_errors"] += 1
+            continue
+        if time.monotonic() - started > options.lambda_timeout:
+            counters["lambda_timeouts"] += 1
+            continue
+        counters["batch_item_failures"] += len(result["batchItemFailures"])
+        counters["delete_failures"] += len(
+            acknowledge_records(records, result, sqs_service))
+    results.put(dict(counters))
+
+
+def daemon_instance(clients, options, producing, stop, results):
+    """Run a ``daemon.Consumer`` until the backlog is drained."""
+    from daemon import Consumer
+
+    fakes.install(clients)
+    consumer = Consumer(
+        QUEUE_URL, visibility_timeout=options.visibility_timeout,
+        wait_time=0)
+
+    def watch():
+        while not stop.is_set() and not drained(clients, producing):
+            time.sleep(POLL_INTERVAL * 5)
+        consumer.stop()
+
+    threading.Thread(target=watch, daemon=True).start()
+    results.put({"records": consumer.run()})
+
+
+def make_body(message_id, items):
+    return json.dumps({
+        "message_id": message_id,
+        "timestamp": "2025-10-04T12:00:00Z",
+        "source": "load_simulator",
+        "type": "transaction_created",
+        "payload": {
+            "items": [
+                {"amount": round(i * 1.25 + 0.01, 2), "label": "x" * 16}
+                for i in range(items)
+            ],
+        },
+    })
+
+
+def produce(sqs, options, producing):
+    """Send the backlog, paced at ``--rate`` messages/sec when set."""
+    rng = random.Random(options.seed)
+    started = time.monotonic()
+    chunk, sent = [], []
+    for index in range(options.messages):
+        if sent and rng.random() < options.duplicate_ratio:
+            message_id = rng.choice(sent)
+        else:
+            message_id = f"load-{index}"
+            sent.append(message_id)
+        chunk.append(make_body(message_id, options.payload_items))
+        if len(chunk) == 100 or index == options.messages - 1:
+            sqs.enqueue(QUEUE_URL, chunk)
+            chunk = []
+            if options.rate:
+                delay = started + (index + 1) / options.rate - \
+                    time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+    producing.clear()
+    return len(sent)
+
+
+def lag_percentiles(lags):
+    from utils.logging import percentile
+
+    lags = sorted(lag * 1000 for lag in lags)
+    if not lags:
+        return {}
+    return {
+        "p50": round(percentile(lags, 50), 1),
+        "p95": round(percentile(lags, 95), 1),
+        "p99": round(percentile(lags, 99), 1),
+        "max": round(lags[-1], 1),
+    }
+
+
+def simulate(options):
+    from utils.config import Config
+
+    manager = SimulatorManager()
+    manager.start()
+    latency = options.latency_ms / 1000
+
+    def faults(offset):
+        return fakes.Faults(
+            throttle_rate=options.throttle_rate,
+            timeout_rate=options.timeout_rate,
+            partial_rate=options.partial_rate,
+            spike_rate=options.spike_rate,
+            spike_latency=options.spike_ms / 1000,
+            seed=options.seed + offset)
+
+    clients = {
+        "dynamodb": manager.FakeDynamoDB(latency, faults(1)),
+        "sqs": manager.FakeSQS(latency, faults(2)),
+        "cloudwatch": manager.FakeCloudWatch(latency, faults(3)),
+    }
+    producing = multiprocessing.Event()
+    producing.set()
+    stop = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    target = lambda_instance if options.mode == "lambda" \
+        else daemon_instance
+    workers = [
+        multiprocessing.Process(
+            target=target,
+            args=(clients, options, producing, stop, results))
+        for _ in range(options.instances)
+    ]
+
+    started = time.monotonic()
+    for worker in workers:
+        worker.start()
+    unique = produce(clients["sqs"], options, producing)
+    counters = Counter()
+    finished = 0
+    while finished < len(workers):
+        if time.monotonic() - started > options.max_seconds:
+            stop.set()
+        try:
+            counters.update(results.get(timeout=0.5))
+            finished += 1
+        except queue.Empty:
+            if not any(worker.is_alive() for worker in workers):
+                break
+    counters["crashed_instances"] = len(workers) - finished
+    stop.set()
+    for worker in workers:
+        worker.join(timeout=5)
+    elapsed = time.monotonic() - started
+
+    backlog = clients["sqs"].queue_stats(QUEUE_URL)
+    injected, calls = Counter(), Counter()
+    for client in clients.values():
+        stats = client.stats()
+        injected.update(stats["faults"])
+        calls.update(stats["calls"])
+    stored = clients["dynamodb"].item_count(Config.DYNAMO_TABLE)
+    report = {
+        "mode": options.mode,
+        "instances": options.instances,
+        "elapsed_sec": round(elapsed, 2),
+        "produced": options.messages,
+        "unique_message_ids": unique,
+        "deleted": backlog["deleted"],
+        "pending": backlog["pending"],
+        "throughput_msgs_per_sec": round(backlog["deleted"] / elapsed, 1),
+        "redeliveries": backlog["redeliveries"],
+        "receive_counts": dict(sorted(backlog["receive_counts"].items())),
+        "stale_deletes": backlog["stale_deletes"],
+        "stored_message_ids": stored,
+        "missing_message_ids": unique - stored,
+        "duplicate_writes": clients["dynamodb"].duplicate_writes(),
+        "lag_ms": lag_percentiles(backlog["lags"]),
+        "consumers": dict(sorted(counters.items())),
+        "faults_injected": dict(sorted(injected.items())),
+        "api_calls": dict(sorted(calls.items())),
+    }
+    manager.shutdown()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mode", choices=("lambda", "daemon"),
+                        default="lambda")
+    parser.add_argument("--instances", type=int, default=4,
+                        help="concurrent consumer processes")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--rate", type=float, default=0.0,
+                        help="producer messages/sec (0: whole backlog "
+                             "up front)")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0,
+                        help="share of messages re-sent by the producer")
+    parser.add_argument("--payload-items", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--visibility-timeout", type=float, default=5.0)
+    parser.add_argument("--lambda-timeout", type=float, default=3.0,
+                        help="seconds; slower invocations count as "
+                             "timed out and are not acknowledged")
+    parser.add_argument("--latency-ms", type=float, default=1.0,
+                        help="latency of every fake API call")
+    parser.add_argument("--spike-rate", type=float, default=0.0)
+    parser.add_argument("--spike-ms", type=float, default=500.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--partial-rate", type=float, default=0.0,
+                        help="share of batch calls failing half their "
+                             "entries")
+    parser.add_argument("--max-seconds", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[],
+                        metavar="NAME=VALUE",
+                        help="Config override for the consumers "
+                             "(repeatable)")
+    parser.add_argument("--json", action="store_true",
+                        help="print the report as JSON")
+    parser.add_argument("--verbose", action="store_true",
+                        help="keep the consumers' logs")
+    options = parser.parse_args(argv)
+
+    for override in options.env:
+        name, _, value = override.partition("=")
+        os.environ[name] = value
+    if not options.verbose:
+        os.environ["LOG_LEVEL"] = "CRITICAL"
+
+    report = simulate(options)
+    if options.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            print(f"{key:<26} {value}")
+    return 0 if report["pending"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""Benchmark: consumer throughput with 1..N supervisor worker processes.
+
+Each worker runs ``message_handler`` in a loop on synthetic SQS batches
+against an in-process DynamoDB stub, so only the CPU-bound part of the
+hot path (JSON decoding, Decimal conversion, logging, metrics) is
+measured. Throughput is aggregated by the supervisor from the metrics
+every worker ships back, exactly like in production.
+
+Run from the repository root::
+
+    PYTHONPATH=app python benchmarks/supervisor_benchmark.py --workers 1 2 4
+"""
+import argparse
+import json
+import os
+import time
+from supervisor import Supervisor
+from utils.metrics import registry
+
+
+class StubDynamoDBService:
+    def exists_messages(self, message_ids):
+        return set(), set()
+
+    def save_message(self, message_id, message, converted=False):
+        return True, None
+
+    def publish_cache_metrics(self):
+        pass
+
+
+def make_event(batch, items):
+    payload = {"items": [
+        {"amount": i * 1.25, "label": "x" * 16, "tags": [0.5, 1.5]}
+        for i in range(items)
+    ]}
+    return {"Records": [
+        {
+            "messageId": str(i),
+            "receiptHandle": f"r{i}",
+            "body": json.dumps({"message_id": str(i), "payload": payload}),
+            "eventSourceARN": "arn:aws:sqs:us-east-1:000000000000:bench",
+        }
+        for i in range(batch)
+    ]}
+
+
+def benchmark_worker(worker_id, queue_url, metrics_queue, options):
+    from controllers import messages
+
+    messages.idempotency_store = StubDynamoDBService()
+    registry.publisher = lambda series: metrics_queue.put((worker_id, series))
+    registry.flush_interval = 0.5
+    event = make_event(options["batch"], options["items"])
+    deadline = time.monotonic() + options["duration"]
+    while time.monotonic() < deadline:
+        messages.message_handler(event)
+        registry.add("MessagesProcessed", len(event["Records"]))
+    registry.flush()
+
+
+def run(workers, options):
+    supervisor = Supervisor(
+        ["bench"], workers=workers, target=benchmark_worker, options=options)
+    for worker_id in range(workers):
+        supervisor.start_worker(worker_id)
+    while any(p.is_alive() for p in supervisor.processes.values()):
+        supervisor.collect_metrics(timeout=0.2)
+    supervisor.collect_metrics(timeout=0.5)
+    total = sum(
+        counters.get("MessagesProcessed", 0)
+        for counters in supervisor.counters.values())
+    return total / options["duration"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+",
+                        default=[1, 2, os.cpu_count() or 1])
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--batch", type=int, default=10)
+    parser.add_argument("--items", type=int, default=20)
+    args = parser.parse_args()
+    options = {
+        "duration": args.duration, "batch": args.batch, "items": args.items}
+
+    print(f"cpu_count={os.cpu_count()}")
+    print(f"{'workers':>8} {'msg/s':>12} {'scaling':>8}")
+    baseline = None
+    for workers in sorted(set(args.workers)):
+        throughput = run(workers, options)
+        baseline = baseline or throughput / workers
+        print(f"{workers:>8} {throughput:>12.0f} "
+              f"{throughput / baseline:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
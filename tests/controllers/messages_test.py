@@ -1,4 +1,5 @@
 from unittest.mock import patch
+from decimal import Decimal
 import json
 from controllers.messages import message_handler
 
@@ -21,156 +22,578 @@ VALID_MESSAGE = {
 INVALID_JSON = "{invalid_json}"
 
 
+def make_record(record_id, body, group_id=None):
+    record = {
+        "messageId": record_id,
+        "receiptHandle": f"r{record_id}",
+        "body": body,
+        "eventSourceARN": "arn:aws:sqs:::queue",
+    }
+    if group_id is not None:
+        record["attributes"] = {"MessageGroupId": group_id}
+    return record
+
+
+def message_body(message_id):
+    return json.dumps({**VALID_MESSAGE, "message_id": message_id})
+
+
 @patch("controllers.messages.put_metric")
 @patch("controllers.messages.log_message")
-@patch("controllers.messages.sqs_service")
-@patch("controllers.messages.dynamodb_service")
-def test_message_parse_error(mock_dynamo, mock_sqs, mock_log, mock_metric):
+@patch("controllers.messages.idempotency_store")
+def test_message_parse_error(mock_dynamo, mock_log, mock_metric):
+    event = {"Records": [make_record("1", INVALID_JSON)]}
+
+    result = message_handler(event)
+
+    mock_log.assert_called_with("1", "message_parse", "error", {"body": INVALID_JSON})
+    mock_metric.assert_any_call("InvalidMessages", 1)
+    mock_dynamo.exists_messages.assert_not_called()
+    assert result == {"batchItemFailures": [{"itemIdentifier": "1"}]}
+
+
+@patch("controllers.messages.put_metric")
+@patch("controllers.messages.log_message")
+@patch("controllers.messages.idempotency_store")
+def test_message_already_exists(mock_dynamo, mock_log, mock_metric):
+    mock_dynamo.exists_messages.return_value = (
+        {VALID_MESSAGE["message_id"]}, set())
+
+    event = {"Records": [make_record("1", json.dumps(VALID_MESSAGE))]}
+
+    result = message_handler(event)
+
+    mock_dynamo.exists_messages.assert_called_once_with(
+        [VALID_MESSAGE["message_id"]])
+    mock_log.assert_any_call(
+        VALID_MESSAGE["message_id"], "message_skipped", "duplicate"
+    )
+    mock_metric.assert_called_with("DuplicateMessages", 1)
+    mock_dynamo.save_message.assert_not_called()
+    assert result == {"batchItemFailures": []}
+
+
+@patch("controllers.messages.put_metric")
+@patch("controllers.messages.log_message")
+@patch("controllers.messages.idempotency_store")
+def test_message_saved_successfully(mock_dynamo, mock_log, mock_metric):
+    mock_dynamo.exists_messages.return_value = (set(), set())
+    mock_dynamo.save_message.return_value = (True, None)
+
+    event = {"Records": [make_record("1", json.dumps(VALID_MESSAGE))]}
+
+    result = message_handler(event)
+
+    mock_dynamo.exists_messages.assert_called_once_with(
+        [VALID_MESSAGE["message_id"]])
+    mock_dynamo.save_message.assert_called_once_with(
+        VALID_MESSAGE["message_id"], VALID_MESSAGE, converted=True
+    )
+    saved_data = mock_dynamo.save_message.call_args[0][1]
+    assert isinstance(saved_data["payload"]["amount"], Decimal)
+    assert result == {"batchItemFailures": []}
+
+
+@patch("controllers.messages.put_metric")
+@patch("controllers.messages.log_message")
+@patch("controllers.messages.idempotency_store")
+def test_message_save_failure(mock_dynamo, mock_log, mock_metric):
+    mock_dynamo.exists_messages.return_value = (set(), set())
+    mock_dynamo.save_message.return_value = (False, "DynamoDB error")
+
+    event = {"Records": [make_record("1", json.dumps(VALID_MESSAGE))]}
+
+    result = message_handler(event)
+
+    mock_dynamo.save_message.assert_called_once_with(
+        VALID_MESSAGE["message_id"], VALID_MESSAGE, converted=True
+    )
+    mock_log.assert_any_call(
+        VALID_MESSAGE["message_id"],
+        "message_save_failed",
+        "error",
+        {"error": "Idempotency store error"},
+    )
+    assert result == {"batchItemFailures": [{"itemIdentifier": "1"}]}
+
+
+@patch("controllers.messages.put_metric")
+@patch("controllers.messages.log_message")
+@patch("controllers.messages.idempotency_store")
+def test_dynamodb_check_failure(mock_dynamo, mock_log, mock_metric):
+    """Caso o exists_messages retorne erro (err != None), deve logar e não prosseguir"""
+    mock_dynamo.exists_messages.return_value = (
+        set(), {VALID_MESSAGE["message_id"]})
+
+    event = {"Records": [make_record("1", json.dumps(VALID_MESSAGE))]}
+
+    result = message_handler(event)
+
+    mock_log.assert_any_call(
+        VALID_MESSAGE["message_id"],
+        "message_check_failed",
+        "error",
+        {"error": "Idempotency store error"},
+    )
+    mock_dynamo.save_message.assert_not_called()
+    assert result == {"batchItemFailures": [{"itemIdentifier": "1"}]}
+
+
+@patch("controllers.messages.put_metric")
+@patch("controllers.messages.log_message")
+@patch("controllers.messages.idempotency_store")
+def test_duplicate_message_id_in_same_batch(mock_dynamo, mock_log, mock_metric):
+    mock_dynamo.exists_messages.return_value = (set(), set())
+    mock_dynamo.save_message.return_value = (True, None)
+
+    body = json.dumps(VALID_MESSAGE)
+    event = {"Records": [make_record(str(i), body) for i in range(3)]}
+
+    result = message_handler(event)
+
+    mock_dynamo.exists_messages.assert_called_once_with(
+        [VALID_MESSAGE["message_id"]] * 3)
+    mock_dynamo.save_message.assert_called_once_with(
+        VALID_MESSAGE["message_id"], VALID_MESSAGE, converted=True
+    )
+    assert mock_metric.call_args_list.count(
+        (("DuplicateMessages", 1),)) == 2
+    assert result == {"batchItemFailures": []}
+
+
+@patch("controllers.messages.Config.DEDUP_MODE", "write_first")
+@patch("controllers.messages.put_metric")
+@patch("controllers.messages.log_message")
+@patch("controllers.messages.idempotency_store")
+def test_write_first_saves_without_read(mock_dynamo, mock_log, mock_metric):
+    mock_dynamo.claim_message.return_value = ("saved", None)
+
+    event = {"Records": [make_record("1", json.dumps(VALID_MESSAGE))]}
+
+    result = message_handler(event)
+
+    mock_dynamo.exists_messages.assert_not_called()
+    mock_dynamo.save_message.assert_not_called()
+    mock_dynamo.claim_message.assert_called_once_with(
+        VALID_MESSAGE["message_id"], VALID_MESSAGE, converted=True
+    )
+    assert result == {"batchItemFailures": []}
+
+
+@patch("controllers.messages.Config.DEDUP_MODE", "write_first")
+@patch("controllers.messages.put_metric")
+@patch("controllers.messages.log_message")
+@patch("controllers.messages.idempotency_store")
+def test_write_first_conditional_failure_is_duplicate(mock_dynamo, mock_log, mock_metric):
+    mock_dynamo.claim_message.return_value = ("duplicate", None)
+
+    event = {"Records": [make_record("1", json.dumps(VALID_MESSAGE))]}
+
+    result = message_handler(event)
+
+    mock_log.assert_any_call(
+        VALID_MESSAGE["message_id"], "message_skipped", "duplicate"
+    )
+    mock_metric.assert_called_with("DuplicateMessages", 1)
+    assert result == {"batchItemFailures": []}
+
+
+@patch("controllers.messages.Config.BULK_SAVE", True)
+@patch("controllers.messages.put_metric")
+@patch("controllers.messages.log_message")
+@patch("controllers.messages.idempotency_store")
+def test_bulk_save_reports_outcome_per_record(mock_dynamo, mock_log, mock_metric):
+    mock_dynamo.exists_messages.return_value = (set(), set())
+    mock_dynamo.save_messages.return_value = {
+        "a": "saved", "b": "duplicate", "c": "failed"}
+
     event = {
         "Records": [
-            {
-                "messageId": "1",
-                "receiptHandle": "r1",
-                "body": INVALID_JSON,
-                "eventSourceARN": "arn:aws:sqs:::queue",
-            }
+            make_record(message_id, message_body(message_id))
+            for message_id in ("a", "b", "c")
         ]
     }
 
-    message_handler(event)
+    result = message_handler(event)
 
-    mock_log.assert_called_with("1", "message_parse", "error", {"body": INVALID_JSON})
-    mock_metric.assert_called_with("InvalidMessages", 1)
-    mock_dynamo.exists_message.assert_not_called()
-    mock_sqs.delete_message.assert_not_called()
+    mock_dynamo.save_message.assert_not_called()
+    args, kwargs = mock_dynamo.save_messages.call_args
+    assert [message_id for message_id, _ in args[0]] == ["a", "b", "c"]
+    assert kwargs == {"transactional": False, "converted": True}
+    mock_log.assert_any_call("b", "message_skipped", "duplicate")
+    mock_log.assert_any_call(
+        "c", "message_save_failed", "error", {"error": "Idempotency store error"})
+    assert result == {"batchItemFailures": [{"itemIdentifier": "c"}]}
 
 
+@patch("controllers.messages.Config.BULK_SAVE", True)
 @patch("controllers.messages.put_metric")
 @patch("controllers.messages.log_message")
-@patch("controllers.messages.sqs_service")
-@patch("controllers.messages.dynamodb_service")
-def test_message_already_exists(mock_dynamo, mock_sqs, mock_log, mock_metric):
-    mock_dynamo.exists_message.return_value = (True, None)
+@patch("controllers.messages.idempotency_store")
+def test_bulk_save_writes_fifo_groups_in_waves(mock_dynamo, mock_log, mock_metric):
+    mock_dynamo.exists_messages.return_value = (set(), set())
+    mock_dynamo.save_messages.side_effect = lambda items, **_: {
+        message_id: "failed" if message_id == "a1" else "saved"
+        for message_id, _ in items}
 
-    body = json.dumps(VALID_MESSAGE)
     event = {
         "Records": [
-            {
-                "messageId": "1",
-                "receiptHandle": "r1",
-                "body": body,
-                "eventSourceARN": "arn:aws:sqs:::queue",
-            }
+            make_record("1", message_body("a1"), group_id="A"),
+            make_record("2", message_body("b1"), group_id="B"),
+            make_record("3", message_body("a2"), group_id="A"),
+            make_record("4", message_body("b2"), group_id="B"),
         ]
     }
 
-    message_handler(event)
+    result = message_handler(event)
 
-    mock_dynamo.exists_message.assert_called_once_with(VALID_MESSAGE["message_id"])
+    waves = [
+        [message_id for message_id, _ in call.args[0]]
+        for call in mock_dynamo.save_messages.call_args_list
+    ]
+    assert waves == [["a1", "b1"], ["b2"]]
     mock_log.assert_any_call(
-        VALID_MESSAGE["message_id"], "message_skipped", "duplicate"
-    )
-    mock_metric.assert_called_with("DuplicateMessages", 1)
-    mock_sqs.delete_message.assert_not_called()
+        "a2", "message_deferred", "info", {"reason": "message_group_failed"})
+    assert result == {
+        "batchItemFailures": [{"itemIdentifier": "1"}, {"itemIdentifier": "3"}]
+    }
 
 
 @patch("controllers.messages.put_metric")
 @patch("controllers.messages.log_message")
-@patch("controllers.messages.sqs_service")
-@patch("controllers.messages.dynamodb_service")
-def test_message_saved_successfully(mock_dynamo, mock_sqs, mock_log, mock_metric):
-    mock_dynamo.exists_message.return_value = (False, None)
-    mock_dynamo.save_message.return_value = (True, None)
-    mock_sqs.queue_url = None
-    mock_sqs.get_queue_url.return_value = "queue_url"
+@patch("controllers.messages.idempotency_store")
+def test_fifo_failure_fails_rest_of_message_group(mock_dynamo, mock_log, mock_metric):
+    mock_dynamo.exists_messages.return_value = (set(), set())
+    mock_dynamo.save_message.side_effect = lambda message_id, *_, **__: (
+        (False, "DynamoDB error") if message_id == "a2" else (True, None))
 
-    body = json.dumps(VALID_MESSAGE)
     event = {
         "Records": [
-            {
-                "messageId": "1",
-                "receiptHandle": "r1",
-                "body": body,
-                "eventSourceARN": "arn:aws:sqs:::queue",
-            }
+            make_record("1", message_body("a1"), group_id="A"),
+            make_record("2", message_body("a2"), group_id="A"),
+            make_record("3", message_body("b1"), group_id="B"),
+            make_record("4", message_body("a3"), group_id="A"),
+            make_record("5", INVALID_JSON, group_id="C"),
+            make_record("6", message_body("c2"), group_id="C"),
         ]
     }
 
-    message_handler(event)
+    result = message_handler(event)
 
-    mock_dynamo.exists_message.assert_called_once_with(VALID_MESSAGE["message_id"])
-    mock_dynamo.save_message.assert_called_once_with(
-        VALID_MESSAGE["message_id"], VALID_MESSAGE
-    )
-    mock_sqs.get_queue_url.assert_called_once_with(
-        "queue", VALID_MESSAGE["message_id"]
-    )
-    mock_sqs.delete_message.assert_called_once_with(
-        "r1", VALID_MESSAGE["message_id"]
-    )
+    assert result == {
+        "batchItemFailures": [
+            {"itemIdentifier": "2"},
+            {"itemIdentifier": "4"},
+            {"itemIdentifier": "5"},
+            {"itemIdentifier": "6"},
+        ]
+    }
+    mock_metric.assert_called_with("BatchItemFailures", 4)
 
 
+@patch("controllers.messages.Config.MAX_WORKERS", 1)
+@patch("controllers.messages.Config.BULK_SAVE", False)
+@patch("controllers.messages.Config.DEDUP_MODE", "read_first")
 @patch("controllers.messages.put_metric")
 @patch("controllers.messages.log_message")
-@patch("controllers.messages.sqs_service")
-@patch("controllers.messages.dynamodb_service")
-def test_message_save_failure(mock_dynamo, mock_sqs, mock_log, mock_metric):
-    mock_dynamo.exists_message.return_value = (False, None)
-    mock_dynamo.save_message.return_value = (False, "DynamoDB error")
+@patch("controllers.messages.idempotency_store")
+def test_fifo_failure_holds_rest_of_message_group_unsaved(mock_dynamo, mock_log, mock_metric):
+    mock_dynamo.exists_messages.return_value = (set(), set())
+    mock_dynamo.save_message.side_effect = lambda message_id, *_, **__: (
+        (False, "DynamoDB error") if message_id == "a" else (True, None))
 
-    body = json.dumps(VALID_MESSAGE)
     event = {
         "Records": [
-            {
-                "messageId": "1",
-                "receiptHandle": "r1",
-                "body": body,
-                "eventSourceARN": "arn:aws:sqs:::queue",
-            }
+            make_record("1", message_body("a"), group_id="g"),
+            make_record("2", message_body("b"), group_id="g"),
+            make_record("3", INVALID_JSON, group_id="h"),
+            make_record("4", message_body("c"), group_id="h"),
+            make_record("5", message_body("d"), group_id="i"),
         ]
     }
 
+    result = message_handler(event)
+
+    mock_dynamo.exists_messages.assert_called_once_with(["a", "b", "d"])
+    assert [c[0][0] for c in mock_dynamo.save_message.call_args_list] == [
+        "a", "d"]
+    mock_log.assert_any_call(
+        "b", "message_deferred", "info", {"reason": "message_group_failed"})
+    mock_log.assert_any_call(
+        "c", "message_deferred", "info", {"reason": "message_group_failed"})
+    assert result == {"batchItemFailures": [
+        {"itemIdentifier": "1"}, {"itemIdentifier": "2"},
+        {"itemIdentifier": "3"}, {"itemIdentifier": "4"}]}
+
+
+def test_acknowledge_records_deletes_only_successes():
+    from unittest.mock import MagicMock
+    from controllers.messages import acknowledge_records
+
+    sqs_service = MagicMock()
+    sqs_service.resolve_queue_url.return_value = "https://queue-url"
+    sqs_service.delete_messages.return_value = set()
+    sqs_service.flush_deletes.return_value = {"3"}
+    records = [make_record(str(i), message_body(str(i))) for i in range(1, 4)]
+
+    not_deleted = acknowledge_records(
+        records, {"batchItemFailures": [{"itemIdentifier": "2"}]}, sqs_service)
+
+    assert not_deleted == {"3"}
+    assert sqs_service.delete_messages.call_args_list == [
+        (([("r1", "1")], "https://queue-url"),),
+        (([("r3", "3")], "https://queue-url"),),
+    ]
+    sqs_service.resolve_queue_url.assert_called_with(
+        "queue", "3", "arn:aws:sqs:::queue")
+
+
+@patch("controllers.messages.end_summary")
+@patch("controllers.messages.put_metric")
+@patch("controllers.messages.log_message")
+@patch("controllers.messages.idempotency_store")
+def test_invocation_summary_emitted(mock_dynamo, mock_log, mock_metric, mock_end):
+    event = {"Records": [make_record("1", INVALID_JSON)]}
+
     message_handler(event)
 
-    mock_dynamo.save_message.assert_called_once_with(
-        VALID_MESSAGE["message_id"], VALID_MESSAGE
-    )
-    mock_sqs.delete_message.assert_not_called()
+    mock_end.assert_called_once_with(details={
+        "records": 1, "batch_item_failures": ["1"]})
+
+
+@patch("controllers.messages._executor", None)
+@patch("controllers.messages.Config.MAX_WORKERS", 4)
+@patch("controllers.messages.put_metric")
+@patch("controllers.messages.log_message")
+@patch("controllers.messages.idempotency_store")
+def test_concurrent_groups_keep_order_within_group(mock_dynamo, mock_log, mock_metric):
+    import threading
+
+    mock_dynamo.exists_messages.return_value = (set(), set())
+    barrier = threading.Barrier(2, timeout=5)
+    calls = []
+    lock = threading.Lock()
+
+    def save_message(message_id, data, converted):
+        if message_id in ("a1", "b1"):
+            barrier.wait()
+        with lock:
+            calls.append(message_id)
+        if message_id == "a2":
+            return False, "DynamoDB error"
+        return True, None
+
+    mock_dynamo.save_message.side_effect = save_message
+
+    event = {
+        "Records": [
+            make_record("1", message_body("a1"), group_id="A"),
+            make_record("2", message_body("b1"), group_id="B"),
+            make_record("3", message_body("a2"), group_id="A"),
+            make_record("4", message_body("b2"), group_id="B"),
+            make_record("5", message_body("a3"), group_id="A"),
+        ]
+    }
+
+    result = message_handler(event)
+
+    assert [c for c in calls if c.startswith("a")] == ["a1", "a2"]
+    assert [c for c in calls if c.startswith("b")] == ["b1", "b2"]
+    assert result == {
+        "batchItemFailures": [{"itemIdentifier": "3"}, {"itemIdentifier": "5"}]
+    }
+    failure_logs = [
+        c for c in mock_log.call_args_list if c[0][1] == "message_save_failed"]
+    assert [c[0][0] for c in failure_logs] == ["a2"]
     mock_log.assert_any_call(
-        VALID_MESSAGE["message_id"],
-        "message_save_failed",
-        "error",
-        {"error": "DynamoDB error"},
-    )
+        "a3", "message_deferred", "info", {"reason": "message_group_failed"})
 
 
+@patch("controllers.messages.Config.MICRO_BATCH_SIZE", 2)
+@patch("controllers.messages.Config.DEDUP_MODE", "read_first")
 @patch("controllers.messages.put_metric")
 @patch("controllers.messages.log_message")
-@patch("controllers.messages.sqs_service")
-@patch("controllers.messages.dynamodb_service")
-def test_dynamodb_check_failure(mock_dynamo, mock_sqs, mock_log, mock_metric):
-    """Caso o exists_message retorne erro (err != None), deve logar e não prosseguir"""
-    mock_dynamo.exists_message.return_value = (False, "DynamoDB error")
+@patch("controllers.messages.idempotency_store")
+def test_records_stream_through_micro_batches(mock_dynamo, mock_log, mock_metric):
+    mock_dynamo.exists_messages.return_value = (set(), set())
+    mock_dynamo.save_message.side_effect = lambda message_id, *_, **__: (
+        (False, "DynamoDB error") if message_id == "a1" else (True, None))
 
-    body = json.dumps(VALID_MESSAGE)
     event = {
         "Records": [
-            {
-                "messageId": "1",
-                "receiptHandle": "r1",
-                "body": body,
-                "eventSourceARN": "arn:aws:sqs:::queue",
-            }
+            make_record("1", message_body("a1"), group_id="A"),
+            make_record("2", message_body("b1"), group_id="B"),
+            make_record("3", message_body("b1"), group_id="B"),
+            make_record("4", message_body("a2"), group_id="A"),
+            make_record("5", message_body("c1")),
         ]
     }
 
-    message_handler(event)
+    result = message_handler(event)
 
+    assert [c[0][0] for c in mock_dynamo.exists_messages.call_args_list] == [
+        ["a1", "b1"], ["b1"], ["c1"]]
+    assert [c[0][0] for c in mock_dynamo.save_message.call_args_list] == [
+        "a1", "b1", "c1"]
+    mock_log.assert_any_call("b1", "message_skipped", "duplicate")
     mock_log.assert_any_call(
-        VALID_MESSAGE["message_id"],
-        "message_check_failed",
-        "error",
-        {"error": "DynamoDB error"},
-    )
+        "a2", "message_deferred", "info", {"reason": "message_group_failed"})
+    assert result == {
+        "batchItemFailures": [{"itemIdentifier": "1"}, {"itemIdentifier": "4"}]
+    }
+
+
+class FakeContext:
+    def __init__(self, remaining_ms):
+        self.remaining_ms = remaining_ms
+
+    def get_remaining_time_in_millis(self):
+        return self.remaining_ms
+
+
+@patch("controllers.messages.Config.DEADLINE_SAFETY_MARGIN_MS", 2000)
+@patch("controllers.messages.put_metric")
+@patch("controllers.messages.log_message")
+@patch("controllers.messages.idempotency_store")
+def test_deadline_already_reached_defers_every_record(mock_dynamo, mock_log, mock_metric):
+    event = {"Records": [
+        make_record("1", message_body("a")),
+        make_record("2", message_body("b")),
+    ]}
+
+    result = message_handler(event, FakeContext(1500))
+
+    mock_dynamo.exists_messages.assert_not_called()
+    mock_dynamo.save_message.assert_not_called()
+    mock_log.assert_any_call("a", "message_deferred", "info", {"reason": "deadline"})
+    mock_metric.assert_any_call("DeadlineDeferredMessages", 2)
+    assert result == {"batchItemFailures": [
+        {"itemIdentifier": "1"}, {"itemIdentifier": "2"}]}
+
+
+@patch("controllers.messages.Config.DEADLINE_SAFETY_MARGIN_MS", 2000)
+@patch("controllers.messages.Config.MAX_WORKERS", 1)
+@patch("controllers.messages.Config.BULK_SAVE", False)
+@patch("controllers.messages.Config.DEDUP_MODE", "read_first")
+@patch("controllers.messages.put_metric")
+@patch("controllers.messages.log_message")
+@patch("controllers.messages.idempotency_store")
+def test_deadline_reached_mid_batch_defers_unstarted_records(mock_dynamo, mock_log, mock_metric):
+    clock = [100.0]
+
+    def slow_save(message_id, message, converted=False):
+        clock[0] += 10
+        return True, None
+
+    mock_dynamo.exists_messages.return_value = (set(), set())
+    mock_dynamo.save_message.side_effect = slow_save
+    event = {"Records": [
+        make_record("1", message_body("a")),
+        make_record("2", message_body("b")),
+        make_record("3", message_body("c")),
+    ]}
+
+    with patch("utils.deadline.time.monotonic", side_effect=lambda: clock[0]):
+        result = message_handler(event, FakeContext(7000))
+
+    assert mock_dynamo.save_message.call_count == 1
+    mock_metric.assert_any_call("DeadlineDeferredMessages", 2)
+    assert result == {"batchItemFailures": [
+        {"itemIdentifier": "2"}, {"itemIdentifier": "3"}]}
+
+
+@patch("controllers.messages.Config.DEDUP_MODE", "read_first")
+@patch("controllers.messages.put_metric")
+@patch("controllers.messages.log_message")
+@patch("controllers.messages.idempotency_store")
+def test_missing_message_id_is_invalid(mock_dynamo, mock_log, mock_metric):
+    mock_dynamo.exists_messages.return_value = (set(), set())
+    event = {"Records": [make_record("1", json.dumps({"payload": {}}))]}
+
+    result = message_handler(event)
+
+    mock_log.assert_any_call("1", "message_validate", "error", {"error": "missing message_id"})
+    mock_metric.assert_any_call("InvalidMessages", 1)
     mock_dynamo.save_message.assert_not_called()
-    mock_sqs.delete_message.assert_not_called()
+    assert result == {"batchItemFailures": [{"itemIdentifier": "1"}]}
+
+
+@patch("controllers.messages.Config.QUARANTINE_QUEUE_URL", "https://sqs/quarantine.fifo")
+@patch("controllers.messages.Config.QUARANTINE_MAX_RECEIVE_COUNT", 3)
+@patch("controllers.messages.Config.DEDUP_MODE", "read_first")
+@patch("controllers.messages.put_metric")
+@patch("controllers.messages.log_message")
+@patch("controllers.messages.sqs_service")
+@patch("controllers.messages.idempotency_store")
+def test_poison_records_are_quarantined(mock_dynamo, mock_sqs, mock_log, mock_metric):
+    mock_dynamo.exists_messages.return_value = (set(), set())
+    mock_dynamo.save_message.return_value = (True, None)
+    mock_sqs.send_messages.return_value = set()
+    retried = make_record("3", message_body("c"), group_id="g1")
+    retried["attributes"]["ApproximateReceiveCount"] = "4"
+    event = {"Records": [
+        make_record("1", INVALID_JSON, group_id="g1"),
+        make_record("2", message_body("b"), group_id="g1"),
+        retried,
+    ]}
+
+    result = message_handler(event)
+
+    queue_url, entries = mock_sqs.send_messages.call_args.args
+    assert queue_url == "https://sqs/quarantine.fifo"
+    assert [trace_id for _, trace_id in entries] == ["1", "3"]
+    entry = entries[0][0]
+    assert entry["MessageBody"] == INVALID_JSON
+    assert entry["MessageGroupId"] == "g1"
+    assert entry["MessageDeduplicationId"] == "1"
+    assert entry["MessageAttributes"]["quarantine_reason"] == {
+        "DataType": "String", "StringValue": "parse_error"}
+    assert entries[1][0]["MessageAttributes"]["quarantine_reason"]["StringValue"] == \
+        "max_receive_count"
+    mock_dynamo.save_message.assert_called_once()
+    mock_metric.assert_any_call("QuarantinedMessages", 2)
+    assert result == {"batchItemFailures": []}
+
+
+@patch("controllers.messages.Config.QUARANTINE_QUEUE_URL", "https://sqs/quarantine")
+@patch("controllers.messages.put_metric")
+@patch("controllers.messages.log_message")
+@patch("controllers.messages.sqs_service")
+@patch("controllers.messages.idempotency_store")
+def test_unsent_quarantine_records_fail(mock_dynamo, mock_sqs, mock_log, mock_metric):
+    mock_sqs.send_messages.return_value = {"1"}
+    event = {"Records": [make_record("1", INVALID_JSON)]}
+
+    result = message_handler(event)
+
+    entry = mock_sqs.send_messages.call_args.args[1][0][0]
+    assert "MessageGroupId" not in entry
+    assert result == {"batchItemFailures": [{"itemIdentifier": "1"}]}
+
+
+@patch("controllers.messages.Config.MICRO_BATCH_SIZE", 1)
+@patch("controllers.messages.Config.DEADLINE_SAFETY_MARGIN_MS", 2000)
+@patch("controllers.messages.Config.DEDUP_MODE", "read_first")
+@patch("controllers.messages.put_metric")
+@patch("controllers.messages.log_message")
+@patch("controllers.messages.idempotency_store")
+def test_deadline_defers_later_micro_batches_before_dedup(mock_dynamo, mock_log, mock_metric):
+    clock = [100.0]
+
+    def slow_save(message_id, message, converted=False):
+        clock[0] += 10
+        return True, None
+
+    mock_dynamo.exists_messages.return_value = (set(), set())
+    mock_dynamo.save_message.side_effect = slow_save
+    event = {"Records": [
+        make_record("1", message_body("a")),
+        make_record("2", message_body("b")),
+    ]}
+
+    with patch("utils.deadline.time.monotonic", side_effect=lambda: clock[0]):
+        result = message_handler(event, FakeContext(7000))
+
+    mock_dynamo.exists_messages.assert_called_once_with(["a"])
+    mock_log.assert_any_call("b", "message_deferred", "info", {"reason": "deadline"})
+    assert result == {"batchItemFailures": [{"itemIdentifier": "2"}]}
@@ -0,0 +1,290 @@
+import itertools
+import json
+import threading
+import time
+import unittest
+from unittest.mock import patch, MagicMock
+from daemon import Consumer, VisibilityKeeper, main, to_record
+from services.sqs import SQSService
+
+QUEUE_URL = "http://localhost:9324/000000000000/main_queue.fifo"
+QUARANTINE_URL = "http://localhost:9324/000000000000/quarantine_queue.fifo"
+
+
+class FakeSQS:
+    """In-memory stand-in for the SQS API used by the consumer."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.messages = {}
+        self.receipts = {}
+        self.ids = itertools.count(1)
+        self.receive_calls = 0
+        self.delete_calls = 0
+        self.visibility_calls = []
+        self.sent = {}
+
+    def send(self, body, group_id=None):
+        message_id = str(next(self.ids))
+        attributes = {"ApproximateReceiveCount": "0"}
+        if group_id is not None:
+            attributes["MessageGroupId"] = group_id
+        with self.lock:
+            self.messages[message_id] = {
+                "body": body, "visible_at": 0, "attributes": attributes}
+        return message_id
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages, WaitTimeSeconds,
+                        AttributeNames, MessageAttributeNames,
+                        VisibilityTimeout=30):
+        now = time.monotonic()
+        result = []
+        with self.lock:
+            self.receive_calls += 1
+            for message_id, message in self.messages.items():
+                if len(result) == MaxNumberOfMessages:
+                    break
+                if message["visible_at"] > now:
+                    continue
+                message["visible_at"] = now + VisibilityTimeout
+                count = int(message["attributes"]["ApproximateReceiveCount"]) + 1
+                message["attributes"]["ApproximateReceiveCount"] = str(count)
+                receipt = f"{message_id}-{count}"
+                self.receipts[receipt] = message_id
+                result.append({
+                    "MessageId": message_id,
+                    "ReceiptHandle": receipt,
+                    "Body": message["body"],
+                    "Attributes": dict(message["attributes"]),
+                })
+        return {"Messages": result} if result else {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        if QueueUrl != QUEUE_URL:
+            raise Exception(f"NonExistentQueue: {QueueUrl}")
+        failed = []
+        with self.lock:
+            self.delete_calls += 1
+            for entry in Entries:
+                message_id = self.receipts.pop(entry["ReceiptHandle"], None)
+                if message_id is None or self.messages.pop(message_id, None) is None:
+                    failed.append({
+                        "Id": entry["Id"], "SenderFault": True,
+                        "Code": "ReceiptHandleIsInvalid"})
+        return {"Successful": [], "Failed": failed}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        with self.lock:
+            self.sent.setdefault(QueueUrl, []).extend(Entries)
+        return {"Successful": [{"Id": e["Id"]} for e in Entries], "Failed": []}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        if QueueUrl != QUEUE_URL:
+            raise Exception(f"NonExistentQueue: {QueueUrl}")
+        with self.lock:
+            for entry in Entries:
+                self.visibility_calls.append(entry["ReceiptHandle"])
+                message_id = self.receipts.get(entry["ReceiptHandle"])
+                if message_id in self.messages:
+                    self.messages[message_id]["visible_at"] = \
+                        time.monotonic() + entry["VisibilityTimeout"]
+        return {"Successful": [], "Failed": []}
+
+
+def make_service(fake):
+    with patch("services.sqs.get_client", return_value=fake):
+        service = SQSService(queue_url=QUEUE_URL)
+        service.sqs
+    return service
+
+
+def run_until(consumer, condition, timeout=5):
+    thread = threading.Thread(target=consumer.run)
+    thread.start()
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    consumer.stop()
+    thread.join(timeout)
+    assert not thread.is_alive()
+
+
+class TestConsumer(unittest.TestCase):
+
+    @patch("daemon.flush_metrics")
+    @patch("controllers.messages.put_metric")
+    @patch("controllers.messages.idempotency_store")
+    def test_consumes_and_deletes_end_to_end(self, mock_dynamo, mock_metric, mock_flush):
+        fake = FakeSQS()
+        for i in range(25):
+            fake.send(json.dumps({"message_id": f"m{i}", "payload": {}}), "g")
+        mock_dynamo.exists_messages.return_value = (set(), set())
+        mock_dynamo.save_message.return_value = (True, None)
+
+        consumer = Consumer(QUEUE_URL, make_service(fake), wait_time=0)
+        run_until(consumer, lambda: not fake.messages)
+
+        self.assertEqual(fake.messages, {})
+        self.assertEqual(consumer.processed, 25)
+        self.assertEqual(mock_dynamo.save_message.call_count, 25)
+        self.assertLessEqual(fake.delete_calls, 3)
+        mock_flush.assert_called()
+
+    @patch("controllers.messages.Config.QUARANTINE_QUEUE_URL", QUARANTINE_URL)
+    @patch("daemon.flush_metrics")
+    @patch("controllers.messages.idempotency_store")
+    def test_poison_messages_are_quarantined_and_deleted(self, mock_dynamo, mock_flush):
+        fake = FakeSQS()
+        fake.send("not json", "g")
+        fake.send(json.dumps({"message_id": "ok", "payload": {}}), "g")
+        mock_dynamo.exists_messages.return_value = (set(), set())
+        mock_dynamo.save_message.return_value = (True, None)
+        service = make_service(fake)
+
+        with patch("controllers.messages.sqs_service", service):
+            consumer = Consumer(QUEUE_URL, service, wait_time=0)
+            run_until(consumer, lambda: not fake.messages)
+
+        self.assertEqual(fake.messages, {})
+        quarantined = fake.sent[QUARANTINE_URL]
+        self.assertEqual([entry["MessageBody"] for entry in quarantined], ["not json"])
+        self.assertEqual(
+            quarantined[0]["MessageAttributes"]["quarantine_reason"]["StringValue"],
+            "parse_error")
+        mock_dynamo.save_message.assert_called_once()
+
+    @patch("daemon.flush_metrics")
+    def test_failed_records_are_not_deleted(self, mock_flush):
+        fake = FakeSQS()
+        ok = fake.send("ok")
+        failed = fake.send("fail")
+
+        def handler(event):
+            return {"batchItemFailures": [
+                {"itemIdentifier": record["messageId"]}
+                for record in event["Records"] if record["body"] == "fail"]}
+
+        consumer = Consumer(QUEUE_URL, make_service(fake), handler=handler,
+                            wait_time=0)
+        run_until(consumer, lambda: ok not in fake.messages)
+
+        self.assertNotIn(ok, fake.messages)
+        self.assertIn(failed, fake.messages)
+
+    @patch("daemon.flush_metrics")
+    def test_prefetch_overlaps_receive_with_processing(self, mock_flush):
+        fake = FakeSQS()
+        for i in range(30):
+            fake.send(str(i))
+        receives_during_first_batch = []
+
+        def handler(event):
+            if not receives_during_first_batch:
+                time.sleep(0.2)
+                receives_during_first_batch.append(fake.receive_calls)
+            return {"batchItemFailures": []}
+
+        consumer = Consumer(QUEUE_URL, make_service(fake), handler=handler,
+                            prefetch=2, wait_time=0)
+        run_until(consumer, lambda: not fake.messages)
+
+        self.assertGreaterEqual(receives_during_first_batch[0], 3)
+        self.assertEqual(consumer.processed, 30)
+
+    @patch("daemon.flush_metrics")
+    def test_slow_messages_get_visibility_extended(self, mock_flush):
+        fake = FakeSQS()
+        message_id = fake.send("slow")
+        done = threading.Event()
+
+        def handler(event):
+            time.sleep(0.6)
+            done.set()
+            return {"batchItemFailures": []}
+
+        consumer = Consumer(QUEUE_URL, make_service(fake), handler=handler,
+                            visibility_timeout=0.2, wait_time=0)
+        run_until(consumer, done.is_set)
+
+        self.assertIn(f"{message_id}-1", fake.visibility_calls)
+        self.assertNotIn(message_id, fake.messages)
+
+    @patch("daemon.flush_metrics")
+    def test_stop_drains_buffered_batches(self, mock_flush):
+        fake = FakeSQS()
+        for i in range(20):
+            fake.send(str(i))
+        started = threading.Event()
+        consumer = None
+
+        def handler(event):
+            if not started.is_set():
+                started.set()
+                consumer.stop()
+                time.sleep(0.1)
+            return {"batchItemFailures": []}
+
+        consumer = Consumer(QUEUE_URL, make_service(fake), handler=handler,
+                            prefetch=1, wait_time=0)
+        consumer.run()
+
+        self.assertTrue(started.is_set())
+        self.assertEqual(consumer.processed, 20 - len(fake.messages))
+        self.assertEqual(len(fake.receipts), 0)
+
+    def test_handler_exception_keeps_consumer_running(self):
+        fake = FakeSQS()
+        fake.send("boom")
+        fake.send("boom")
+        handler = MagicMock(side_effect=Exception("fail"))
+
+        with patch("daemon.flush_metrics"), patch("daemon.put_metric") as mock_metric:
+            consumer = Consumer(QUEUE_URL, make_service(fake), handler=handler,
+                                wait_time=0, visibility_timeout=30)
+            run_until(consumer, lambda: handler.call_count >= 1)
+
+        mock_metric.assert_any_call("ConsumerBatchError", 1)
+        self.assertEqual(len(fake.messages), 2)
+
+
+class TestHelpers(unittest.TestCase):
+
+    def test_to_record(self):
+        message = {
+            "MessageId": "1", "ReceiptHandle": "r1", "Body": "{}",
+            "Attributes": {"MessageGroupId": "g"},
+        }
+        record = to_record(message, "arn:aws:sqs:us-east-1:1:q")
+        self.assertEqual(record, {
+            "messageId": "1",
+            "receiptHandle": "r1",
+            "body": "{}",
+            "attributes": {"MessageGroupId": "g"},
+            "messageAttributes": {},
+            "eventSourceARN": "arn:aws:sqs:us-east-1:1:q",
+        })
+
+    @patch("daemon.put_metric")
+    def test_visibility_keeper_extends_only_due_messages(self, mock_metric):
+        sqs_service = MagicMock()
+        sqs_service.change_visibility.return_value = set()
+        keeper = VisibilityKeeper(sqs_service, QUEUE_URL, 30)
+        keeper.track([{"messageId": "1", "receiptHandle": "r1"}])
+
+        keeper.extend_due()
+        sqs_service.change_visibility.assert_not_called()
+
+        with patch("daemon.time.monotonic", return_value=time.monotonic() + 20):
+            keeper.extend_due()
+        sqs_service.change_visibility.assert_called_once_with(
+            QUEUE_URL, [("r1", "1")], 30)
+
+        keeper.release([{"messageId": "1", "receiptHandle": "r1"}])
+        with patch("daemon.time.monotonic", return_value=time.monotonic() + 100):
+            keeper.extend_due()
+        sqs_service.change_visibility.assert_called_once()
+
+    def test_main_requires_queue_url(self):
+        with patch("daemon.Config.QUEUE_URL", None):
+            with self.assertRaises(SystemExit):
+                main([])
@@ -1,9 +1,14 @@
 import json
+import os
 import runpy
+import subprocess
+import sys
 import unittest
 from unittest.mock import patch, MagicMock
 from main import handler
 
+IMPORT_BUDGET_SECONDS = 0.25
+
 VALID_EVENT = {
     "Records": [
         {
@@ -17,25 +22,59 @@ VALID_EVENT = {
 
 class TestHandler(unittest.TestCase):
 
+    @patch("main.flush_metrics")
     @patch("main.message_handler")
-    def test_handler_calls_message_handler(self, mock_message_handler):
+    def test_handler_calls_message_handler(self, mock_message_handler, mock_flush):
         context = MagicMock()
         handler(VALID_EVENT, context)
-        mock_message_handler.assert_called_once_with(VALID_EVENT)
+        mock_message_handler.assert_called_once_with(VALID_EVENT, context)
 
+    @patch("main.flush_metrics")
     @patch("main.message_handler")
-    def test_handler_multiple_calls(self, mock_message_handler):
+    def test_handler_multiple_calls(self, mock_message_handler, mock_flush):
         context = MagicMock()
         events = [VALID_EVENT, VALID_EVENT]
         for event in events:
             handler(event, context)
         self.assertEqual(mock_message_handler.call_count, 2)
-        mock_message_handler.assert_any_call(VALID_EVENT)
+        mock_message_handler.assert_any_call(VALID_EVENT, context)
 
+    @patch("main.flush_metrics")
     @patch("main.message_handler")
-    def test_handler_exception_propagation(self, mock_message_handler):
+    def test_handler_exception_propagation(self, mock_message_handler, mock_flush):
         context = MagicMock()
         mock_message_handler.side_effect = Exception("Handler error")
         with self.assertRaises(Exception) as cm:
             handler(VALID_EVENT, context)
         self.assertEqual(str(cm.exception), "Handler error")
+        mock_flush.assert_called_once()
+
+    @patch("main.flush_metrics")
+    @patch("main.message_handler")
+    def test_handler_flushes_metrics(self, mock_message_handler, mock_flush):
+        mock_message_handler.return_value = {"batchItemFailures": []}
+        result = handler(VALID_EVENT, MagicMock())
+        self.assertEqual(result, {"batchItemFailures": []})
+        mock_flush.assert_called_once()
+
+
+class TestColdStart(unittest.TestCase):
+
+    def test_import_does_not_load_aws_sdk(self):
+        app_dir = os.path.join(os.path.dirname(__file__), "..", "app")
+        code = (
+            "import json, sys, time\n"
+            "started = time.perf_counter()\n"
+            "import main\n"
+            "elapsed = time.perf_counter() - started\n"
+            "print(json.dumps({'elapsed': elapsed, 'loaded': sorted(\n"
+            "    m for m in ('boto3', 'botocore') if m in sys.modules)}))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=app_dir, capture_output=True, text=True, check=True,
+            env=dict(os.environ, PYTHONPATH=app_dir))
+        report = json.loads(result.stdout)
+
+        self.assertEqual(report["loaded"], [])
+        self.assertLess(report["elapsed"], IMPORT_BUDGET_SECONDS)
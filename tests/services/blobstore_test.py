@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+from services.blobstore import FileBlobStore, S3BlobStore, create_blob_store
+
+
+class TestBlobStore(unittest.TestCase):
+
+    def test_file_blob_store_round_trip(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = FileBlobStore(root)
+            url = store.put("payloads/a.json.zz", b"data")
+
+            self.assertEqual(url, f"file://{root}/payloads/a.json.zz")
+            self.assertEqual(store.get(url), b"data")
+            self.assertEqual(os.listdir(os.path.join(root, "payloads")), ["a.json.zz"])
+
+    def test_file_blob_store_rejects_keys_outside_root(self):
+        with tempfile.TemporaryDirectory() as root:
+            store = FileBlobStore(os.path.join(root, "blobs"))
+            with self.assertRaises(ValueError):
+                store.put("payloads/../../x.json.zz", b"data")
+            self.assertFalse(os.path.exists(os.path.join(root, "x.json.zz")))
+
+    @patch("services.blobstore.get_client")
+    def test_s3_blob_store(self, mock_get_client):
+        mock_s3 = mock_get_client.return_value
+        mock_s3.get_object.return_value = {"Body": MagicMock(read=MagicMock(return_value=b"data"))}
+        store = create_blob_store("s3://bucket/worker")
+
+        url = store.put("payloads/a.json.zz", b"data")
+
+        self.assertIsInstance(store, S3BlobStore)
+        self.assertEqual(url, "s3://bucket/worker/payloads/a.json.zz")
+        mock_s3.put_object.assert_called_once_with(
+            Bucket="bucket", Key="worker/payloads/a.json.zz", Body=b"data")
+        self.assertEqual(store.get(url), b"data")
+        mock_s3.get_object.assert_called_once_with(
+            Bucket="bucket", Key="worker/payloads/a.json.zz")
+        mock_get_client.assert_called_once_with("s3")
+
+    def test_create_blob_store(self):
+        self.assertIsNone(create_blob_store(None))
+        self.assertIsInstance(create_blob_store("/tmp/blobs"), FileBlobStore)
+        self.assertEqual(create_blob_store("file:///tmp/blobs").root, "/tmp/blobs")
+        self.assertEqual(create_blob_store("s3://bucket").prefix, "")
+        with self.assertRaises(ValueError):
+            create_blob_store("ftp://host/blobs")
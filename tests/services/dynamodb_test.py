@@ -1,6 +1,10 @@
 import unittest
+from decimal import Decimal
 from unittest.mock import patch, MagicMock
 from services.dynamodb import DynamoDBService
+from utils.convert import convert_floats_to_decimal
+from utils.deadline import Deadline
+from utils.ratelimit import TokenBucket
 
 VALID_MESSAGE = {
     "message_id": "123e4567-e89b-12d3-a456-426614174000",
@@ -17,32 +21,35 @@ VALID_MESSAGE = {
         "description": "Donation to project X",
     },
 }
+DECIMAL_PAYLOAD = convert_floats_to_decimal(VALID_MESSAGE["payload"])
 
 
 class TestDynamoDBService(unittest.TestCase):
     @patch("services.dynamodb.put_metric")
     @patch("services.dynamodb.log_message")
-    @patch("services.dynamodb.boto3.resource")
-    def test_exists_message_success_true(self, mock_boto, mock_log, mock_metric):
-        mock_table = MagicMock()
-        mock_table.get_item.return_value = {"Item": VALID_MESSAGE}
-        mock_boto.return_value.Table.return_value = mock_table
+    @patch("services.dynamodb.get_client")
+    def test_exists_message_success_true(self, mock_get_client, mock_log, mock_metric):
+        mock_client = mock_get_client.return_value
+        mock_client.get_item.return_value = {"Item": VALID_MESSAGE}
 
         service = DynamoDBService()
         result, err = service.exists_message("123")
 
         self.assertTrue(result)
         self.assertIsNone(err)
+        mock_client.get_item.assert_called_once_with(
+            TableName=service.table_name,
+            Key={"message_id": {"S": "123"}},
+            ProjectionExpression="message_id")
         mock_log.assert_called_with("123", "dynamodb_check", "success", {"exists": True})
         mock_metric.assert_not_called()
 
     @patch("services.dynamodb.put_metric")
     @patch("services.dynamodb.log_message")
-    @patch("services.dynamodb.boto3.resource")
-    def test_exists_message_success_false(self, mock_boto, mock_log, mock_metric):
-        mock_table = MagicMock()
-        mock_table.get_item.return_value = {}
-        mock_boto.return_value.Table.return_value = mock_table
+    @patch("services.dynamodb.get_client")
+    def test_exists_message_success_false(self, mock_get_client, mock_log, mock_metric):
+        mock_client = mock_get_client.return_value
+        mock_client.get_item.return_value = {}
 
         service = DynamoDBService()
         result, err = service.exists_message("123")
@@ -54,11 +61,10 @@ class TestDynamoDBService(unittest.TestCase):
 
     @patch("services.dynamodb.put_metric")
     @patch("services.dynamodb.log_message")
-    @patch("services.dynamodb.boto3.resource")
-    def test_exists_message_exception(self, mock_boto, mock_log, mock_metric):
-        mock_table = MagicMock()
-        mock_table.get_item.side_effect = Exception("fail")
-        mock_boto.return_value.Table.return_value = mock_table
+    @patch("services.dynamodb.get_client")
+    def test_exists_message_exception(self, mock_get_client, mock_log, mock_metric):
+        mock_client = mock_get_client.return_value
+        mock_client.get_item.side_effect = Exception("fail")
 
         service = DynamoDBService()
         result, err = service.exists_message("123")
@@ -70,31 +76,29 @@ class TestDynamoDBService(unittest.TestCase):
 
     @patch("services.dynamodb.put_metric")
     @patch("services.dynamodb.log_message")
-    @patch("services.dynamodb.convert_floats_to_decimal")
-    @patch("services.dynamodb.boto3.resource")
-    def test_save_message_success(self, mock_boto, mock_convert, mock_log, mock_metric):
-        mock_table = MagicMock()
-        mock_boto.return_value.Table.return_value = mock_table
-        mock_convert.return_value = VALID_MESSAGE["payload"]
+    @patch("services.idempotency.convert_floats_to_decimal")
+    @patch("services.dynamodb.get_client")
+    def test_save_message_success(self, mock_get_client, mock_convert, mock_log, mock_metric):
+        mock_client = mock_get_client.return_value
+        mock_convert.return_value = DECIMAL_PAYLOAD
 
         service = DynamoDBService()
         result, err = service.save_message("123", VALID_MESSAGE)
 
         self.assertTrue(result)
         self.assertIsNone(err)
-        mock_table.put_item.assert_called_once()
+        mock_client.put_item.assert_called_once()
         mock_log.assert_called_with("123", "dynamodb_save", "success")
         mock_metric.assert_called_with("MessagesSaved", 1)
 
     @patch("services.dynamodb.put_metric")
     @patch("services.dynamodb.log_message")
-    @patch("services.dynamodb.convert_floats_to_decimal")
-    @patch("services.dynamodb.boto3.resource")
-    def test_save_message_failure_exception(self, mock_boto, mock_convert, mock_log, mock_metric):
-        mock_table = MagicMock()
-        mock_table.put_item.side_effect = Exception("fail")
-        mock_boto.return_value.Table.return_value = mock_table
-        mock_convert.return_value = VALID_MESSAGE["payload"]
+    @patch("services.idempotency.convert_floats_to_decimal")
+    @patch("services.dynamodb.get_client")
+    def test_save_message_failure_exception(self, mock_get_client, mock_convert, mock_log, mock_metric):
+        mock_client = mock_get_client.return_value
+        mock_client.put_item.side_effect = Exception("fail")
+        mock_convert.return_value = DECIMAL_PAYLOAD
 
         service = DynamoDBService()
         result, err = service.save_message("123", VALID_MESSAGE)
@@ -106,18 +110,17 @@ class TestDynamoDBService(unittest.TestCase):
 
     @patch("services.dynamodb.put_metric")
     @patch("services.dynamodb.log_message")
-    @patch("services.dynamodb.convert_floats_to_decimal")
-    @patch("services.dynamodb.boto3.resource")
-    def test_save_message_failure_conditional_check(self, mock_boto, mock_convert, mock_log, mock_metric):
+    @patch("services.idempotency.convert_floats_to_decimal")
+    @patch("services.dynamodb.get_client")
+    def test_save_message_failure_conditional_check(self, mock_get_client, mock_convert, mock_log, mock_metric):
         from botocore.exceptions import ClientError
 
-        mock_table = MagicMock()
-        mock_table.put_item.side_effect = ClientError(
+        mock_client = mock_get_client.return_value
+        mock_client.put_item.side_effect = ClientError(
             {"Error": {"Code": "ConditionalCheckFailedException", "Message": "Item exists"}},
             "PutItem",
         )
-        mock_boto.return_value.Table.return_value = mock_table
-        mock_convert.return_value = VALID_MESSAGE["payload"]
+        mock_convert.return_value = DECIMAL_PAYLOAD
 
         service = DynamoDBService()
         result, err = service.save_message("123", VALID_MESSAGE)
@@ -126,3 +129,602 @@ class TestDynamoDBService(unittest.TestCase):
         self.assertEqual(err, "DynamoDB error")
         mock_log.assert_called_with("123", "dynamodb_save", "error", {"error": "An error occurred (ConditionalCheckFailedException) when calling the PutItem operation: Item exists"})
         mock_metric.assert_called_with("DynamoDBSaveError", 1)
+
+    @patch("services.dynamodb.time.sleep")
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_exists_messages_dedups_and_chunks(self, mock_get_client, mock_log, mock_metric, mock_sleep):
+        mock_client = mock_get_client.return_value
+        mock_client.batch_get_item.side_effect = [
+            {"Responses": {"messages_table": [{"message_id": {"S": "id-1"}}]}},
+            {"Responses": {"messages_table": []}},
+        ]
+
+        service = DynamoDBService()
+        service.table_name = "messages_table"
+        ids = [f"id-{i}" for i in range(150)] + ["id-1", "id-2"]
+        existing, failed = service.exists_messages(ids)
+
+        self.assertEqual(existing, {"id-1"})
+        self.assertEqual(failed, set())
+        self.assertEqual(mock_client.batch_get_item.call_count, 2)
+        first_keys = mock_client.batch_get_item.call_args_list[0].kwargs[
+            "RequestItems"]["messages_table"]["Keys"]
+        second_keys = mock_client.batch_get_item.call_args_list[1].kwargs[
+            "RequestItems"]["messages_table"]["Keys"]
+        self.assertEqual(len(first_keys), 100)
+        self.assertEqual(len(second_keys), 50)
+        mock_metric.assert_not_called()
+
+    @patch("services.dynamodb.time.sleep")
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_exists_messages_retries_unprocessed_keys(self, mock_get_client, mock_log, mock_metric, mock_sleep):
+        mock_client = mock_get_client.return_value
+        mock_client.batch_get_item.side_effect = [
+            {
+                "Responses": {"messages_table": [{"message_id": {"S": "a"}}]},
+                "UnprocessedKeys": {
+                    "messages_table": {"Keys": [{"message_id": {"S": "b"}}]}},
+            },
+            {"Responses": {"messages_table": [{"message_id": {"S": "b"}}]}},
+        ]
+
+        service = DynamoDBService()
+        service.table_name = "messages_table"
+        existing, failed = service.exists_messages(["a", "b", "c"])
+
+        self.assertEqual(existing, {"a", "b"})
+        self.assertEqual(failed, set())
+        retry_keys = mock_client.batch_get_item.call_args_list[1].kwargs[
+            "RequestItems"]["messages_table"]["Keys"]
+        self.assertEqual(retry_keys, [{"message_id": {"S": "b"}}])
+        mock_sleep.assert_called_once()
+
+    @patch("services.dynamodb.time.sleep")
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_exists_messages_failure(self, mock_get_client, mock_log, mock_metric, mock_sleep):
+        mock_get_client.return_value.batch_get_item.side_effect = Exception("fail")
+
+        service = DynamoDBService()
+        existing, failed = service.exists_messages(["a", "b", None])
+
+        self.assertEqual(existing, set())
+        self.assertEqual(failed, {"a", "b", None})
+        mock_log.assert_called_with("b", "dynamodb_check", "error", {"error": "fail"})
+        mock_metric.assert_called_with("DynamoDBCheckError", 1)
+
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_claim_message_saved(self, mock_get_client, mock_log, mock_metric):
+        mock_client = mock_get_client.return_value
+
+        service = DynamoDBService()
+        status, err = service.claim_message("123", VALID_MESSAGE)
+
+        self.assertEqual(status, "saved")
+        self.assertIsNone(err)
+        mock_client.get_item.assert_not_called()
+        mock_client.put_item.assert_called_once()
+        self.assertEqual(
+            mock_client.put_item.call_args.kwargs["ConditionExpression"],
+            "attribute_not_exists(message_id)")
+        mock_metric.assert_called_with("MessagesSaved", 1)
+
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_claim_message_conditional_check_is_duplicate(self, mock_get_client, mock_log, mock_metric):
+        from botocore.exceptions import ClientError
+
+        mock_client = mock_get_client.return_value
+        mock_client.put_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException", "Message": "Item exists"}},
+            "PutItem",
+        )
+
+        service = DynamoDBService()
+        status, err = service.claim_message("123", VALID_MESSAGE)
+
+        self.assertEqual(status, "duplicate")
+        self.assertIsNone(err)
+        mock_log.assert_called_with("123", "dynamodb_save", "duplicate")
+        mock_metric.assert_not_called()
+
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_claim_message_failure(self, mock_get_client, mock_log, mock_metric):
+        mock_client = mock_get_client.return_value
+        mock_client.put_item.side_effect = Exception("fail")
+
+        service = DynamoDBService()
+        status, err = service.claim_message("123", VALID_MESSAGE)
+
+        self.assertEqual(status, "failed")
+        self.assertEqual(err, "DynamoDB error")
+        mock_log.assert_called_with("123", "dynamodb_save", "error", {"error": "fail"})
+        mock_metric.assert_called_with("DynamoDBSaveError", 1)
+
+    @patch("services.dynamodb.time.sleep")
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_save_messages_transactional_chunks(self, mock_get_client, mock_log, mock_metric, mock_sleep):
+        mock_client = mock_get_client.return_value
+
+        service = DynamoDBService()
+        messages = [(f"id-{i}", VALID_MESSAGE) for i in range(150)]
+        outcomes = service.save_messages(messages, transactional=True)
+
+        self.assertEqual(set(outcomes.values()), {"saved"})
+        self.assertEqual(len(outcomes), 150)
+        self.assertEqual(mock_client.transact_write_items.call_count, 2)
+        first_items = mock_client.transact_write_items.call_args_list[0].kwargs["TransactItems"]
+        self.assertEqual(len(first_items), 100)
+        put = first_items[0]["Put"]
+        self.assertEqual(put["Item"]["message_id"], {"S": "id-0"})
+        self.assertEqual(put["Item"]["payload"]["M"]["amount"], {"N": "250.75"})
+        self.assertEqual(put["ConditionExpression"], "attribute_not_exists(message_id)")
+        mock_metric.assert_called_once_with("MessagesSaved", 150)
+
+    @patch("services.dynamodb.TRANSACT_WRITE_MAX_BYTES", 4000)
+    @patch("services.dynamodb.time.sleep")
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_save_messages_transactional_chunks_by_size(self, mock_get_client, mock_log, mock_metric, mock_sleep):
+        mock_client = mock_get_client.return_value
+        large = dict(VALID_MESSAGE, payload={"blob": "x" * 1500})
+        huge = dict(VALID_MESSAGE, payload={"blob": "x" * 5000})
+
+        service = DynamoDBService()
+        outcomes = service.save_messages(
+            [("a", large), ("b", large), ("c", huge), ("d", large)])
+
+        self.assertEqual(set(outcomes.values()), {"saved"})
+        chunks = [
+            [put["Put"]["Item"]["message_id"]["S"] for put in c.kwargs["TransactItems"]]
+            for c in mock_client.transact_write_items.call_args_list
+        ]
+        self.assertEqual(chunks, [["a", "b"], ["c"], ["d"]])
+
+    @patch("services.dynamodb.time.sleep")
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_save_messages_transactional_reports_duplicates(self, mock_get_client, mock_log, mock_metric, mock_sleep):
+        from botocore.exceptions import ClientError
+
+        mock_client = mock_get_client.return_value
+        cancelled = ClientError(
+            {
+                "Error": {"Code": "TransactionCanceledException", "Message": "cancelled"},
+                "CancellationReasons": [
+                    {"Code": "None"},
+                    {"Code": "ConditionalCheckFailed"},
+                    {"Code": "None"},
+                ],
+            },
+            "TransactWriteItems",
+        )
+        mock_client.transact_write_items.side_effect = [cancelled, {}]
+
+        service = DynamoDBService()
+        outcomes = service.save_messages(
+            [("a", VALID_MESSAGE), ("b", VALID_MESSAGE), ("c", VALID_MESSAGE)])
+
+        self.assertEqual(outcomes, {"a": "saved", "b": "duplicate", "c": "saved"})
+        retry_items = mock_client.transact_write_items.call_args_list[1].kwargs["TransactItems"]
+        self.assertEqual(
+            [item["Put"]["Item"]["message_id"]["S"] for item in retry_items], ["a", "c"])
+        mock_log.assert_any_call("b", "dynamodb_save", "duplicate")
+        mock_metric.assert_called_once_with("MessagesSaved", 2)
+
+    @patch("services.dynamodb.time.sleep")
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_save_messages_transactional_fails_non_retryable_reason(self, mock_get_client, mock_log, mock_metric, mock_sleep):
+        from botocore.exceptions import ClientError
+
+        mock_client = mock_get_client.return_value
+        cancelled = ClientError(
+            {
+                "Error": {"Code": "TransactionCanceledException", "Message": "cancelled"},
+                "CancellationReasons": [
+                    {"Code": "None"},
+                    {"Code": "ValidationError"},
+                    {"Code": "None"},
+                ],
+            },
+            "TransactWriteItems",
+        )
+        mock_client.transact_write_items.side_effect = [cancelled, {}]
+
+        service = DynamoDBService()
+        outcomes = service.save_messages(
+            [("ok1", VALID_MESSAGE), ("bad", VALID_MESSAGE), ("ok2", VALID_MESSAGE)])
+
+        self.assertEqual(outcomes, {"ok1": "saved", "bad": "failed", "ok2": "saved"})
+        self.assertEqual(mock_client.transact_write_items.call_count, 2)
+        retry_items = mock_client.transact_write_items.call_args_list[1].kwargs["TransactItems"]
+        self.assertEqual(
+            [item["Put"]["Item"]["message_id"]["S"] for item in retry_items], ["ok1", "ok2"])
+        mock_metric.assert_any_call("MessagesSaved", 2)
+        mock_metric.assert_any_call("DynamoDBSaveError", 1)
+
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_save_messages_fails_only_unserializable_items(self, mock_get_client, mock_log, mock_metric):
+        mock_client = mock_get_client.return_value
+        mock_client.batch_write_item.return_value = {}
+        bad = dict(VALID_MESSAGE, payload={"amount": Decimal("NaN")})
+
+        for transactional in (True, False):
+            with self.subTest(transactional=transactional):
+                mock_client.reset_mock()
+                service = DynamoDBService()
+                outcomes = service.save_messages(
+                    [("ok1", VALID_MESSAGE), ("bad", bad), ("ok2", VALID_MESSAGE)],
+                    transactional=transactional)
+
+                self.assertEqual(outcomes, {"ok1": "saved", "bad": "failed", "ok2": "saved"})
+                if transactional:
+                    items = mock_client.transact_write_items.call_args.kwargs["TransactItems"]
+                    written = [item["Put"]["Item"]["message_id"]["S"] for item in items]
+                else:
+                    request = mock_client.batch_write_item.call_args.kwargs["RequestItems"]
+                    written = [
+                        entry["PutRequest"]["Item"]["message_id"]["S"]
+                        for entry in request[service.table_name]
+                    ]
+                self.assertEqual(written, ["ok1", "ok2"])
+                mock_metric.assert_any_call("DynamoDBSaveError", 1)
+
+    @patch("services.dynamodb.time.sleep")
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_save_messages_batch_retries_unprocessed(self, mock_get_client, mock_log, mock_metric, mock_sleep):
+        mock_client = mock_get_client.return_value
+        service = DynamoDBService()
+        service.table_name = "messages_table"
+        unprocessed = {"messages_table": [{"PutRequest": {"Item": {"message_id": {"S": "b"}}}}]}
+        mock_client.batch_write_item.side_effect = [
+            {"UnprocessedItems": unprocessed},
+            {"UnprocessedItems": unprocessed},
+            {"UnprocessedItems": unprocessed},
+            {"UnprocessedItems": unprocessed},
+        ]
+
+        outcomes = service.save_messages(
+            [("a", VALID_MESSAGE), ("b", VALID_MESSAGE)], transactional=False)
+
+        self.assertEqual(outcomes, {"a": "saved", "b": "failed"})
+        self.assertEqual(mock_client.batch_write_item.call_count, 4)
+        mock_log.assert_any_call("b", "dynamodb_save", "error", {
+            "error": "UnprocessedItems retries exhausted"})
+        mock_metric.assert_any_call("MessagesSaved", 1)
+        mock_metric.assert_any_call("DynamoDBSaveError", 1)
+
+    @patch("services.dynamodb.time.sleep")
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_save_messages_batch_failure(self, mock_get_client, mock_log, mock_metric, mock_sleep):
+        mock_get_client.return_value.batch_write_item.side_effect = Exception("fail")
+
+        service = DynamoDBService()
+        outcomes = service.save_messages(
+            [("a", VALID_MESSAGE), ("b", VALID_MESSAGE)], transactional=False)
+
+        self.assertEqual(outcomes, {"a": "failed", "b": "failed"})
+        mock_metric.assert_called_once_with("DynamoDBSaveError", 2)
+
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_cache_skips_dynamodb_for_known_ids(self, mock_get_client, mock_log, mock_metric):
+        mock_client = mock_get_client.return_value
+
+        service = DynamoDBService()
+        service.save_message("saved-id", VALID_MESSAGE)
+        exists, err = service.exists_message("saved-id")
+        existing, failed = service.exists_messages(["saved-id"])
+        status, _ = service.claim_message("saved-id", VALID_MESSAGE)
+
+        self.assertTrue(exists)
+        self.assertEqual(existing, {"saved-id"})
+        self.assertEqual(status, "duplicate")
+        mock_client.get_item.assert_not_called()
+        mock_client.batch_get_item.assert_not_called()
+        mock_client.put_item.assert_called_once()
+
+        with patch("services.idempotency.put_metric") as mock_cache_metric:
+            service.publish_cache_metrics()
+        mock_cache_metric.assert_called_once_with("IdempotencyCacheHits", 3)
+
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_cache_records_conditional_duplicates(self, mock_get_client, mock_log, mock_metric):
+        from botocore.exceptions import ClientError
+
+        mock_client = mock_get_client.return_value
+        mock_client.put_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException", "Message": "Item exists"}},
+            "PutItem",
+        )
+
+        service = DynamoDBService()
+        service.claim_message("123", VALID_MESSAGE)
+        outcomes = service.save_messages([("123", VALID_MESSAGE)])
+
+        self.assertEqual(outcomes, {"123": "duplicate"})
+        mock_client.put_item.assert_called_once()
+        mock_get_client.return_value.transact_write_items.assert_not_called()
+
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.idempotency.convert_floats_to_decimal")
+    @patch("services.dynamodb.get_client")
+    def test_save_message_converted_payload_is_not_walked(self, mock_get_client, mock_convert, mock_log, mock_metric):
+        mock_client = mock_get_client.return_value
+
+        service = DynamoDBService()
+        message = dict(VALID_MESSAGE, payload=DECIMAL_PAYLOAD)
+        result, err = service.save_message("123", message, converted=True)
+
+        self.assertTrue(result)
+        mock_convert.assert_not_called()
+        item = mock_client.put_item.call_args.kwargs["Item"]
+        self.assertEqual(item["payload"]["M"]["amount"], {"N": "250.75"})
+
+    @patch("services.dynamodb.time.sleep")
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_throttled_call_backs_off_and_retries(self, mock_get_client, mock_log, mock_metric, mock_sleep):
+        from botocore.exceptions import ClientError
+
+        mock_client = mock_get_client.return_value
+        mock_client.put_item.side_effect = [
+            ClientError(
+                {"Error": {"Code": "ProvisionedThroughputExceededException", "Message": "slow down"}},
+                "PutItem",
+            ),
+            {},
+        ]
+
+        service = DynamoDBService()
+        service.write_limiter = TokenBucket(rate=100)
+        result, err = service.save_message("123", VALID_MESSAGE)
+
+        self.assertTrue(result)
+        self.assertEqual(mock_client.put_item.call_count, 2)
+        self.assertEqual(service.write_limiter.rate, 51)
+        mock_sleep.assert_called_once()
+        mock_metric.assert_any_call("DynamoDBThrottles", 1)
+        metric_names = [c.args[0] for c in mock_metric.call_args_list]
+        self.assertIn("DynamoDBBackoffWait", metric_names)
+
+    @patch("services.dynamodb.time.sleep")
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_single_retry_layer_owns_transient_errors(self, mock_get_client, mock_log, mock_metric, mock_sleep):
+        from botocore.exceptions import ClientError, EndpointConnectionError
+
+        mock_client = mock_get_client.return_value
+        mock_client.put_item.side_effect = [
+            ClientError(
+                {"Error": {"Code": "InternalServerError", "Message": "oops"},
+                 "ResponseMetadata": {"HTTPStatusCode": 500}},
+                "PutItem",
+            ),
+            EndpointConnectionError(endpoint_url="http://localhost"),
+            {},
+        ]
+
+        service = DynamoDBService()
+        service.write_limiter = TokenBucket(rate=100)
+        result, err = service.save_message("123", VALID_MESSAGE)
+
+        self.assertTrue(result)
+        mock_get_client.assert_called_once_with("dynamodb", max_attempts=1)
+        self.assertEqual(mock_client.put_item.call_count, 3)
+        self.assertEqual(service.write_limiter.rate, 100)
+        self.assertNotIn(
+            "DynamoDBThrottles", [c.args[0] for c in mock_metric.call_args_list])
+
+    @patch("services.dynamodb.Config.DYNAMO_THROTTLE_RETRIES", 1)
+    @patch("services.dynamodb.time.sleep")
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_throttle_retries_exhausted(self, mock_get_client, mock_log, mock_metric, mock_sleep):
+        from botocore.exceptions import ClientError
+
+        mock_client = mock_get_client.return_value
+        mock_client.get_item.side_effect = ClientError(
+            {"Error": {"Code": "ThrottlingException", "Message": "slow down"}},
+            "GetItem",
+        )
+
+        service = DynamoDBService()
+        result, err = service.exists_message("123")
+
+        self.assertFalse(result)
+        self.assertEqual(err, "DynamoDB error")
+        self.assertEqual(mock_client.get_item.call_count, 2)
+        mock_metric.assert_any_call("DynamoDBCheckError", 1)
+
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_rate_limit_wait_is_reported(self, mock_get_client, mock_log, mock_metric):
+        service = DynamoDBService()
+        service.read_limiter = MagicMock()
+        service.read_limiter.acquire.return_value = 0.25
+
+        service.exists_message("123")
+
+        service.read_limiter.acquire.assert_called_once_with(1)
+        mock_metric.assert_any_call(
+            "DynamoDBRateLimitWait", 250.0, unit="Milliseconds")
+
+    @patch("services.dynamodb.time.sleep")
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_no_backoff_past_deadline(self, mock_get_client, mock_log, mock_metric, mock_sleep):
+        from botocore.exceptions import ClientError
+
+        mock_client = mock_get_client.return_value
+        mock_client.put_item.side_effect = ClientError(
+            {"Error": {"Code": "ThrottlingException", "Message": "slow down"}},
+            "PutItem",
+        )
+
+        service = DynamoDBService()
+        service.deadline = Deadline(0)
+        result, err = service.save_message("123", VALID_MESSAGE)
+
+        self.assertFalse(result)
+        self.assertEqual(mock_client.put_item.call_count, 1)
+        mock_sleep.assert_not_called()
+
+    @patch("services.payload.put_metric")
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_large_payload_is_compressed_and_read_back(self, mock_get_client, mock_log, mock_metric, mock_payload_metric):
+        mock_client = mock_get_client.return_value
+        service = DynamoDBService()
+        service.codec.compress_threshold = 100
+        message = dict(VALID_MESSAGE, payload={
+            "items": [dict(VALID_MESSAGE["payload"], index=i) for i in range(20)]})
+
+        result, err = service.save_message("123", message)
+
+        self.assertTrue(result)
+        item = mock_client.put_item.call_args.kwargs["Item"]
+        self.assertEqual(item["payload_encoding"], {"S": "zlib"})
+        self.assertIn("B", item["payload"])
+
+        mock_client.get_item.return_value = {"Item": item}
+        stored, err = service.get_message("123")
+
+        self.assertIsNone(err)
+        self.assertEqual(stored["message_id"], "123")
+        self.assertEqual(stored["payload"], convert_floats_to_decimal(message["payload"]))
+        self.assertNotIn("payload_encoding", stored)
+
+    @patch("services.dynamodb.Config.IDEMPOTENCY_TTL", 3600)
+    @patch("services.dynamodb.Config.IDEMPOTENCY_TABLE", "message_markers")
+    @patch("services.dynamodb.time.time", return_value=1000.4)
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_marker_layout_writes_payload_then_marker(self, mock_get_client, mock_log, mock_metric, mock_time):
+        mock_client = mock_get_client.return_value
+        service = DynamoDBService()
+
+        status, err = service.claim_message("123", VALID_MESSAGE)
+
+        self.assertEqual(status, "saved")
+        payload_put, marker_put = mock_client.put_item.call_args_list
+        self.assertEqual(payload_put.kwargs["TableName"], service.table_name)
+        self.assertNotIn("ConditionExpression", payload_put.kwargs)
+        self.assertIn("payload", payload_put.kwargs["Item"])
+        self.assertEqual(marker_put.kwargs["TableName"], "message_markers")
+        self.assertEqual(marker_put.kwargs["Item"], {
+            "message_id": {"S": "123"}, "expires_at": {"N": "4600"}})
+        self.assertEqual(
+            marker_put.kwargs["ConditionExpression"], "attribute_not_exists(message_id)")
+
+        service.cache.clear()
+        mock_client.get_item.return_value = {"Item": {"message_id": {"S": "123"}}}
+        exists, _ = service.exists_message("123")
+        self.assertTrue(exists)
+        mock_client.get_item.assert_called_once_with(
+            TableName="message_markers",
+            Key={"message_id": {"S": "123"}},
+            ProjectionExpression="message_id")
+
+    @patch("services.dynamodb.Config.STORE_PAYLOADS", False)
+    @patch("services.dynamodb.Config.IDEMPOTENCY_TABLE", "message_markers")
+    @patch("services.dynamodb.time.sleep")
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_marker_layout_without_payloads(self, mock_get_client, mock_log, mock_metric, mock_sleep):
+        from botocore.exceptions import ClientError
+
+        mock_client = mock_get_client.return_value
+        mock_client.put_item.side_effect = ClientError(
+            {"Error": {"Code": "ConditionalCheckFailedException", "Message": "Item exists"}},
+            "PutItem",
+        )
+        mock_client.batch_write_item.return_value = {"UnprocessedItems": {}}
+        service = DynamoDBService()
+
+        status, _ = service.claim_message("123", VALID_MESSAGE)
+        outcomes = service.save_messages([("a", VALID_MESSAGE)], transactional=False)
+
+        self.assertEqual(status, "duplicate")
+        mock_client.put_item.assert_called_once()
+        self.assertEqual(outcomes, {"a": "saved"})
+        mock_client.batch_write_item.assert_called_once()
+        request = mock_client.batch_write_item.call_args.kwargs["RequestItems"]
+        self.assertEqual(request, {"message_markers": [
+            {"PutRequest": {"Item": {"message_id": {"S": "a"}}}}]})
+
+    @patch("services.dynamodb.Config.IDEMPOTENCY_TABLE", "message_markers")
+    @patch("services.dynamodb.time.sleep")
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_marker_layout_bulk_skips_markers_for_unsaved_payloads(self, mock_get_client, mock_log, mock_metric, mock_sleep):
+        mock_client = mock_get_client.return_value
+        mock_client.batch_write_item.side_effect = [
+            {"UnprocessedItems": {}},
+            Exception("payload table down"),
+        ]
+        service = DynamoDBService()
+        messages = [(f"id-{i}", VALID_MESSAGE) for i in range(30)]
+
+        outcomes = service.save_messages(messages, transactional=True)
+
+        self.assertEqual(sum(1 for s in outcomes.values() if s == "saved"), 25)
+        self.assertEqual(outcomes["id-29"], "failed")
+        payload_request = mock_client.batch_write_item.call_args_list[0].kwargs["RequestItems"]
+        self.assertEqual(list(payload_request), [service.table_name])
+        markers = mock_client.transact_write_items.call_args.kwargs["TransactItems"]
+        self.assertEqual(len(markers), 25)
+        self.assertEqual(markers[0]["Put"]["TableName"], "message_markers")
+        self.assertEqual(markers[0]["Put"]["Item"], {"message_id": {"S": "id-0"}})
+
+    @patch("services.dynamodb.Config.IDEMPOTENCY_TTL", 60)
+    @patch("services.dynamodb.time.time", return_value=1000)
+    @patch("services.dynamodb.put_metric")
+    @patch("services.dynamodb.log_message")
+    @patch("services.dynamodb.get_client")
+    def test_single_table_ttl_is_ignored(self, mock_get_client, mock_log, mock_metric, mock_time):
+        mock_client = mock_get_client.return_value
+        service = DynamoDBService()
+
+        service.save_message("123", VALID_MESSAGE)
+
+        item = mock_client.put_item.call_args.kwargs["Item"]
+        self.assertNotIn("expires_at", item)
+        self.assertIn("payload", item)
+        self.assertEqual(mock_log.call_args_list[0].args[:3], (
+            "config", "idempotency_ttl_ignored", "warning"))
@@ -0,0 +1,140 @@
+import os
+import tempfile
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+from services.dynamodb import DynamoDBService
+from services.idempotency import (
+    IdempotencyStore, MemoryIdempotencyStore, SQLiteIdempotencyStore,
+    create_idempotency_store)
+
+MESSAGE = {
+    "message_id": "a",
+    "timestamp": "2025-10-04T12:00:00Z",
+    "source": "transactions_api",
+    "type": "transaction_created",
+    "payload": {"amount": Decimal("250.75"), "currency": "BRL"},
+}
+
+
+@patch("services.idempotency.put_metric")
+@patch("services.idempotency.log_message")
+class LocalStoreCases:
+    """Behaviour shared by every local store; ``make_store`` builds one."""
+
+    def test_check_and_claim(self, mock_log, mock_metric):
+        store = self.make_store()
+
+        self.assertEqual(store.exists_messages(["a", "b", "a"]), (set(), set()))
+        self.assertEqual(store.claim_message("a", MESSAGE, converted=True), ("saved", None))
+        self.assertEqual(store.claim_message("a", MESSAGE, converted=True), ("duplicate", None))
+        self.assertEqual(store.exists_message("a"), (True, None))
+        self.assertEqual(store.exists_messages(["a", "b", ""]), ({"a"}, {""}))
+        mock_metric.assert_called_once_with("MessagesSaved", 1)
+
+    def test_bulk_claim_reports_each_outcome(self, mock_log, mock_metric):
+        store = self.make_store()
+        store.save_messages([("a", MESSAGE)], converted=True)
+        store.cache.clear()
+
+        outcomes = store.save_messages(
+            [("a", MESSAGE), ("b", MESSAGE), ("b", MESSAGE)], converted=True)
+
+        self.assertEqual(outcomes, {"a": "duplicate", "b": "saved"})
+        mock_log.assert_any_call("a", "idempotency_save", "duplicate")
+
+    def test_save_after_check_and_read_back(self, mock_log, mock_metric):
+        store = self.make_store()
+
+        self.assertEqual(store.save_message("a", MESSAGE, converted=True), (True, None))
+        self.assertEqual(store.save_messages(
+            [("a", MESSAGE)], transactional=False)["a"], "duplicate")
+        store.cache.clear()
+        self.assertEqual(store.save_messages(
+            [("a", MESSAGE)], transactional=False)["a"], "saved")
+        item, err = store.get_message("a")
+        self.assertIsNone(err)
+        self.assertEqual(item["source"], "transactions_api")
+        self.assertEqual(item["payload"], {
+            "amount": Decimal("250.75"), "currency": "BRL"})
+
+    def test_ttl_expiry(self, mock_log, mock_metric):
+        store = self.make_store()
+        with patch("services.idempotency.Config.IDEMPOTENCY_TTL", 60), \
+                patch("services.idempotency.time.time", return_value=1000.0):
+            store.save_messages([("a", MESSAGE)], converted=True)
+        store.cache.clear()
+
+        with patch("services.idempotency.time.time", return_value=1059.0):
+            self.assertEqual(store.exists_messages(["a"]), ({"a"}, set()))
+        store.cache.clear()
+        with patch("services.idempotency.time.time", return_value=1061.0):
+            self.assertEqual(store.exists_messages(["a"]), (set(), set()))
+            self.assertEqual(store.expire(), 1)
+            self.assertEqual(store.claim_message("a", MESSAGE)[0], "saved")
+
+    def test_store_errors_fail_the_messages(self, mock_log, mock_metric):
+        store = self.make_store()
+        with patch.object(store, "_insert", side_effect=OSError("disk full")), \
+                patch.object(store, "_lookup", side_effect=OSError("disk full")):
+            outcomes = store.save_messages([("a", MESSAGE), ("b", MESSAGE)])
+            existing, failed = store.exists_messages(["a"])
+
+        self.assertEqual(outcomes, {"a": "failed", "b": "failed"})
+        self.assertEqual((existing, failed), (set(), {"a"}))
+        mock_metric.assert_any_call("IdempotencyStoreError", 2)
+        mock_log.assert_any_call("a", "idempotency_check", "error", {"error": "disk full"})
+
+    def test_payloads_are_skipped_without_store_payloads(self, mock_log, mock_metric):
+        store = self.make_store()
+        with patch("services.idempotency.Config.STORE_PAYLOADS", False):
+            store.save_messages([("a", MESSAGE)], converted=True)
+
+        self.assertEqual(store.get_message("a"), (None, None))
+        self.assertEqual(store.exists_message("a"), (True, None))
+
+
+class TestMemoryIdempotencyStore(LocalStoreCases, unittest.TestCase):
+
+    def make_store(self):
+        return MemoryIdempotencyStore()
+
+
+class TestSQLiteIdempotencyStore(LocalStoreCases, unittest.TestCase):
+
+    def make_store(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return SQLiteIdempotencyStore(os.path.join(directory.name, "idempotency.db"))
+
+    @patch("services.idempotency.put_metric")
+    @patch("services.idempotency.log_message")
+    def test_file_is_shared_and_uses_wal(self, mock_log, mock_metric):
+        store = self.make_store()
+        store.save_messages([("a", MESSAGE)], converted=True)
+
+        other = SQLiteIdempotencyStore(store.path)
+        self.assertEqual(other.exists_messages(["a", "b"]), ({"a"}, set()))
+        self.assertEqual(
+            other.connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+
+class TestCreateIdempotencyStore(unittest.TestCase):
+
+    def test_interface_is_abstract(self):
+        with self.assertRaises(TypeError):
+            IdempotencyStore()
+        self.assertEqual(IdempotencyStore.__abstractmethods__, {
+            "exists_message", "exists_messages", "save_message",
+            "claim_message", "save_messages", "get_message", "expire"})
+
+    def test_backends(self):
+        self.assertIsInstance(create_idempotency_store("dynamodb"), DynamoDBService)
+        self.assertIsInstance(create_idempotency_store(None), DynamoDBService)
+        self.assertIsInstance(create_idempotency_store("memory"), MemoryIdempotencyStore)
+        store = create_idempotency_store("sqlite:///tmp/idempotency.db")
+        self.assertIsInstance(store, SQLiteIdempotencyStore)
+        self.assertEqual(store.path, "/tmp/idempotency.db")
+        self.assertEqual(DynamoDBService().expire(), 0)
+        with self.assertRaises(ValueError):
+            create_idempotency_store("redis://localhost")
@@ -0,0 +1,80 @@
+import hashlib
+import tempfile
+import unittest
+from unittest.mock import patch
+from services.blobstore import FileBlobStore
+from services.payload import PayloadCodec, attribute_size
+
+SMALL = {"M": {"amount": {"N": "250.75"}, "currency": {"S": "BRL"}}}
+LARGE = {"M": {f"item_{i}": {"S": "transaction " * 20} for i in range(200)}}
+
+
+class TestPayloadCodec(unittest.TestCase):
+
+    def test_attribute_size(self):
+        self.assertEqual(attribute_size({"S": "abc"}), 3)
+        self.assertEqual(attribute_size({"N": "250.75"}), 4)
+        self.assertEqual(attribute_size({"BOOL": True}), 1)
+        self.assertEqual(attribute_size({"L": [{"S": "ab"}, {"NULL": True}]}), 8)
+        self.assertEqual(attribute_size(SMALL), 3 + 6 + 4 + 1 + 8 + 3 + 1)
+
+    @patch("services.payload.put_metric")
+    def test_small_payload_stays_a_map(self, mock_metric):
+        codec = PayloadCodec(compress_threshold=1024, offload_threshold=4096)
+
+        self.assertEqual(codec.encode(SMALL), {"payload": SMALL})
+        mock_metric.assert_not_called()
+
+    @patch("services.payload.put_metric")
+    def test_disabled_codec_keeps_large_maps(self, mock_metric):
+        codec = PayloadCodec(compress_threshold=0, offload_threshold=4096)
+
+        self.assertEqual(codec.encode(LARGE), {"payload": LARGE})
+
+    @patch("services.payload.put_metric")
+    def test_large_payload_is_compressed(self, mock_metric):
+        codec = PayloadCodec(compress_threshold=1024, offload_threshold=400 * 1024)
+
+        fields = codec.encode(LARGE)
+
+        self.assertEqual(fields["payload_encoding"], {"S": "zlib"})
+        self.assertIsInstance(fields["payload"]["B"], bytes)
+        self.assertEqual(codec.decode({"message_id": {"S": "id"}, **fields}), {
+            "message_id": {"S": "id"}, "payload": LARGE})
+        mock_metric.assert_any_call("PayloadsCompressed", 1)
+        saved = [c for c in mock_metric.call_args_list if c.args[0] == "PayloadBytesSaved"]
+        self.assertGreater(saved[0].args[1], attribute_size(LARGE) // 2)
+        self.assertEqual(saved[0].kwargs, {"unit": "Bytes"})
+
+    @patch("services.payload.put_metric")
+    def test_oversized_payload_is_offloaded(self, mock_metric):
+        with tempfile.TemporaryDirectory() as root:
+            codec = PayloadCodec(
+                compress_threshold=1024, offload_threshold=10,
+                blob_store=FileBlobStore(root))
+
+            fields = codec.encode(LARGE)
+            url = fields["payload"]["S"]
+
+            self.assertEqual(fields["payload_encoding"], {"S": "blob+zlib"})
+            digest = hashlib.sha256(
+                FileBlobStore(root).get(url)).hexdigest()
+            self.assertEqual(url, f"file://{root}/payloads/{digest}.json.zz")
+            self.assertEqual(codec.encode(LARGE), fields)
+            self.assertEqual(codec.decode(fields), {"payload": LARGE})
+            reader = PayloadCodec(compress_threshold=0, offload_threshold=0)
+            self.assertEqual(reader.decode(fields), {"payload": LARGE})
+        mock_metric.assert_any_call("PayloadsOffloaded", 1)
+
+    @patch("services.payload.put_metric")
+    def test_offload_threshold_without_blob_store_compresses(self, mock_metric):
+        codec = PayloadCodec(compress_threshold=1024, offload_threshold=10)
+
+        self.assertEqual(codec.encode(LARGE)["payload_encoding"], {"S": "zlib"})
+
+    @patch("services.payload.put_metric")
+    def test_incompressible_payload_stays_a_map(self, mock_metric):
+        codec = PayloadCodec(compress_threshold=16, offload_threshold=400 * 1024)
+
+        self.assertEqual(codec.encode(SMALL), {"payload": SMALL})
+        mock_metric.assert_not_called()
@@ -6,7 +6,7 @@ class TestSQSService(unittest.TestCase):
 
     @patch("services.sqs.put_metric")
     @patch("services.sqs.log_message")
-    @patch("services.sqs.boto3.client")
+    @patch("services.sqs.get_client")
     def test_get_queue_url_success(self, mock_boto, mock_log, mock_metric):
         mock_sqs_client = MagicMock()
         mock_sqs_client.get_queue_url.return_value = {"QueueUrl": "https://queue-url"}
@@ -21,7 +21,7 @@ class TestSQSService(unittest.TestCase):
 
     @patch("services.sqs.put_metric")
     @patch("services.sqs.log_message")
-    @patch("services.sqs.boto3.client")
+    @patch("services.sqs.get_client")
     def test_get_queue_url_failure(self, mock_boto, mock_log, mock_metric):
         mock_sqs_client = MagicMock()
         mock_sqs_client.get_queue_url.side_effect = Exception("fail")
@@ -36,7 +36,7 @@ class TestSQSService(unittest.TestCase):
 
     @patch("services.sqs.put_metric")
     @patch("services.sqs.log_message")
-    @patch("services.sqs.boto3.client")
+    @patch("services.sqs.get_client")
     def test_delete_message_success(self, mock_boto, mock_log, mock_metric):
         mock_sqs_client = MagicMock()
         mock_boto.return_value = mock_sqs_client
@@ -53,7 +53,7 @@ class TestSQSService(unittest.TestCase):
 
     @patch("services.sqs.put_metric")
     @patch("services.sqs.log_message")
-    @patch("services.sqs.boto3.client")
+    @patch("services.sqs.get_client")
     def test_delete_message_failure(self, mock_boto, mock_log, mock_metric):
         mock_sqs_client = MagicMock()
         mock_sqs_client.delete_message.side_effect = Exception("fail")
@@ -68,3 +68,209 @@ class TestSQSService(unittest.TestCase):
         )
         mock_log.assert_called_with("trace123", "sqs_delete_message", "error", {"error": "fail"})
         mock_metric.assert_called_with("SQSDeleteError", 1)
+
+    @patch("services.sqs.put_metric")
+    @patch("services.sqs.log_message")
+    @patch("services.sqs.get_client")
+    def test_resolve_queue_url_from_arn(self, mock_boto, mock_log, mock_metric):
+        mock_sqs_client = MagicMock()
+        mock_boto.return_value = mock_sqs_client
+
+        service = SQSService()
+        first = service.resolve_queue_url(
+            "main_queue.fifo", "trace123",
+            "arn:aws:sqs:us-east-1:123456789012:main_queue.fifo")
+        second = service.resolve_queue_url(
+            "other_queue", "trace123",
+            "arn:aws:sqs:sa-east-1:123456789012:other_queue")
+
+        self.assertEqual(first, "https://sqs.us-east-1.amazonaws.com/123456789012/main_queue.fifo")
+        self.assertEqual(second, "https://sqs.sa-east-1.amazonaws.com/123456789012/other_queue")
+        mock_sqs_client.get_queue_url.assert_not_called()
+
+    @patch("services.sqs.put_metric")
+    @patch("services.sqs.log_message")
+    @patch("services.sqs.get_client")
+    def test_resolve_queue_url_falls_back_to_cached_lookup(self, mock_boto, mock_log, mock_metric):
+        mock_sqs_client = MagicMock()
+        mock_sqs_client.get_queue_url.return_value = {"QueueUrl": "https://queue-url"}
+        mock_boto.return_value = mock_sqs_client
+
+        service = SQSService()
+        for _ in range(3):
+            result = service.resolve_queue_url("queue", "trace123", "arn:aws:sqs:::queue")
+
+        self.assertEqual(result, "https://queue-url")
+        mock_sqs_client.get_queue_url.assert_called_once_with(QueueName="queue")
+
+    @patch("services.sqs.put_metric")
+    @patch("services.sqs.log_message")
+    @patch("services.sqs.get_client")
+    def test_delete_messages_buffers_and_flushes_in_groups(self, mock_boto, mock_log, mock_metric):
+        mock_sqs_client = MagicMock()
+        mock_sqs_client.delete_message_batch.return_value = {"Failed": []}
+        mock_boto.return_value = mock_sqs_client
+
+        service = SQSService()
+        entries = [(f"receipt{i}", f"trace{i}") for i in range(23)]
+        failed = service.delete_messages(entries, "https://queue-url")
+
+        self.assertEqual(failed, set())
+        self.assertEqual(mock_sqs_client.delete_message_batch.call_count, 2)
+
+        failed = service.flush_deletes()
+
+        self.assertEqual(failed, set())
+        self.assertEqual(mock_sqs_client.delete_message_batch.call_count, 3)
+        last_call = mock_sqs_client.delete_message_batch.call_args
+        self.assertEqual(last_call.kwargs["QueueUrl"], "https://queue-url")
+        self.assertEqual(
+            [entry["ReceiptHandle"] for entry in last_call.kwargs["Entries"]],
+            ["receipt20", "receipt21", "receipt22"])
+        self.assertEqual(service.flush_deletes(), set())
+        mock_sqs_client.delete_message.assert_not_called()
+        mock_metric.assert_called_with("MessagesDeleted", 3)
+
+    @patch("services.sqs.time.sleep")
+    @patch("services.sqs.put_metric")
+    @patch("services.sqs.log_message")
+    @patch("services.sqs.get_client")
+    def test_delete_messages_retries_failed_entries(self, mock_boto, mock_log, mock_metric, mock_sleep):
+        mock_sqs_client = MagicMock()
+        mock_sqs_client.delete_message_batch.side_effect = [
+            {"Failed": [
+                {"Id": "0", "SenderFault": False, "Code": "InternalError"},
+                {"Id": "1", "SenderFault": True, "Code": "ReceiptHandleIsInvalid"},
+            ]},
+            {"Failed": []},
+        ]
+        mock_boto.return_value = mock_sqs_client
+
+        service = SQSService(queue_url="https://queue-url")
+        service.delete_messages([("r0", "t0"), ("r1", "t1"), ("r2", "t2")])
+        failed = service.flush_deletes()
+
+        self.assertEqual(failed, {"t1"})
+        retry_entries = mock_sqs_client.delete_message_batch.call_args_list[1].kwargs["Entries"]
+        self.assertEqual(retry_entries, [{"Id": "0", "ReceiptHandle": "r0"}])
+        mock_log.assert_any_call("t1", "sqs_delete_message", "error", {"error": "ReceiptHandleIsInvalid"})
+        mock_metric.assert_any_call("MessagesDeleted", 2)
+        mock_metric.assert_any_call("SQSDeleteError", 1)
+
+    @patch("services.sqs.put_metric")
+    @patch("services.sqs.log_message")
+    @patch("services.sqs.get_client")
+    def test_receive_messages(self, mock_boto, mock_log, mock_metric):
+        mock_sqs_client = MagicMock()
+        mock_sqs_client.receive_message.return_value = {"Messages": [{"MessageId": "1"}]}
+        mock_boto.return_value = mock_sqs_client
+
+        service = SQSService()
+        result = service.receive_messages("https://queue-url", visibility_timeout=60)
+
+        self.assertEqual(result, [{"MessageId": "1"}])
+        mock_sqs_client.receive_message.assert_called_once_with(
+            QueueUrl="https://queue-url",
+            MaxNumberOfMessages=10,
+            WaitTimeSeconds=20,
+            AttributeNames=["All"],
+            MessageAttributeNames=["All"],
+            VisibilityTimeout=60,
+        )
+
+    @patch("services.sqs.put_metric")
+    @patch("services.sqs.log_message")
+    @patch("services.sqs.get_client")
+    def test_receive_messages_failure(self, mock_boto, mock_log, mock_metric):
+        mock_sqs_client = MagicMock()
+        mock_sqs_client.receive_message.side_effect = Exception("fail")
+        mock_boto.return_value = mock_sqs_client
+
+        service = SQSService()
+        result = service.receive_messages("https://queue-url")
+
+        self.assertEqual(result, [])
+        mock_metric.assert_called_with("SQSReceiveError", 1)
+
+    @patch("services.sqs.put_metric")
+    @patch("services.sqs.log_message")
+    @patch("services.sqs.get_client")
+    def test_change_visibility_batches(self, mock_boto, mock_log, mock_metric):
+        mock_sqs_client = MagicMock()
+        mock_sqs_client.change_message_visibility_batch.side_effect = [
+            {"Failed": [{"Id": "3", "Code": "ReceiptHandleIsInvalid"}]},
+            {"Failed": []},
+        ]
+        mock_boto.return_value = mock_sqs_client
+
+        service = SQSService()
+        entries = [(f"r{i}", f"t{i}") for i in range(12)]
+        failed = service.change_visibility("https://queue-url", entries, 45)
+
+        self.assertEqual(failed, {"t3"})
+        self.assertEqual(mock_sqs_client.change_message_visibility_batch.call_count, 2)
+        first = mock_sqs_client.change_message_visibility_batch.call_args_list[0].kwargs
+        self.assertEqual(first["Entries"][0], {"Id": "0", "ReceiptHandle": "r0", "VisibilityTimeout": 45})
+        mock_metric.assert_called_with("SQSVisibilityError", 1)
+
+    @patch("services.sqs.time.sleep")
+    @patch("services.sqs.put_metric")
+    @patch("services.sqs.log_message")
+    @patch("services.sqs.get_client")
+    def test_send_messages_batches_and_retries(self, mock_boto, mock_log, mock_metric, mock_sleep):
+        mock_sqs_client = MagicMock()
+        mock_sqs_client.send_message_batch.side_effect = [
+            {
+                "Successful": [{"Id": str(i)} for i in range(1, 9)],
+                "Failed": [
+                    {"Id": "0", "SenderFault": False, "Code": "InternalError"},
+                    {"Id": "9", "SenderFault": True, "Code": "InvalidMessageContents"},
+                ],
+            },
+            {"Successful": [{"Id": "0"}], "Failed": []},
+            {"Successful": [{"Id": "0"}, {"Id": "1"}], "Failed": []},
+        ]
+        mock_boto.return_value = mock_sqs_client
+
+        service = SQSService()
+        entries = [({"MessageBody": f"body-{i}"}, f"t{i}") for i in range(12)]
+        failed = service.send_messages("https://dlq-url", entries)
+
+        self.assertEqual(failed, {"t9"})
+        self.assertEqual(mock_sqs_client.send_message_batch.call_count, 3)
+        first = mock_sqs_client.send_message_batch.call_args_list[0].kwargs
+        self.assertEqual(len(first["Entries"]), 10)
+        self.assertEqual(first["Entries"][0], {"Id": "0", "MessageBody": "body-0"})
+        retry = mock_sqs_client.send_message_batch.call_args_list[1].kwargs
+        self.assertEqual(retry["Entries"], [{"Id": "0", "MessageBody": "body-0"}])
+        mock_log.assert_called_with("t9", "sqs_send_message", "error", {
+            "error": "InvalidMessageContents", "queue_url": "https://dlq-url"})
+        mock_metric.assert_called_once_with("SQSSendError", 1)
+
+    @patch("services.sqs.put_metric")
+    @patch("services.sqs.log_message")
+    @patch("services.sqs.get_client")
+    def test_send_messages_splits_by_payload_size(self, mock_boto, mock_log, mock_metric):
+        mock_sqs_client = MagicMock()
+        mock_sqs_client.send_message_batch.return_value = {"Failed": []}
+        mock_boto.return_value = mock_sqs_client
+
+        service = SQSService()
+        body = "x" * (100 * 1024)
+        failed = service.send_messages(
+            "https://dlq-url", [({"MessageBody": body}, f"t{i}") for i in range(3)])
+
+        self.assertEqual(failed, set())
+        sizes = [len(c.kwargs["Entries"]) for c in mock_sqs_client.send_message_batch.call_args_list]
+        self.assertEqual(sizes, [2, 1])
+        mock_metric.assert_not_called()
+
+    def test_arn_from_queue_url(self):
+        from services.sqs import arn_from_queue_url
+
+        self.assertEqual(
+            arn_from_queue_url("https://sqs.sa-east-1.amazonaws.com/123456789012/q.fifo", "us-east-1"),
+            "arn:aws:sqs:sa-east-1:123456789012:q.fifo")
+        self.assertEqual(
+            arn_from_queue_url("http://localhost:9324/000000000000/q", "us-east-1"),
+            "arn:aws:sqs:us-east-1:000000000000:q")
@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+import unittest
+from unittest.mock import patch
+from supervisor import Supervisor, main
+from utils.metrics import put_metric, registry
+
+
+def reporting_worker(worker_id, queue_url, metrics_queue, options):
+    registry.drain()
+    registry.publisher = lambda series: metrics_queue.put((worker_id, series))
+    put_metric("MessagesProcessed", 10 + worker_id)
+    put_metric("DynamoDBSaveError", 1)
+    registry.flush()
+    time.sleep(30)
+
+
+def crashing_worker(worker_id, queue_url, metrics_queue, options):
+    marker = os.path.join(options["directory"], f"started-{worker_id}")
+    if not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    reporting_worker(worker_id, queue_url, metrics_queue, options)
+
+
+def run_until(supervisor, condition, timeout=10):
+    thread = threading.Thread(target=supervisor.run)
+    thread.start()
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    supervisor.stop()
+    thread.join(timeout)
+    assert not thread.is_alive()
+
+
+class TestSupervisor(unittest.TestCase):
+
+    def setUp(self):
+        registry.drain()
+        self.published = []
+        registry.publisher = self.published.append
+
+    def tearDown(self):
+        registry.publisher = None
+
+    @patch("supervisor.log_message")
+    def test_aggregates_worker_metrics_into_one_flush(self, mock_log):
+        supervisor = Supervisor(
+            ["q1", "q2"], workers=3, target=reporting_worker,
+            start_method="fork", flush_interval=60)
+
+        run_until(supervisor, lambda: len(supervisor.counters) == 3)
+
+        self.assertEqual(supervisor.counters, {
+            0: {"MessagesProcessed": 10, "DynamoDBSaveError": 1},
+            1: {"MessagesProcessed": 11, "DynamoDBSaveError": 1},
+            2: {"MessagesProcessed": 12, "DynamoDBSaveError": 1},
+        })
+        self.assertEqual(len(self.published), 1)
+        totals = {key[1]: stats[1] for key, stats in self.published[0].items()}
+        self.assertEqual(totals, {"MessagesProcessed": 33, "DynamoDBSaveError": 3})
+        self.assertTrue(all(not p.is_alive() for p in supervisor.processes.values()))
+
+    @patch("supervisor.put_metric")
+    @patch("supervisor.log_message")
+    def test_restarts_crashed_workers(self, mock_log, mock_metric):
+        import tempfile
+
+        with tempfile.TemporaryDirectory() as directory:
+            supervisor = Supervisor(
+                ["q1"], workers=2, target=crashing_worker,
+                options={"directory": directory}, start_method="fork",
+                restart_delay=0)
+
+            run_until(supervisor, lambda: len(supervisor.counters) == 2)
+
+        self.assertEqual(supervisor.restarts, 2)
+        mock_metric.assert_any_call("WorkerRestarts", 1)
+
+    def test_slots_are_assigned_round_robin(self):
+        supervisor = Supervisor(["q1", "q2"], workers=4, start_method="fork")
+        self.assertEqual(
+            [supervisor.slot_queue_url(i) for i in range(4)],
+            ["q1", "q2", "q1", "q2"])
+
+    def test_main_requires_queue_url(self):
+        with patch("supervisor.Config.QUEUE_URL", None):
+            with self.assertRaises(SystemExit):
+                main([])
+
+
+class TestRegistryMerge(unittest.TestCase):
+
+    def test_merge_combines_series(self):
+        from utils.metrics import MetricsRegistry
+
+        worker = MetricsRegistry(flush_interval=60)
+        worker.add("Latency", 10, unit="Milliseconds")
+        worker.add("MessagesSaved", 2)
+        parent = MetricsRegistry(flush_interval=60)
+        parent.add("Latency", 30, unit="Milliseconds")
+        parent.merge(worker.drain())
+
+        series = parent.drain()
+        latency = series[("Worker-consumer-SQS/Messages", "Latency", "Milliseconds", ())]
+        self.assertEqual(latency, [2, 40, 10, 30, [30, 10]])
+        saved = series[("Worker-consumer-SQS/Messages", "MessagesSaved", "Count", ())]
+        self.assertEqual(saved[1], 2)
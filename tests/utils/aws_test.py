@@ -0,0 +1,60 @@
+from unittest.mock import patch
+
+from utils import aws
+
+
+def setup_function():
+    aws.reset_clients()
+
+
+def teardown_function():
+    aws.reset_clients()
+
+
+def test_get_client_is_created_once_per_service():
+    with patch("boto3.session.Session") as mock_session:
+        first = aws.get_client("sqs")
+        second = aws.get_client("sqs")
+        aws.get_client("dynamodb")
+
+    assert first is second
+    mock_session.assert_called_once_with(region_name=aws.Config.REGION)
+    assert mock_session.return_value.client.call_count == 2
+
+
+def test_reset_clients_drops_cached_clients():
+    with patch("boto3.session.Session") as mock_session:
+        aws.get_client("sqs")
+        aws.reset_clients()
+        aws.get_client("sqs")
+
+    assert mock_session.call_count == 2
+
+
+def test_client_config_from_settings():
+    with patch.multiple(aws.Config, AWS_MAX_POOL_CONNECTIONS=64,
+                        AWS_RETRY_MODE="adaptive", AWS_MAX_ATTEMPTS=5,
+                        AWS_CONNECT_TIMEOUT=1.5, AWS_READ_TIMEOUT=25.0,
+                        AWS_TCP_KEEPALIVE=True):
+        config = aws.client_config()
+
+    assert config.max_pool_connections == 64
+    assert config.retries == {"mode": "adaptive", "total_max_attempts": 5}
+    assert config.connect_timeout == 1.5
+    assert config.read_timeout == 25.0
+    assert config.tcp_keepalive is True
+    assert aws.client_config(max_attempts=1).retries["total_max_attempts"] == 1
+
+
+def test_get_client_uses_endpoint_overrides():
+    with patch.multiple(aws.Config, AWS_ENDPOINT_URL="http://localhost:4566",
+                        AWS_ENDPOINT_URLS={"dynamodb": "http://localhost:8000"}):
+        with patch("boto3.session.Session") as mock_session:
+            aws.get_client("dynamodb")
+            aws.get_client("sqs")
+
+    calls = mock_session.return_value.client.call_args_list
+    assert calls[0].kwargs["endpoint_url"] == "http://localhost:8000"
+    assert calls[1].kwargs["endpoint_url"] == "http://localhost:4566"
+    assert calls[0].kwargs["config"].max_pool_connections == \
+        aws.Config.AWS_MAX_POOL_CONNECTIONS
@@ -0,0 +1,55 @@
+import unittest
+from unittest.mock import patch
+from utils.cache import LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_hits_and_misses(self):
+        cache = LRUCache(max_entries=10, ttl=60, max_bytes=1024 * 1024)
+        cache.add_many(["a", "b"])
+
+        self.assertEqual(cache.get_many(["a", "b", "c"]), {"a", "b"})
+        self.assertTrue(cache.contains("a"))
+        self.assertEqual(cache.pop_stats(), {"hits": 3, "misses": 1, "evictions": 0})
+        self.assertEqual(cache.pop_stats(), {"hits": 0, "misses": 0, "evictions": 0})
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2, ttl=60, max_bytes=1024 * 1024)
+        cache.add("a")
+        cache.add("b")
+        cache.contains("a")
+        cache.add("c")
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get_many(["a", "b", "c"]), {"a", "c"})
+        self.assertEqual(cache.pop_stats()["evictions"], 1)
+
+    def test_memory_budget(self):
+        cache = LRUCache(max_entries=1000, ttl=60, max_bytes=500)
+        cache.add_many([f"message-{i}" for i in range(100)])
+
+        self.assertLessEqual(cache.size_bytes, 500)
+        self.assertGreater(len(cache), 0)
+        self.assertLess(len(cache), 100)
+        self.assertTrue(cache.contains("message-99"))
+
+    @patch("utils.cache.time.monotonic")
+    def test_entries_expire(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        cache = LRUCache(max_entries=10, ttl=30, max_bytes=1024 * 1024)
+        cache.add("a")
+
+        mock_monotonic.return_value = 129
+        self.assertTrue(cache.contains("a"))
+        mock_monotonic.return_value = 131
+        self.assertFalse(cache.contains("a"))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size_bytes, 0)
+
+    def test_disabled_cache(self):
+        cache = LRUCache(max_entries=0, ttl=60, max_bytes=1024)
+        cache.add("a")
+
+        self.assertFalse(cache.contains("a"))
+        self.assertEqual(len(cache), 0)
@@ -5,6 +5,47 @@ import pytest
 def clear_config_module(monkeypatch):
     monkeypatch.delenv("DYNAMO_TABLE", raising=False)
     monkeypatch.delenv("REGION", raising=False)
+    monkeypatch.delenv("DEDUP_MODE", raising=False)
+    monkeypatch.delenv("BULK_SAVE", raising=False)
+    monkeypatch.delenv("METRICS_FLUSH_INTERVAL", raising=False)
+    monkeypatch.delenv("METRICS_BACKEND", raising=False)
+    monkeypatch.delenv("LOG_LEVEL", raising=False)
+    monkeypatch.delenv("LOG_SAMPLE_RATE", raising=False)
+    monkeypatch.delenv("LOG_JSON", raising=False)
+    monkeypatch.delenv("IDEMPOTENCY_CACHE_SIZE", raising=False)
+    monkeypatch.delenv("IDEMPOTENCY_CACHE_TTL", raising=False)
+    monkeypatch.delenv("IDEMPOTENCY_CACHE_MAX_BYTES", raising=False)
+    monkeypatch.delenv("MAX_WORKERS", raising=False)
+    monkeypatch.delenv("MICRO_BATCH_SIZE", raising=False)
+    monkeypatch.delenv("QUEUE_URL", raising=False)
+    monkeypatch.delenv("DAEMON_PREFETCH", raising=False)
+    monkeypatch.delenv("DAEMON_VISIBILITY_TIMEOUT", raising=False)
+    monkeypatch.delenv("SUPERVISOR_WORKERS", raising=False)
+    monkeypatch.delenv("AWS_MAX_POOL_CONNECTIONS", raising=False)
+    monkeypatch.delenv("AWS_CONNECT_TIMEOUT", raising=False)
+    monkeypatch.delenv("AWS_READ_TIMEOUT", raising=False)
+    monkeypatch.delenv("AWS_TCP_KEEPALIVE", raising=False)
+    monkeypatch.delenv("AWS_RETRY_MODE", raising=False)
+    monkeypatch.delenv("AWS_MAX_ATTEMPTS", raising=False)
+    monkeypatch.delenv("AWS_ENDPOINT_URL", raising=False)
+    monkeypatch.delenv("AWS_ENDPOINT_URLS", raising=False)
+    monkeypatch.delenv("DYNAMO_READ_RATE", raising=False)
+    monkeypatch.delenv("DYNAMO_WRITE_RATE", raising=False)
+    monkeypatch.delenv("DYNAMO_THROTTLE_RETRIES", raising=False)
+    monkeypatch.delenv("DEADLINE_SAFETY_MARGIN_MS", raising=False)
+    monkeypatch.delenv("QUARANTINE_QUEUE_URL", raising=False)
+    monkeypatch.delenv("QUARANTINE_MAX_RECEIVE_COUNT", raising=False)
+    monkeypatch.delenv("PAYLOAD_COMPRESS_THRESHOLD", raising=False)
+    monkeypatch.delenv("PAYLOAD_OFFLOAD_THRESHOLD", raising=False)
+    monkeypatch.delenv("PAYLOAD_BLOB_STORE", raising=False)
+    monkeypatch.delenv("IDEMPOTENCY_STORE", raising=False)
+    monkeypatch.delenv("IDEMPOTENCY_TABLE", raising=False)
+    monkeypatch.delenv("IDEMPOTENCY_TTL", raising=False)
+    monkeypatch.delenv("IDEMPOTENCY_TTL_ATTRIBUTE", raising=False)
+    monkeypatch.delenv("STORE_PAYLOADS", raising=False)
+    monkeypatch.delenv("LATENCY_METRICS", raising=False)
+    monkeypatch.delenv("PROFILE", raising=False)
+    monkeypatch.delenv("PROFILE_TOP", raising=False)
 
 def make_config():
     from utils import config
@@ -16,6 +57,47 @@ def test_config_defaults(monkeypatch):
     cfg = make_config()
     assert cfg.DYNAMO_TABLE == "messages_table"
     assert cfg.REGION == "us-east-1"
+    assert cfg.DEDUP_MODE == "read_first"
+    assert cfg.BULK_SAVE is False
+    assert cfg.METRICS_FLUSH_INTERVAL == 60.0
+    assert cfg.METRICS_BACKEND == "cloudwatch"
+    assert cfg.LOG_LEVEL == "INFO"
+    assert cfg.LOG_SAMPLE_RATE == 1.0
+    assert cfg.LOG_JSON == "json"
+    assert cfg.IDEMPOTENCY_CACHE_SIZE == 10000
+    assert cfg.IDEMPOTENCY_CACHE_TTL == 300.0
+    assert cfg.IDEMPOTENCY_CACHE_MAX_BYTES == 4 * 1024 * 1024
+    assert cfg.MAX_WORKERS == 1
+    assert cfg.MICRO_BATCH_SIZE == 100
+    assert cfg.QUEUE_URL is None
+    assert cfg.DAEMON_PREFETCH == 1
+    assert cfg.DAEMON_VISIBILITY_TIMEOUT == 30
+    assert cfg.SUPERVISOR_WORKERS >= 1
+    assert cfg.AWS_MAX_POOL_CONNECTIONS == 50
+    assert cfg.AWS_CONNECT_TIMEOUT == 2.0
+    assert cfg.AWS_READ_TIMEOUT == 30.0
+    assert cfg.AWS_TCP_KEEPALIVE is True
+    assert cfg.AWS_RETRY_MODE == "standard"
+    assert cfg.AWS_MAX_ATTEMPTS == 3
+    assert cfg.AWS_ENDPOINT_URL is None
+    assert cfg.AWS_ENDPOINT_URLS == {}
+    assert cfg.DYNAMO_READ_RATE == 0.0
+    assert cfg.DYNAMO_WRITE_RATE == 0.0
+    assert cfg.DYNAMO_THROTTLE_RETRIES == 3
+    assert cfg.DEADLINE_SAFETY_MARGIN_MS == 2000
+    assert cfg.QUARANTINE_QUEUE_URL is None
+    assert cfg.QUARANTINE_MAX_RECEIVE_COUNT == 0
+    assert cfg.PAYLOAD_COMPRESS_THRESHOLD == 0
+    assert cfg.PAYLOAD_OFFLOAD_THRESHOLD == 350 * 1024
+    assert cfg.PAYLOAD_BLOB_STORE is None
+    assert cfg.IDEMPOTENCY_STORE == "dynamodb"
+    assert cfg.IDEMPOTENCY_TABLE is None
+    assert cfg.IDEMPOTENCY_TTL == 0
+    assert cfg.IDEMPOTENCY_TTL_ATTRIBUTE == "expires_at"
+    assert cfg.STORE_PAYLOADS is True
+    assert cfg.LATENCY_METRICS is False
+    assert cfg.PROFILE == ""
+    assert cfg.PROFILE_TOP == 25
 
 def test_config_env_variables(monkeypatch):
     monkeypatch.setenv("DYNAMO_TABLE", "processed-messages")
@@ -30,3 +112,39 @@ def test_config_partial_env(monkeypatch):
 
     cfg = make_config()
     assert cfg.DYNAMO_TABLE == "processed-messages"
+
+def test_config_dedup_mode(monkeypatch):
+    monkeypatch.setenv("DEDUP_MODE", "write_first")
+
+    cfg = make_config()
+    assert cfg.DEDUP_MODE == "write_first"
+
+def test_config_bulk_save(monkeypatch):
+    monkeypatch.setenv("BULK_SAVE", "True")
+
+    cfg = make_config()
+    assert cfg.BULK_SAVE is True
+
+def test_config_aws_client_settings(monkeypatch):
+    monkeypatch.setenv("AWS_RETRY_MODE", "adaptive")
+    monkeypatch.setenv("AWS_TCP_KEEPALIVE", "false")
+    monkeypatch.setenv(
+        "AWS_ENDPOINT_URLS",
+        "dynamodb=http://localhost:8000, SQS=http://localhost:4566,bad")
+
+    cfg = make_config()
+    assert cfg.AWS_RETRY_MODE == "adaptive"
+    assert cfg.AWS_TCP_KEEPALIVE is False
+    assert cfg.AWS_ENDPOINT_URLS == {
+        "dynamodb": "http://localhost:8000",
+        "sqs": "http://localhost:4566",
+    }
+
+def test_is_local_run(monkeypatch):
+    from utils.config import is_local_run
+    monkeypatch.delenv("AWS_LAMBDA_FUNCTION_NAME", raising=False)
+    monkeypatch.delenv("AWS_EXECUTION_ENV", raising=False)
+    assert is_local_run() is True
+
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "worker-consumer-sqs")
+    assert is_local_run() is False
@@ -1,6 +1,7 @@
+import json
 import unittest
 from decimal import Decimal
-from utils.convert import convert_floats_to_decimal
+from utils.convert import convert_floats_to_decimal, decode_json
 
 class TestConvertFloatsToDecimal(unittest.TestCase):
 
@@ -54,3 +55,63 @@ class TestConvertFloatsToDecimal(unittest.TestCase):
         self.assertEqual(result["z"], Decimal("4.0"))
         self.assertEqual(result["x"][1], Decimal("2.5"))
         self.assertEqual(result["x"][2]["y"], Decimal("3.75"))
+
+    def test_deeply_nested_does_not_hit_recursion_limit(self):
+        data = leaf = {}
+        for _ in range(5000):
+            leaf["child"] = {"value": 1.5}
+            leaf = leaf["child"]
+        result = convert_floats_to_decimal(data)
+        for _ in range(5000):
+            result = result["child"]
+            self.assertEqual(result["value"], Decimal("1.5"))
+
+    def test_original_is_not_modified(self):
+        data = {"a": [1.5, {"b": 2.5}]}
+        result = convert_floats_to_decimal(data)
+        self.assertEqual(data, {"a": [1.5, {"b": 2.5}]})
+        self.assertIsNot(result["a"], data["a"])
+
+
+class TestDecodeJson(unittest.TestCase):
+
+    def test_floats_are_decoded_as_decimal(self):
+        result = decode_json('{"a": 250.75, "b": [1, 2.5, {"c": 0.1}], "d": "x"}')
+        self.assertEqual(result, {
+            "a": Decimal("250.75"),
+            "b": [1, Decimal("2.5"), {"c": Decimal("0.1")}],
+            "d": "x",
+        })
+        self.assertIsInstance(result["a"], Decimal)
+        self.assertIsInstance(result["b"][0], int)
+
+    def test_matches_convert_floats_to_decimal(self):
+        body = json.dumps({"payload": {"amount": 250.75, "items": [0.5, {"x": 3.0}]}})
+        self.assertEqual(decode_json(body), convert_floats_to_decimal(json.loads(body)))
+
+    def test_long_numbers_are_rounded_to_dynamodb_precision(self):
+        from boto3.dynamodb.types import TypeSerializer
+
+        digits = "1234567890" * 5
+        result = decode_json(f'{{"f": 0.{digits}, "i": {digits}, "s": 12}}')
+
+        self.assertEqual(result["f"], Decimal("0." + digits[:37] + "9"))
+        self.assertEqual(result["i"], Decimal(digits[:37] + "9E+12"))
+        self.assertIsInstance(result["s"], int)
+        serialized = TypeSerializer().serialize(result)
+        self.assertEqual(serialized["M"]["f"], {"N": "0." + digits[:37] + "9"})
+
+    def test_exponents_are_checked_against_dynamodb_range(self):
+        self.assertEqual(decode_json('{"f": 1.5e3}'), {"f": Decimal("1.5E+3")})
+        with self.assertRaises(ArithmeticError):
+            decode_json('{"f": 1e400}')
+
+    def test_non_finite_constants_are_rejected(self):
+        for constant in ("NaN", "Infinity", "-Infinity"):
+            with self.subTest(constant=constant):
+                with self.assertRaisesRegex(ValueError, constant):
+                    decode_json(f'{{"f": {constant}}}')
+
+    def test_invalid_json_raises(self):
+        with self.assertRaises(ValueError):
+            decode_json("{invalid_json}")
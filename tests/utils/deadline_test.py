@@ -0,0 +1,25 @@
+import math
+import unittest
+from unittest.mock import MagicMock, patch
+from utils.deadline import Deadline
+
+
+class TestDeadline(unittest.TestCase):
+
+    @patch("utils.deadline.time.monotonic")
+    def test_from_context_applies_margin(self, mock_clock):
+        mock_clock.return_value = 10.0
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = 5000
+        deadline = Deadline.from_context(context, margin_ms=1000)
+
+        self.assertEqual(deadline.remaining(), 4.0)
+        mock_clock.return_value = 14.5
+        self.assertEqual(deadline.remaining(), 0.0)
+        self.assertTrue(deadline.expired())
+
+    def test_without_context_never_expires(self):
+        for context in (None, MagicMock(), object()):
+            deadline = Deadline.from_context(context, margin_ms=1000)
+            self.assertEqual(deadline.remaining(), math.inf)
+            self.assertFalse(deadline.expired())
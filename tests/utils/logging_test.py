@@ -35,3 +35,96 @@ def test_log_message_invalid_trace_id():
         assert log_data["action"] == action
         assert log_data["status"] == status
         assert log_data["details"] == details
+
+def test_log_message_error_uses_error_level():
+    with patch("utils.logging.logger.error") as mock_error, \
+            patch("utils.logging.logger.info") as mock_info:
+        log_message("1", "dynamodb_save", "error", {"error": "fail"})
+        mock_info.assert_not_called()
+        log_data = json.loads(mock_error.call_args[0][0])
+        assert log_data["status"] == "error"
+
+def test_log_message_skips_serialization_when_level_disabled():
+    import logging
+    from utils.logging import logger
+
+    previous = logger.level
+    logger.setLevel(logging.ERROR)
+    try:
+        with patch("utils.logging.logger.info") as mock_info, \
+                patch("utils.logging.dumps") as mock_dumps:
+            log_message("1", "message_received", "info")
+            mock_info.assert_not_called()
+            mock_dumps.assert_not_called()
+    finally:
+        logger.setLevel(previous)
+
+def test_log_message_sampling_keeps_errors():
+    with patch("utils.logging.Config.LOG_SAMPLE_RATE", 0.0), \
+            patch("utils.logging.logger.info") as mock_info, \
+            patch("utils.logging.logger.error") as mock_error:
+        log_message("1", "dynamodb_save", "success")
+        log_message("1", "message_skipped", "duplicate")
+        log_message("1", "dynamodb_save", "error", {"error": "fail"})
+        mock_info.assert_not_called()
+        mock_error.assert_called_once()
+
+def test_log_message_sampling_is_stable_per_trace_id():
+    from utils.logging import is_sampled
+
+    with patch("utils.logging.Config.LOG_SAMPLE_RATE", 0.1):
+        decisions = [is_sampled(f"id-{i}", "success") for i in range(2000)]
+        assert decisions == [is_sampled(f"id-{i}", "info") for i in range(2000)]
+        assert 100 < sum(decisions) < 300
+
+def test_invocation_summary_counts_sampled_out_events():
+    from utils.logging import begin_summary, end_summary
+
+    with patch("utils.logging.Config.LOG_SAMPLE_RATE", 0.0), \
+            patch("utils.logging.logger.info") as mock_info, \
+            patch("utils.logging.logger.error"):
+        summary = begin_summary()
+        log_message("1", "message_received", "info")
+        log_message("2", "message_received", "info")
+        log_message("2", "dynamodb_save", "error", {"error": "fail"})
+        summary.add_duration("persist", 0.0125)
+        end_summary(details={"records": 2})
+        log_message("3", "message_received", "info")
+
+        mock_info.assert_called_once()
+        log_data = json.loads(mock_info.call_args[0][0])
+        assert log_data["action"] == "invocation_summary"
+        details = log_data["details"]
+        assert details["counts"] == {
+            "message_received:info": 2, "dynamodb_save:error": 1}
+        assert details["failed_ids"] == ["2"]
+        assert details["stages_ms"] == {"persist": 12.5}
+        assert details["records"] == 2
+        assert details["duration_ms"] >= 0
+
+def test_invocation_summary_latency_percentiles():
+    from utils.logging import begin_summary, end_summary, percentile
+
+    assert percentile([1, 2, 3, 4], 50) == 2
+    assert percentile([1, 2, 3, 4], 99) == 4
+    with patch("utils.logging.logger.info") as mock_info:
+        summary = begin_summary()
+        for ms in range(1, 101):
+            summary.add_timing("dynamodb.put_item", ms / 1000)
+        end_summary()
+
+        details = json.loads(mock_info.call_args[0][0])["details"]
+        assert details["latency_ms"] == {"dynamodb.put_item": {
+            "count": 100, "p50": 50.0, "p95": 95.0, "p99": 99.0, "max": 100.0}}
+        assert details["stages_ms"] == {"dynamodb.put_item": 5050.0}
+
+def test_log_message_orjson_serializer():
+    import pytest
+    orjson = pytest.importorskip("orjson")
+    from decimal import Decimal
+
+    with patch("utils.logging.Config.LOG_JSON", "orjson"), \
+            patch("utils.logging.logger.info") as mock_info:
+        log_message("1", "dynamodb_save", "success", {"amount": Decimal("1.5")})
+        log_data = orjson.loads(mock_info.call_args[0][0])
+        assert log_data["details"] == {"amount": "1.5"}
@@ -1,14 +1,19 @@
 from unittest.mock import patch, MagicMock
 
-with patch("utils.metrics.boto3.client") as mock_client:
-    from utils.metrics import put_metric
+from utils.metrics import put_metric, flush_metrics, MetricsRegistry
+
+
+def setup_function():
+    flush_metrics.__globals__["registry"].drain()
+
 
 def test_put_metric_success_default_namespace():
     mock_cw = MagicMock()
-    # o patch do boto3.client vai retornar mock_cw
     put_metric.__globals__["cloudwatch"] = mock_cw
 
     put_metric("TestMetric", 5)
+    mock_cw.put_metric_data.assert_not_called()
+    flush_metrics()
 
     mock_cw.put_metric_data.assert_called_once_with(
         Namespace="Worker-consumer-SQS/Messages",
@@ -24,6 +29,7 @@ def test_put_metric_success_custom_namespace():
     put_metric.__globals__["cloudwatch"] = mock_cw
 
     put_metric("CustomMetric", 10, namespace="Custom/Namespace")
+    flush_metrics()
 
     mock_cw.put_metric_data.assert_called_once_with(
         Namespace="Custom/Namespace",
@@ -34,11 +40,168 @@ def test_put_metric_success_custom_namespace():
         }]
     )
 
-def test_put_metric_raises():
+def test_put_metric_aggregates_counters_and_dimensions():
+    mock_cw = MagicMock()
+    put_metric.__globals__["cloudwatch"] = mock_cw
+
+    for _ in range(3):
+        put_metric("MessagesSaved", 1)
+    put_metric("MessagesSaved", 1, dimensions={"QueueName": "main_queue"})
+    put_metric("Latency", 10, unit="Milliseconds")
+    put_metric("Latency", 30, unit="Milliseconds")
+    flush_metrics()
+    flush_metrics()
+
+    mock_cw.put_metric_data.assert_called_once()
+    datums = mock_cw.put_metric_data.call_args.kwargs["MetricData"]
+    assert datums == [
+        {"MetricName": "MessagesSaved", "Value": 3, "Unit": "Count"},
+        {
+            "MetricName": "MessagesSaved",
+            "Dimensions": [{"Name": "QueueName", "Value": "main_queue"}],
+            "Value": 1,
+            "Unit": "Count",
+        },
+        {
+            "MetricName": "Latency",
+            "StatisticValues": {
+                "SampleCount": 2, "Sum": 40, "Minimum": 10, "Maximum": 30},
+            "Unit": "Milliseconds",
+        },
+    ]
+
+def test_registry_flushes_when_full():
+    mock_cw = MagicMock()
+    put_metric.__globals__["cloudwatch"] = mock_cw
+    registry = MetricsRegistry(max_datums=2, flush_interval=60)
+
+    registry.add("A", 1)
+    mock_cw.put_metric_data.assert_not_called()
+    registry.add("B", 1)
+
+    mock_cw.put_metric_data.assert_called_once()
+    assert registry.drain() == {}
+
+def test_registry_flushes_after_interval():
+    mock_cw = MagicMock()
+    put_metric.__globals__["cloudwatch"] = mock_cw
+    registry = MetricsRegistry(flush_interval=0)
+
+    registry.add("A", 1)
+
+    mock_cw.put_metric_data.assert_called_once()
+
+def test_flush_splits_calls_above_limit():
+    mock_cw = MagicMock()
+    put_metric.__globals__["cloudwatch"] = mock_cw
+    registry = MetricsRegistry(max_datums=5000, flush_interval=60)
+
+    for i in range(1500):
+        registry.add(f"Metric{i}", 1)
+    registry.flush()
+
+    assert mock_cw.put_metric_data.call_count == 2
+    sizes = [len(c.kwargs["MetricData"]) for c in mock_cw.put_metric_data.call_args_list]
+    assert sizes == [1000, 500]
+
+def test_put_metric_flush_error_does_not_raise():
     mock_cw = MagicMock()
     mock_cw.put_metric_data.side_effect = Exception("Fail metric")
     put_metric.__globals__["cloudwatch"] = mock_cw
 
-    import pytest
-    with pytest.raises(Exception):
-        put_metric("FailMetric", 1)
+    put_metric("FailMetric", 1)
+    with patch("utils.metrics.log_message") as mock_log:
+        flush_metrics()
+
+    mock_log.assert_called_once_with("metrics", "metrics_flush", "error", {
+        "error": "Fail metric",
+        "namespace": "Worker-consumer-SQS/Messages",
+        "datums": 1,
+    })
+
+def test_client_error_does_not_escape_put_metric_or_flush():
+    put_metric.__globals__["cloudwatch"] = None
+    registry = MetricsRegistry(max_datums=1, flush_interval=60, backend="cloudwatch")
+
+    with patch("utils.metrics.get_client", side_effect=ValueError("bad retry mode")), \
+            patch("utils.metrics.log_message") as mock_log:
+        registry.add("A", 1)
+        registry.add("B", 1)
+
+    assert mock_log.call_count == 2
+    mock_log.assert_called_with("metrics", "metrics_flush", "error", {
+        "error": "bad retry mode"})
+
+def test_emf_backend_writes_log_record_without_api_call():
+    import json
+    mock_cw = MagicMock()
+    put_metric.__globals__["cloudwatch"] = mock_cw
+    registry = MetricsRegistry(flush_interval=60, backend="emf")
+
+    registry.add("MessagesSaved", 1)
+    registry.add("MessagesSaved", 1)
+    registry.add("DynamoDBSaveLatency", 12.5, unit="Milliseconds")
+    registry.add("DynamoDBSaveLatency", 7.5, unit="Milliseconds")
+    registry.add("DuplicateMessages", 1, dimensions={"QueueName": "main_queue"})
+    with patch("utils.metrics.metrics_logger.info") as mock_info:
+        registry.flush()
+
+    mock_cw.put_metric_data.assert_not_called()
+    assert mock_info.call_count == 2
+    record = json.loads(mock_info.call_args_list[0][0][0])
+    directive = record["_aws"]["CloudWatchMetrics"][0]
+    assert directive["Namespace"] == "Worker-consumer-SQS/Messages"
+    assert directive["Dimensions"] == [[]]
+    assert directive["Metrics"] == [
+        {"Name": "MessagesSaved", "Unit": "Count"},
+        {"Name": "DynamoDBSaveLatency", "Unit": "Milliseconds"},
+    ]
+    assert record["MessagesSaved"] == 2
+    assert record["DynamoDBSaveLatency"] == [12.5, 7.5]
+    assert isinstance(record["_aws"]["Timestamp"], int)
+
+    dimensioned = json.loads(mock_info.call_args_list[1][0][0])
+    assert dimensioned["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [["QueueName"]]
+    assert dimensioned["QueueName"] == "main_queue"
+    assert dimensioned["DuplicateMessages"] == 1
+
+
+def test_emf_records_are_written_when_log_level_is_warning():
+    import logging
+    from utils.logging import logger, metrics_logger
+
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    metrics_logger.addHandler(handler)
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+    try:
+        registry = MetricsRegistry(flush_interval=60, backend="emf")
+        registry.add("MessagesSaved", 1)
+        registry.flush()
+    finally:
+        logger.setLevel(level)
+        metrics_logger.removeHandler(handler)
+
+    assert len(records) == 1
+    assert '"MessagesSaved": 1' in records[0].getMessage()
+
+
+def test_emf_splits_long_series_across_records():
+    import json
+    registry = MetricsRegistry(flush_interval=60, backend="emf")
+
+    registry.add("MessagesSaved", 3)
+    for value in range(250):
+        registry.add("DynamoDBSaveLatency", value, unit="Milliseconds")
+    with patch("utils.metrics.metrics_logger.info") as mock_info:
+        registry.flush()
+
+    records = [json.loads(c[0][0]) for c in mock_info.call_args_list]
+    assert [len(r["DynamoDBSaveLatency"]) for r in records] == [100, 100, 50]
+    assert sum(sum(r["DynamoDBSaveLatency"]) for r in records) == sum(range(250))
+    assert records[0]["MessagesSaved"] == 3
+    assert all("MessagesSaved" not in r for r in records[1:])
+    assert records[1]["_aws"]["CloudWatchMetrics"][0]["Metrics"] == [
+        {"Name": "DynamoDBSaveLatency", "Unit": "Milliseconds"}]
@@ -0,0 +1,50 @@
+from unittest.mock import patch
+from utils import profiling
+
+
+def setup_function():
+    profiling._profiled = False
+
+
+def teardown_function():
+    profiling._profiled = False
+
+
+def work():
+    return sorted(str(i) for i in range(1000))
+
+
+@patch("utils.profiling.log_message")
+def test_profiling_disabled_by_default(mock_log):
+    with profiling.profile_invocation():
+        work()
+    mock_log.assert_not_called()
+
+
+@patch("utils.profiling.Config.PROFILE", "cprofile, tracemalloc")
+@patch("utils.profiling.log_message")
+def test_profiles_only_the_first_invocation(mock_log):
+    with profiling.profile_invocation():
+        work()
+    with profiling.profile_invocation():
+        work()
+
+    mock_log.assert_called_once()
+    trace_id, action, status, details = mock_log.call_args.args
+    assert (action, status) == ("profile_summary", "profile")
+    assert "work" in details["cprofile"]
+    assert details["tracemalloc"]["peak_bytes"] > 0
+    assert len(details["tracemalloc"]["top"]) <= profiling.Config.PROFILE_TOP
+
+
+@patch("utils.profiling.Config.PROFILE", "cprofile")
+@patch("utils.profiling.log_message")
+def test_profile_is_logged_when_the_invocation_fails(mock_log):
+    try:
+        with profiling.profile_invocation():
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    details = mock_log.call_args.args[3]
+    assert set(details) == {"cprofile"}
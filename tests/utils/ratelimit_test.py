@@ -0,0 +1,60 @@
+import unittest
+from unittest.mock import patch
+from utils.ratelimit import TokenBucket, backoff_delay
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    @patch("utils.ratelimit.time.sleep")
+    @patch("utils.ratelimit.time.monotonic", return_value=100.0)
+    def test_waits_for_debt(self, mock_clock, mock_sleep):
+        bucket = TokenBucket(rate=10)
+
+        self.assertEqual(bucket.acquire(10), 0.0)
+        self.assertAlmostEqual(bucket.acquire(5), 0.5)
+        mock_sleep.assert_called_once()
+        self.assertAlmostEqual(mock_sleep.call_args.args[0], 0.5)
+
+    @patch("utils.ratelimit.time.sleep")
+    @patch("utils.ratelimit.time.monotonic")
+    def test_refills_over_time(self, mock_clock, mock_sleep):
+        mock_clock.return_value = 100.0
+        bucket = TokenBucket(rate=10)
+        bucket.acquire(10)
+
+        mock_clock.return_value = 101.0
+        self.assertEqual(bucket.acquire(10), 0.0)
+        mock_sleep.assert_not_called()
+
+    def test_aimd_rate(self):
+        bucket = TokenBucket(rate=8, min_rate=2, increase=1, decrease=0.5)
+
+        bucket.on_throttle()
+        self.assertEqual(bucket.rate, 4)
+        bucket.on_throttle()
+        bucket.on_throttle()
+        self.assertEqual(bucket.rate, 2)
+        bucket.on_success()
+        self.assertEqual(bucket.rate, 3)
+        for _ in range(10):
+            bucket.on_success()
+        self.assertEqual(bucket.rate, 8)
+
+    @patch("utils.ratelimit.time.sleep")
+    def test_disabled_bucket(self, mock_sleep):
+        bucket = TokenBucket(rate=0)
+
+        self.assertFalse(bucket.enabled)
+        self.assertEqual(bucket.acquire(1000), 0.0)
+        bucket.on_throttle()
+        self.assertEqual(bucket.rate, 0)
+        mock_sleep.assert_not_called()
+
+
+class TestBackoffDelay(unittest.TestCase):
+
+    def test_full_jitter_is_capped(self):
+        for attempt in range(10):
+            delay = backoff_delay(attempt, base=0.05, cap=1.0)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(1.0, 0.05 * 2 ** attempt))
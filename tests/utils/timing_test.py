@@ -0,0 +1,51 @@
+from unittest.mock import patch
+from utils.logging import begin_summary, end_summary
+from utils.timing import timed
+
+
+def test_timed_block_and_decorator_record_into_summary():
+    @timed("sqs.delete_message_batch")
+    def delete(value):
+        return value * 2
+
+    with patch("utils.logging.logger.info"):
+        summary = begin_summary()
+        with timed("parse"):
+            pass
+        assert delete(2) == 4
+        assert delete(3) == 6
+        latencies = summary.latencies()
+        end_summary()
+
+    assert latencies["parse"]["count"] == 1
+    assert latencies["sqs.delete_message_batch"]["count"] == 2
+
+
+def test_timed_records_on_exception():
+    with patch("utils.logging.logger.info"):
+        summary = begin_summary()
+        try:
+            with timed("dynamodb.put_item"):
+                raise ValueError("fail")
+        except ValueError:
+            pass
+        latencies = summary.latencies()
+        end_summary()
+
+    assert latencies["dynamodb.put_item"]["count"] == 1
+
+
+@patch("utils.timing.put_metric")
+def test_latency_metrics_flag(mock_metric):
+    with timed("parse"):
+        pass
+    mock_metric.assert_not_called()
+
+    with patch("utils.timing.Config.LATENCY_METRICS", True):
+        with timed("parse"):
+            pass
+    name, value = mock_metric.call_args.args
+    assert name == "OperationLatency"
+    assert value >= 0
+    assert mock_metric.call_args.kwargs == {
+        "unit": "Milliseconds", "dimensions": {"Operation": "parse"}}